@@ -0,0 +1,285 @@
+/* wb_arbiter_pipelined_tb. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*Testbench for wb_arbiter_pipelined
+
+ Pipelined masters issue bursts of random reads and writes at the same
+ time to a pipelined memory that stalls and answers at random, but in
+ order. Each master has its own part of the memory. Accesses with bit 10
+ of the address set are terminated with err by the memory. Every master
+ checks that each of its requests gets exactly one response, in order,
+ with the expected data, which fails if the grant moves while responses
+ are in flight.
+ */
+`default_nettype none
+module wb_arbiter_pipelined_tb
+  #(parameter AUTORUN = 1);
+
+   localparam NUM_MASTERS = 3;
+
+   localparam aw = 32;
+   localparam dw = 32;
+
+   //64 words per master
+   localparam MEM_WORDS = 64;
+
+   reg wb_clk = 1'b1;
+   reg wb_rst = 1'b1;
+
+   wire [NUM_MASTERS*aw-1:0] wbm_adr;
+   wire [NUM_MASTERS*dw-1:0] wbm_dat;
+   wire [NUM_MASTERS-1:0]    wbm_we;
+   wire [NUM_MASTERS-1:0]    wbm_cyc;
+   wire [NUM_MASTERS-1:0]    wbm_stb;
+   wire [NUM_MASTERS*dw-1:0] wbm_rdt;
+   wire [NUM_MASTERS-1:0]    wbm_ack;
+   wire [NUM_MASTERS-1:0]    wbm_err;
+   wire [NUM_MASTERS-1:0]    wbm_rty;
+   wire [NUM_MASTERS-1:0]    wbm_stall;
+
+   wire [aw-1:0] wbs_adr;
+   wire [dw-1:0] wbs_dat;
+   wire 	 wbs_we;
+   wire 	 wbs_cyc;
+   wire 	 wbs_stb;
+
+   //Memory
+   reg [dw-1:0]  mem [0:NUM_MASTERS*MEM_WORDS-1];
+   reg [dw-1:0]  fifo_dat [0:15];
+   reg 		 fifo_err [0:15];
+   integer 	 fifo_wr = 0;
+   integer 	 fifo_rd = 0;
+   reg [dw-1:0]  mem_rdt;
+   reg 		 mem_ack = 1'b0;
+   reg 		 mem_err = 1'b0;
+   reg 		 mem_stall = 1'b0;
+
+   integer  TRANSACTIONS;
+
+   genvar   i;
+
+   generate
+      if (AUTORUN) begin
+         vlog_tb_utils vtu();
+         vlog_tap_generator #("wb_arbiter_pipelined.tap", 1) vtg();
+
+         initial begin
+            run;
+            vtg.ok("wb_arbiter_pipelined: All tests passed!");
+            $finish;
+         end
+      end
+   endgenerate
+
+   always #5 wb_clk <= ~wb_clk;
+
+   wb_arbiter_pipelined
+     #(.dw (dw),
+       .aw (aw),
+       .num_hosts (NUM_MASTERS))
+   dut
+     (.wb_clk_i    (wb_clk),
+      .wb_rst_i    (wb_rst),
+      .wbm_adr_i   (wbm_adr),
+      .wbm_dat_i   (wbm_dat),
+      .wbm_sel_i   ({NUM_MASTERS{4'hf}}),
+      .wbm_we_i    (wbm_we),
+      .wbm_cyc_i   (wbm_cyc),
+      .wbm_stb_i   (wbm_stb),
+      .wbm_cti_i   ({NUM_MASTERS{3'b000}}),
+      .wbm_bte_i   ({NUM_MASTERS{2'b00}}),
+      .wbm_dat_o   (wbm_rdt),
+      .wbm_ack_o   (wbm_ack),
+      .wbm_err_o   (wbm_err),
+      .wbm_rty_o   (wbm_rty),
+      .wbm_stall_o (wbm_stall),
+      .wbm_grant_o (),
+      .wbs_adr_o   (wbs_adr),
+      .wbs_dat_o   (wbs_dat),
+      .wbs_sel_o   (),
+      .wbs_we_o    (wbs_we),
+      .wbs_cyc_o   (wbs_cyc),
+      .wbs_stb_o   (wbs_stb),
+      .wbs_cti_o   (),
+      .wbs_bte_o   (),
+      .wbs_dat_i   (mem_rdt),
+      .wbs_ack_i   (mem_ack),
+      .wbs_err_i   (mem_err),
+      .wbs_rty_i   (1'b0),
+      .wbs_stall_i (mem_stall));
+
+   //Pipelined memory that stalls at random and answers its requests in
+   //order after a random delay
+   always @(posedge wb_clk) begin
+      mem_stall <= ($urandom % 4) == 0;
+      mem_ack <= 1'b0;
+      mem_err <= 1'b0;
+      if (wbs_cyc & wbs_stb & !mem_stall) begin
+	 fifo_err[fifo_wr%16] <= wbs_adr[10];
+	 if (!wbs_adr[10]) begin
+	    fifo_dat[fifo_wr%16] <= mem[wbs_adr[9:2]];
+	    if (wbs_we)
+	      mem[wbs_adr[9:2]] <= wbs_dat;
+	 end
+	 fifo_wr <= fifo_wr + 1;
+      end
+      if ((fifo_rd != fifo_wr) & ($urandom % 2)) begin
+	 mem_ack <= !fifo_err[fifo_rd%16];
+	 mem_err <= fifo_err[fifo_rd%16];
+	 mem_rdt <= fifo_dat[fifo_rd%16];
+	 fifo_rd <= fifo_rd + 1;
+      end
+      if (!wbs_cyc & (fifo_rd != fifo_wr)) begin
+	 $display("%m : Error: cyc dropped with responses outstanding");
+	 $finish;
+      end
+   end
+
+   generate
+      for (i=0;i<NUM_MASTERS;i=i+1) begin : masters
+	 reg [aw-1:0] adr = {aw{1'b0}};
+	 reg [dw-1:0] dat = {dw{1'b0}};
+	 reg 	      we  = 1'b0;
+	 reg 	      cyc = 1'b0;
+	 reg 	      stb = 1'b0;
+
+	 //Expected responses in request order
+	 reg [dw-1:0] exp_dat [0:63];
+	 reg 	      exp_rd  [0:63];
+	 reg 	      exp_err [0:63];
+	 integer      exp_wr = 0;
+	 integer      exp_rd_ptr = 0;
+
+	 reg [dw-1:0] ref_mem [0:MEM_WORDS-1];
+
+	 assign wbm_adr[i*aw+:aw] = adr;
+	 assign wbm_dat[i*dw+:dw] = dat;
+	 assign wbm_we[i]  = we;
+	 assign wbm_cyc[i] = cyc;
+	 assign wbm_stb[i] = stb;
+
+	 always @(posedge wb_clk) begin
+	    if (wbm_ack[i] | wbm_err[i] | wbm_rty[i]) begin
+	       if (!cyc | (exp_rd_ptr == exp_wr)) begin
+		  $display("%m : Error: Response without a request");
+		  $finish;
+	       end
+	       if (wbm_rty[i] | (wbm_ack[i] & wbm_err[i]) |
+		   (wbm_err[i] != exp_err[exp_rd_ptr%64])) begin
+		  $display("%m : Error: Unexpected response ack=%0d err=%0d rty=%0d",
+			   wbm_ack[i], wbm_err[i], wbm_rty[i]);
+		  $finish;
+	       end
+	       if (wbm_ack[i] & exp_rd[exp_rd_ptr%64] &
+		   (wbm_rdt[i*dw+:dw] !== exp_dat[exp_rd_ptr%64])) begin
+		  $display("%m : Error: Read 0x%08x, expected 0x%08x",
+			   wbm_rdt[i*dw+:dw], exp_dat[exp_rd_ptr%64]);
+		  $finish;
+	       end
+	       exp_rd_ptr <= exp_rd_ptr + 1;
+	    end
+	 end
+
+	 task run_master;
+	    input integer transactions;
+	    integer 	  n;
+	    integer 	  len;
+	    integer 	  timeout;
+	    integer 	  idx;
+	    begin
+	       for (idx=0;idx<MEM_WORDS;idx=idx+1)
+		 ref_mem[idx] = 0;
+	       n = 0;
+	       while (n < transactions) begin
+		  //Bursts of 1 to 8 requests in one cycle
+		  @(posedge wb_clk) #1;
+		  cyc = 1'b1;
+		  len = 1 + $urandom % 8;
+		  while (len > 0) begin
+		     if ($urandom % 4) begin
+			adr = (i << 8) | (($urandom % MEM_WORDS) << 2);
+			//One in eight accesses is terminated with err
+			if (($urandom % 8) == 0)
+			  adr[10] = 1'b1;
+			dat = $urandom;
+			we  = $urandom;
+			stb = 1'b1;
+			#1;
+			timeout = 0;
+			while (wbm_stall[i]) begin
+			   @(posedge wb_clk) #2;
+			   timeout = timeout + 1;
+			   if (timeout > 1000) begin
+			      $display("%m : Error: Stalled at address 0x%08x", adr);
+			      $finish;
+			   end
+			end
+			//The request is accepted at the next clock edge
+			exp_err[exp_wr%64] = adr[10];
+			exp_rd[exp_wr%64]  = !we;
+			exp_dat[exp_wr%64] = ref_mem[adr[7:2]];
+			if (we & !adr[10])
+			  ref_mem[adr[7:2]] = dat;
+			exp_wr = exp_wr + 1;
+			len = len - 1;
+			n = n + 1;
+			@(posedge wb_clk) #1;
+			stb = 1'b0;
+		     end else
+		       @(posedge wb_clk) #1;
+		  end
+		  //Wait for the remaining responses before ending the cycle
+		  timeout = 0;
+		  while (exp_rd_ptr != exp_wr) begin
+		     @(posedge wb_clk) #1;
+		     timeout = timeout + 1;
+		     if (timeout > 100) begin
+			$display("%m : Error: Timeout waiting for %0d responses",
+				 exp_wr - exp_rd_ptr);
+			$finish;
+		     end
+		  end
+		  cyc = 1'b0;
+		  //Give the other masters a chance to get the grant
+		  repeat ($urandom % 4) @(posedge wb_clk);
+	       end
+	    end
+	 endtask
+      end
+   endgenerate
+
+   task run;
+      integer idx;
+      begin
+	 if(!$value$plusargs("transactions=%d", TRANSACTIONS))
+	   TRANSACTIONS = 1000;
+	 for (idx=0;idx<NUM_MASTERS*MEM_WORDS;idx=idx+1)
+	   mem[idx] = 0;
+	 repeat (2) @(posedge wb_clk);
+	 #1 wb_rst = 1'b0;
+
+	 fork
+	    masters[0].run_master(TRANSACTIONS);
+	    masters[1].run_master(TRANSACTIONS);
+	    masters[2].run_master(TRANSACTIONS);
+	 join
+      end
+   endtask
+
+endmodule
@@ -0,0 +1,330 @@
+/* wb_arbiter_qos_tb. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*Testbench for wb_arbiter_qos
+
+ Three masters keep long bus cycles open and do single accesses and
+ incrementing bursts in their own part of a memory with random wait
+ states. The arbiter is tested with three configurations, selected by
+ cfg:
+
+ 0 : Weighted round-robin with weights 1, 2 and 3 and lock_burst set
+ 1 : Fixed priority with lock_burst set
+ 2 : Plain round-robin without lock_burst
+
+ Every read is checked against a reference copy of the memory. The
+ number of transfers that a requesting master has to wait for is
+ checked against the bound of the policy: the sum of the weights of the
+ other masters for round-robin, and one transfer for master 0 with fixed
+ priority. With lock_burst set, a burst must never be interrupted.
+ */
+`default_nettype none
+module wb_arbiter_qos_tb
+  #(parameter AUTORUN = 1);
+
+   localparam NUM_MASTERS = 3;
+
+   localparam aw = 32;
+   localparam dw = 32;
+
+   //64 words per master
+   localparam MEM_WORDS = 64;
+   localparam MAX_WAIT  = 2;
+
+   localparam [NUM_MASTERS*8-1:0] WEIGHTS = {8'd3, 8'd2, 8'd1};
+
+   reg wb_clk = 1'b1;
+   reg wb_rst = 1'b1;
+
+   reg [1:0] cfg = 2'd0;
+
+   wire [NUM_MASTERS*aw-1:0] wbm_adr;
+   wire [NUM_MASTERS*dw-1:0] wbm_dat;
+   wire [NUM_MASTERS-1:0]    wbm_we;
+   wire [NUM_MASTERS-1:0]    wbm_cyc;
+   wire [NUM_MASTERS-1:0]    wbm_stb;
+   wire [NUM_MASTERS*3-1:0]  wbm_cti;
+   wire [NUM_MASTERS*dw-1:0] wbm_rdt [0:2];
+   wire [NUM_MASTERS-1:0]    wbm_ack [0:2];
+   wire [NUM_MASTERS-1:0]    wbm_err [0:2];
+   wire [NUM_MASTERS-1:0]    wbm_rty [0:2];
+   wire [NUM_MASTERS-1:0]    wbm_grant [0:2];
+
+   wire [aw-1:0] wbs_adr [0:2];
+   wire [dw-1:0] wbs_dat [0:2];
+   wire [2:0] 	 wbs_we;
+   wire [2:0] 	 wbs_cyc;
+   wire [2:0] 	 wbs_stb;
+   wire [2:0] 	 wbs_cti [0:2];
+
+   //Memory
+   reg [dw-1:0]  mem [0:NUM_MASTERS*MEM_WORDS-1];
+   reg [dw-1:0]  mem_rdt;
+   reg 		 mem_ack = 1'b0;
+   integer 	 mem_wait = 0;
+
+   //Transfers that each master has waited for since its last ack
+   integer 	 waits [0:NUM_MASTERS-1];
+   integer 	 max_wait [0:NUM_MASTERS-1];
+   reg 		 in_burst = 1'b0;
+   reg [1:0] 	 burst_master;
+
+   integer  TRANSACTIONS;
+
+   genvar   i;
+
+   generate
+      if (AUTORUN) begin
+         vlog_tb_utils vtu();
+         vlog_tap_generator #("wb_arbiter_qos.tap", 1) vtg();
+
+         initial begin
+            run;
+            vtg.ok("wb_arbiter_qos: All tests passed!");
+            $finish;
+         end
+      end
+   endgenerate
+
+   always #5 wb_clk <= ~wb_clk;
+
+   generate
+      for (i=0;i<3;i=i+1) begin : arbiters
+	 wb_arbiter_qos
+	   #(.dw (dw),
+	     .aw (aw),
+	     .num_masters (NUM_MASTERS),
+	     .fixed_priority (i == 1),
+	     .lock_burst (i != 2),
+	     .WEIGHTS (i == 0 ? WEIGHTS : {NUM_MASTERS{8'd1}}))
+	 dut
+	   (.wb_clk_i    (wb_clk),
+	    .wb_rst_i    (wb_rst),
+	    .wbm_adr_i   (wbm_adr),
+	    .wbm_dat_i   (wbm_dat),
+	    .wbm_sel_i   ({NUM_MASTERS{4'hf}}),
+	    .wbm_we_i    (wbm_we),
+	    .wbm_cyc_i   (wbm_cyc & {NUM_MASTERS{cfg == i}}),
+	    .wbm_stb_i   (wbm_stb),
+	    .wbm_cti_i   (wbm_cti),
+	    .wbm_bte_i   ({NUM_MASTERS{2'b00}}),
+	    .wbm_dat_o   (wbm_rdt[i]),
+	    .wbm_ack_o   (wbm_ack[i]),
+	    .wbm_err_o   (wbm_err[i]),
+	    .wbm_rty_o   (wbm_rty[i]),
+	    .wbm_grant_o (wbm_grant[i]),
+	    .wbs_adr_o   (wbs_adr[i]),
+	    .wbs_dat_o   (wbs_dat[i]),
+	    .wbs_sel_o   (),
+	    .wbs_we_o    (wbs_we[i]),
+	    .wbs_cyc_o   (wbs_cyc[i]),
+	    .wbs_stb_o   (wbs_stb[i]),
+	    .wbs_cti_o   (wbs_cti[i]),
+	    .wbs_bte_o   (),
+	    .wbs_dat_i   (mem_rdt),
+	    .wbs_ack_i   (mem_ack & (cfg == i)),
+	    .wbs_err_i   (1'b0),
+	    .wbs_rty_i   (1'b0));
+      end
+   endgenerate
+
+   //Memory with registered acks and 0 to MAX_WAIT wait states
+   wire [aw-1:0] s_adr = wbs_adr[cfg];
+
+   always @(posedge wb_clk) begin
+      mem_ack <= 1'b0;
+      if (wbs_cyc[cfg] & wbs_stb[cfg] & !mem_ack) begin
+	 if (mem_wait > 0)
+	   mem_wait <= mem_wait - 1;
+	 else begin
+	    mem_wait <= $urandom % (MAX_WAIT+1);
+	    mem_ack <= 1'b1;
+	    mem_rdt <= mem[s_adr[9:2]];
+	    if (wbs_we[cfg])
+	      mem[s_adr[9:2]] <= wbs_dat[cfg];
+	 end
+      end
+   end
+
+   //Check the waiting times and that locked bursts are kept together
+   integer m;
+   integer g;
+   integer bound;
+   wire    transfer_end = (cfg == 2) | (wbs_cti[cfg] == 3'b000) | (wbs_cti[cfg] == 3'b111);
+
+   always @(posedge wb_clk) begin
+      if (mem_ack) begin
+	 g = 0;
+	 for (m=0;m<NUM_MASTERS;m=m+1)
+	   if (wbm_grant[cfg][m])
+	     g = m;
+	 if ((cfg != 2) & in_burst & (g != burst_master)) begin
+	    $display("%m : Error: Burst from master %0d interrupted by master %0d",
+		     burst_master, g);
+	    $finish;
+	 end
+	 in_burst <= !transfer_end;
+	 burst_master <= g;
+	 for (m=0;m<NUM_MASTERS;m=m+1) begin
+	    if (m == g)
+	      waits[m] = 0;
+	    else if (wbm_cyc[m] & transfer_end)
+	      waits[m] = waits[m] + 1;
+	    if (waits[m] > max_wait[m])
+	      max_wait[m] = waits[m];
+	    bound = 0;
+	    if (cfg == 0)
+	      bound = WEIGHTS[0+:8] + WEIGHTS[8+:8] + WEIGHTS[16+:8] - WEIGHTS[m*8+:8];
+	    else if (cfg == 2)
+	      bound = NUM_MASTERS-1;
+	    else if (m == 0)
+	      bound = 1;
+	    if ((bound > 0) && (waits[m] > bound)) begin
+	       $display("%m : Error: Master %0d waited for %0d transfers (cfg %0d), expected at most %0d",
+			m, waits[m], cfg, bound);
+	       $finish;
+	    end
+	 end
+      end
+   end
+
+   generate
+      for (i=0;i<NUM_MASTERS;i=i+1) begin : masters
+	 reg [aw-1:0] adr = {aw{1'b0}};
+	 reg [dw-1:0] dat = {dw{1'b0}};
+	 reg 	      we  = 1'b0;
+	 reg 	      cyc = 1'b0;
+	 reg 	      stb = 1'b0;
+	 reg [2:0]    cti = 3'b000;
+
+	 reg [dw-1:0] ref_mem [0:MEM_WORDS-1];
+
+	 assign wbm_adr[i*aw+:aw] = adr;
+	 assign wbm_dat[i*dw+:dw] = dat;
+	 assign wbm_we[i]  = we;
+	 assign wbm_cyc[i] = cyc;
+	 assign wbm_stb[i] = stb;
+	 assign wbm_cti[i*3+:3] = cti;
+
+	 task beat;
+	    input [5:0] word;
+	    input [2:0] beat_cti;
+	    integer 	timeout;
+	    begin
+	       adr = (i << 8) | (word << 2);
+	       dat = $urandom;
+	       we  = $urandom;
+	       cti = beat_cti;
+	       stb = 1'b1;
+	       #1;
+	       timeout = 0;
+	       while (!wbm_ack[cfg][i]) begin
+		  if (wbm_err[cfg][i] | wbm_rty[cfg][i]) begin
+		     $display("%m : Error: Unexpected err or rty");
+		     $finish;
+		  end
+		  @(posedge wb_clk) #2;
+		  timeout = timeout + 1;
+		  //With fixed priority, the other masters can keep master 2
+		  //waiting until they are done
+		  if (timeout > ((cfg == 1) ? 100000 : 1000)) begin
+		     $display("%m : Error: Timeout at address 0x%08x (cfg %0d)", adr, cfg);
+		     $finish;
+		  end
+	       end
+	       if (!we & (wbm_rdt[cfg][i*dw+:dw] !== ref_mem[word])) begin
+		  $display("%m : Error: Read 0x%08x from address 0x%08x, expected 0x%08x (cfg %0d)",
+			   wbm_rdt[cfg][i*dw+:dw], adr, ref_mem[word], cfg);
+		  $finish;
+	       end
+	       if (we)
+		 ref_mem[word] = dat;
+	       @(posedge wb_clk) #1;
+	    end
+	 endtask
+
+	 task run_master;
+	    input integer transactions;
+	    integer 	  n;
+	    integer 	  k;
+	    integer 	  len;
+	    integer 	  word;
+	    begin
+	       for (k=0;k<MEM_WORDS;k=k+1)
+		 ref_mem[k] = mem[i*MEM_WORDS+k];
+	       n = 0;
+	       while (n < transactions) begin
+		  @(posedge wb_clk) #1;
+		  cyc = 1'b1;
+		  //Keep the bus cycle open for up to eight transfers
+		  for (k=1+$urandom%8;k>0;k=k-1) begin
+		     if ($urandom % 2) begin
+			beat($urandom % MEM_WORDS, 3'b000);
+			stb = 1'b0;
+		     end else begin
+			len = 2 + $urandom % 3;
+			word = $urandom % (MEM_WORDS-len);
+			while (len > 1) begin
+			   beat(word, 3'b010);
+			   word = word + 1;
+			   len = len - 1;
+			end
+			beat(word, 3'b111);
+			stb = 1'b0;
+			cti = 3'b000;
+		     end
+		     n = n + 1;
+		     if (($urandom % 4) == 0)
+		       @(posedge wb_clk) #1;
+		  end
+		  cyc = 1'b0;
+		  repeat ($urandom % 4) @(posedge wb_clk);
+	       end
+	    end
+	 endtask
+      end
+   endgenerate
+
+   task run;
+      integer idx;
+      begin
+	 if(!$value$plusargs("transactions=%d", TRANSACTIONS))
+	   TRANSACTIONS = 500;
+	 for (idx=0;idx<NUM_MASTERS*MEM_WORDS;idx=idx+1)
+	   mem[idx] = 0;
+	 for (idx=0;idx<NUM_MASTERS;idx=idx+1) begin
+	    waits[idx] = 0;
+	    max_wait[idx] = 0;
+	 end
+	 repeat (2) @(posedge wb_clk);
+	 #1 wb_rst = 1'b0;
+
+	 for (idx=0;idx<3;idx=idx+1) begin
+	    cfg = idx;
+	    fork
+	       masters[0].run_master(TRANSACTIONS);
+	       masters[1].run_master(TRANSACTIONS);
+	       masters[2].run_master(TRANSACTIONS);
+	    join
+	    @(posedge wb_clk) #1;
+	 end
+      end
+   endtask
+
+endmodule
@@ -0,0 +1,443 @@
+/* wb_axi_master_tb. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*Testbench for wb_axi_master
+
+ A Wishbone master does single accesses and linear and wrap bursts with
+ random wait states to an AXI4 memory with random delays on all
+ channels. Bursts end early with cti, by dropping cyc or by going on to
+ the next access in the same cycle. Accesses with bit 10 of the address
+ set get SLVERR or DECERR from the memory. The memory checks that the
+ bridge keeps at most one transaction in flight, holds its valid signals
+ and payloads until they are taken and uses the burst lengths and types
+ described in wb_axi_master. The master checks every ack, err and read
+ against a reference copy of the memory, that a read after an ended
+ burst starts a new AXI burst and that bursts are only split where the
+ AXI burst ends.
+ */
+`default_nettype none
+module wb_axi_master_tb
+  #(parameter AUTORUN = 1);
+
+   localparam aw = 32;
+
+   localparam MEM_WORDS = 256;
+
+   localparam [1:0]
+     BURST_INCR = 2'b01,
+     BURST_WRAP = 2'b10;
+
+   reg wb_clk = 1'b1;
+   reg wb_rst = 1'b1;
+
+   //Wishbone master
+   reg [aw-1:0]  wb_adr = {aw{1'b0}};
+   reg [31:0] 	 wb_dat = 32'd0;
+   reg [3:0] 	 wb_sel = 4'hf;
+   reg 		 wb_we  = 1'b0;
+   reg 		 wb_cyc = 1'b0;
+   reg 		 wb_stb = 1'b0;
+   reg [2:0] 	 wb_cti = 3'b000;
+   reg [1:0] 	 wb_bte = 2'b00;
+   wire [31:0] 	 wb_rdt;
+   wire 	 wb_ack;
+   wire 	 wb_err;
+   wire 	 wb_rty;
+
+   //AXI4 memory
+   wire [aw-1:0] awaddr;
+   wire [7:0] 	 awlen;
+   wire [2:0] 	 awsize;
+   wire [1:0] 	 awburst;
+   wire 	 awvalid;
+   reg 		 awready = 1'b0;
+   wire [31:0] 	 wdata;
+   wire [3:0] 	 wstrb;
+   wire 	 wlast;
+   wire 	 wvalid;
+   reg 		 wready = 1'b0;
+   reg [1:0] 	 bresp = 2'b00;
+   reg 		 bvalid = 1'b0;
+   wire 	 bready;
+   wire [aw-1:0] araddr;
+   wire [7:0] 	 arlen;
+   wire [2:0] 	 arsize;
+   wire [1:0] 	 arburst;
+   wire 	 arvalid;
+   reg 		 arready = 1'b0;
+   reg [31:0] 	 rdata = 32'd0;
+   reg [1:0] 	 rresp = 2'b00;
+   reg 		 rlast = 1'b0;
+   reg 		 rvalid = 1'b0;
+   wire 	 rready;
+
+   reg [31:0] 	 mem [0:MEM_WORDS-1];
+
+   //Write in progress
+   reg 		 aw_done = 1'b0;
+   reg 		 w_done = 1'b0;
+   reg [aw-1:0]  w_addr;
+   reg [31:0] 	 w_data;
+   reg [3:0] 	 w_strb;
+   //Read burst in progress
+   reg 		 r_busy = 1'b0;
+   reg [aw-1:0]  r_addr;
+   reg [7:0] 	 r_len;
+   reg [1:0] 	 r_burst;
+   reg [7:0] 	 r_beat;
+
+   //Payloads of the last cycle, to check that they are held
+   reg 		 awvalid_q = 1'b0;
+   reg 		 wvalid_q = 1'b0;
+   reg 		 arvalid_q = 1'b0;
+   reg [aw+8+3+2-1:0] aw_q;
+   reg [32+4+1-1:0]   w_q;
+   reg [aw+8+3+2-1:0] ar_q;
+
+   //Kind of the Wishbone access in progress, to check the AXI burst.
+   //0 : single, 1 : linear burst, 2-4 : wrap burst with bte 1-3
+   integer 	 access_kind = 0;
+   //Number of AXI read bursts
+   integer 	 ar_count = 0;
+
+   reg [31:0] 	 ref_mem [0:MEM_WORDS-1];
+
+   integer  TRANSACTIONS;
+
+   generate
+      if (AUTORUN) begin
+         vlog_tb_utils vtu();
+         vlog_tap_generator #("wb_axi_master.tap", 1) vtg();
+
+         initial begin
+            run;
+            vtg.ok("wb_axi_master: All tests passed!");
+            $finish;
+         end
+      end
+   endgenerate
+
+   always #5 wb_clk <= ~wb_clk;
+
+   wb_axi_master
+     #(.aw (aw))
+   dut
+     (.wb_clk_i        (wb_clk),
+      .wb_rst_i        (wb_rst),
+      .wbs_adr_i       (wb_adr),
+      .wbs_dat_i       (wb_dat),
+      .wbs_sel_i       (wb_sel),
+      .wbs_we_i        (wb_we),
+      .wbs_cyc_i       (wb_cyc),
+      .wbs_stb_i       (wb_stb),
+      .wbs_cti_i       (wb_cti),
+      .wbs_bte_i       (wb_bte),
+      .wbs_dat_o       (wb_rdt),
+      .wbs_ack_o       (wb_ack),
+      .wbs_err_o       (wb_err),
+      .wbs_rty_o       (wb_rty),
+      .m_axi_awid_o    (),
+      .m_axi_awaddr_o  (awaddr),
+      .m_axi_awlen_o   (awlen),
+      .m_axi_awsize_o  (awsize),
+      .m_axi_awburst_o (awburst),
+      .m_axi_awlock_o  (),
+      .m_axi_awcache_o (),
+      .m_axi_awprot_o  (),
+      .m_axi_awvalid_o (awvalid),
+      .m_axi_awready_i (awready),
+      .m_axi_wdata_o   (wdata),
+      .m_axi_wstrb_o   (wstrb),
+      .m_axi_wlast_o   (wlast),
+      .m_axi_wvalid_o  (wvalid),
+      .m_axi_wready_i  (wready),
+      .m_axi_bid_i     (1'b0),
+      .m_axi_bresp_i   (bresp),
+      .m_axi_bvalid_i  (bvalid),
+      .m_axi_bready_o  (bready),
+      .m_axi_arid_o    (),
+      .m_axi_araddr_o  (araddr),
+      .m_axi_arlen_o   (arlen),
+      .m_axi_arsize_o  (arsize),
+      .m_axi_arburst_o (arburst),
+      .m_axi_arlock_o  (),
+      .m_axi_arcache_o (),
+      .m_axi_arprot_o  (),
+      .m_axi_arvalid_o (arvalid),
+      .m_axi_arready_i (arready),
+      .m_axi_rid_i     (1'b0),
+      .m_axi_rdata_i   (rdata),
+      .m_axi_rresp_i   (rresp),
+      .m_axi_rlast_i   (rlast),
+      .m_axi_rvalid_i  (rvalid),
+      .m_axi_rready_o  (rready));
+
+   //Address of the next beat of a Wishbone or AXI burst of 4, 8 or 16
+   //words, or of a linear burst if words is zero
+   function [aw-1:0] next_addr;
+      input [aw-1:0] addr;
+      input integer  words;
+      begin
+	 if (words)
+	   next_addr = (addr & ~(words*4-1)) | ((addr + 4) & (words*4-1));
+	 else
+	   next_addr = addr + 4;
+      end
+   endfunction
+
+   //AXI4 memory with random ready and response delays
+   always @(posedge wb_clk) begin
+      //Valid signals and payloads are held until they are taken
+      if ((awvalid_q & !awvalid) |
+	  (awvalid_q & awvalid & ({awaddr, awlen, awsize, awburst} !== aw_q)) |
+	  (wvalid_q & !wvalid) |
+	  (wvalid_q & wvalid & ({wdata, wstrb, wlast} !== w_q)) |
+	  (arvalid_q & !arvalid) |
+	  (arvalid_q & arvalid & ({araddr, arlen, arsize, arburst} !== ar_q))) begin
+	 $display("%m : Error: A valid signal or its payload changed before it was taken");
+	 $finish;
+      end
+      awvalid_q <= awvalid & !awready;
+      wvalid_q  <= wvalid  & !wready;
+      arvalid_q <= arvalid & !arready;
+      aw_q <= {awaddr, awlen, awsize, awburst};
+      w_q  <= {wdata, wstrb, wlast};
+      ar_q <= {araddr, arlen, arsize, arburst};
+
+      awready <= $urandom % 2;
+      wready  <= $urandom % 2;
+      arready <= $urandom % 2;
+
+      if (awvalid & awready) begin
+	 if (aw_done | r_busy | (awlen != 8'd0) | (awsize != 3'd2) | (awburst != BURST_INCR)) begin
+	    $display("%m : Error: Write to 0x%08x with len=%0d size=%0d burst=%0d while busy=%0d",
+		     awaddr, awlen, awsize, awburst, aw_done | r_busy);
+	    $finish;
+	 end
+	 aw_done <= 1'b1;
+	 w_addr  <= awaddr;
+      end
+      if (wvalid & wready) begin
+	 if (w_done | r_busy | !wlast) begin
+	    $display("%m : Error: Write data without wlast or while busy");
+	    $finish;
+	 end
+	 w_done <= 1'b1;
+	 w_data <= wdata;
+	 w_strb <= wstrb;
+      end
+      if (bvalid & bready) begin
+	 bvalid  <= 1'b0;
+	 aw_done <= 1'b0;
+	 w_done  <= 1'b0;
+      end else if (aw_done & w_done & !bvalid & ($urandom % 2)) begin
+	 bvalid <= 1'b1;
+	 if (w_addr[10])
+	   bresp <= ($urandom % 2) ? 2'b10 : 2'b11;
+	 else begin
+	    bresp <= 2'b00;
+	    if (w_strb[0]) mem[w_addr[9:2]][7:0]   <= w_data[7:0];
+	    if (w_strb[1]) mem[w_addr[9:2]][15:8]  <= w_data[15:8];
+	    if (w_strb[2]) mem[w_addr[9:2]][23:16] <= w_data[23:16];
+	    if (w_strb[3]) mem[w_addr[9:2]][31:24] <= w_data[31:24];
+	 end
+      end
+
+      if (arvalid & arready) begin
+	 if (aw_done | w_done | r_busy | (arsize != 3'd2) |
+	     ((wb_cti != 3'b010) & ((arlen != 8'd0) | (arburst != BURST_INCR))) |
+	     ((wb_cti == 3'b010) & (access_kind == 1) &
+	      ((arlen != {4'd0, ~araddr[5:2]}) | (arburst != BURST_INCR))) |
+	     ((wb_cti == 3'b010) & (access_kind >= 2) &
+	      ((arlen != (2 << (access_kind - 1)) - 1) | (arburst != BURST_WRAP)))) begin
+	    $display("%m : Error: Read from 0x%08x with len=%0d size=%0d burst=%0d in access kind %0d",
+		     araddr, arlen, arsize, arburst, access_kind);
+	    $finish;
+	 end
+	 ar_count <= ar_count + 1;
+	 r_busy  <= 1'b1;
+	 r_addr  <= araddr;
+	 r_len   <= arlen;
+	 r_burst <= arburst;
+	 r_beat  <= 8'd0;
+      end
+      if (rvalid & rready) begin
+	 rvalid <= 1'b0;
+	 r_addr <= next_addr(r_addr, (r_burst == BURST_WRAP) ? r_len + 1 : 0);
+	 r_beat <= r_beat + 8'd1;
+	 if (rlast)
+	   r_busy <= 1'b0;
+      end else if (r_busy & !rvalid & ($urandom % 2)) begin
+	 rvalid <= 1'b1;
+	 rlast  <= (r_beat == r_len);
+	 rdata  <= mem[r_addr[9:2]];
+	 rresp  <= !r_addr[10] ? 2'b00 : ($urandom % 2) ? 2'b10 : 2'b11;
+      end
+   end
+
+   //Responses must only be given to requests
+   always @(posedge wb_clk)
+     if ((wb_ack | wb_err | wb_rty) & !(wb_cyc & wb_stb)) begin
+	$display("%m : Error: Response without a request");
+	$finish;
+     end
+
+   //One Wishbone beat. Returns the read data and err
+   task beat;
+      input [aw-1:0]  adr;
+      input 	      we;
+      input [2:0]     cti;
+      output [31:0]   rdt;
+      output 	      err;
+      integer 	      timeout;
+      begin
+	 //Random wait states from the master
+	 wb_stb = 1'b0;
+	 while ($urandom % 4 == 0)
+	   @(posedge wb_clk) #1;
+	 wb_adr = adr;
+	 wb_we  = we;
+	 wb_dat = $urandom;
+	 wb_sel = we ? $urandom : 4'hf;
+	 wb_cti = cti;
+	 wb_stb = 1'b1;
+	 #1;
+	 timeout = 0;
+	 while (!(wb_ack | wb_err)) begin
+	    @(posedge wb_clk) #2;
+	    timeout = timeout + 1;
+	    if (timeout > 200) begin
+	       $display("%m : Error: Timeout at address 0x%08x", adr);
+	       $finish;
+	    end
+	 end
+	 if ((wb_ack & wb_err) | wb_rty | (wb_err != adr[10])) begin
+	    $display("%m : Error: ack=%0d err=%0d rty=%0d at address 0x%08x",
+		     wb_ack, wb_err, wb_rty, adr);
+	    $finish;
+	 end
+	 rdt = wb_rdt;
+	 err = wb_err;
+	 if (!we & !err & (rdt !== ref_mem[adr[9:2]])) begin
+	    $display("%m : Error: Read 0x%08x from 0x%08x, expected 0x%08x",
+		     rdt, adr, ref_mem[adr[9:2]]);
+	    $finish;
+	 end
+	 if (we & !err) begin
+	    if (wb_sel[0]) ref_mem[adr[9:2]][7:0]   = wb_dat[7:0];
+	    if (wb_sel[1]) ref_mem[adr[9:2]][15:8]  = wb_dat[15:8];
+	    if (wb_sel[2]) ref_mem[adr[9:2]][23:16] = wb_dat[23:16];
+	    if (wb_sel[3]) ref_mem[adr[9:2]][31:24] = wb_dat[31:24];
+	 end
+	 @(posedge wb_clk) #1;
+      end
+   endtask
+
+   task run;
+      integer 	     n;
+      integer 	     idx;
+      integer 	     len;
+      integer 	     words;
+      integer 	     ars;
+      integer 	     ar_idx;
+      reg [aw-1:0]   adr;
+      reg [aw-1:0]   adr_next;
+      reg 	     we;
+      reg [2:0]      cti;
+      reg [31:0]     rdt;
+      reg 	     err;
+      reg 	     new_burst;
+      reg 	     keep_cyc;
+      begin
+	 if(!$value$plusargs("transactions=%d", TRANSACTIONS))
+	   TRANSACTIONS = 1000;
+	 for (idx=0;idx<MEM_WORDS;idx=idx+1) begin
+	    mem[idx] = 0;
+	    ref_mem[idx] = 0;
+	 end
+	 repeat (2) @(posedge wb_clk);
+	 #1 wb_rst = 1'b0;
+
+	 new_burst = 1'b1;
+	 keep_cyc  = 1'b0;
+	 for (n=0;n<TRANSACTIONS;n=n+1) begin
+	    access_kind = $urandom % 5;
+	    we = ($urandom % 3) == 0;
+	    //One in eight accesses starts in the err region
+	    adr = {($urandom % 256), 2'b00} | ((($urandom % 8) == 0) << 10);
+	    //Or continues where the last one stopped
+	    if (keep_cyc & ($urandom % 2))
+	      adr = adr_next;
+	    if (access_kind == 0)
+	      len = 1;
+	    else if (access_kind == 1)
+	      len = 1 + $urandom % 24;
+	    else
+	      len = 1 + $urandom % (2 << access_kind);
+	    words = (access_kind >= 2) ? 2 << (access_kind - 1) : 0;
+	    wb_bte = (access_kind >= 2) ? access_kind - 1 : 2'b00;
+	    @(posedge wb_clk) #1;
+	    wb_cyc = 1'b1;
+	    ar_idx = -1;
+	    for (idx=0;idx<len;idx=idx+1) begin
+	       //Bursts that end early get cti=111 in the last beat, unless
+	       //the cycle is ended without it
+	       cti = (access_kind == 0) ? 3'b000 :
+		     (idx == len - 1) & ($urandom % 2) ? 3'b111 : 3'b010;
+	       ars = ar_count;
+	       beat(adr, we, cti, rdt, err);
+	       //Reads after an ended burst must not get its remaining beats
+	       if ((idx == 0) & !we & new_burst & (ar_count == ars)) begin
+		  $display("%m : Error: Read from 0x%08x did not start an AXI burst", adr);
+		  $finish;
+	       end
+	       //and a read burst must only be split where the AXI burst
+	       //started by it ends
+	       if (!we & (ar_count != ars)) begin
+		  if ((ar_idx >= 0) & (words ? ((idx - ar_idx) % words) : adr[5:2])) begin
+		     $display("%m : Error: Read burst split at 0x%08x", adr);
+		     $finish;
+		  end
+		  ar_idx = idx;
+	       end
+	       new_burst = we | (cti != 3'b010);
+	       adr = next_addr(adr, words);
+	    end
+	    adr_next = adr;
+	    //Keep cyc into the next access in one of four transactions, so
+	    //that a burst can also end by asking for another address
+	    keep_cyc = ($urandom % 4) == 0;
+	    if (!keep_cyc) begin
+	       wb_cyc = 1'b0;
+	       new_burst = 1'b1;
+	    end
+	    wb_stb = 1'b0;
+	    repeat ($urandom % 3) @(posedge wb_clk);
+	 end
+	 //Let the last read burst drain
+	 wb_cyc = 1'b0;
+	 repeat (100) @(posedge wb_clk);
+	 if (aw_done | w_done | r_busy) begin
+	    $display("%m : Error: AXI transaction still in progress");
+	    $finish;
+	 end
+      end
+   endtask
+
+endmodule
@@ -0,0 +1,463 @@
+/* wb_axi_slave_tb. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*Testbench for wb_axi_slave
+
+ An AXI4 master issues random FIXED, INCR and WRAP bursts of all sizes up
+ to 32 bits, with random gaps on wvalid and rready, to a Wishbone memory
+ that acks with random wait states. Accesses with bit 10 of the address
+ set are terminated with err by the memory. The memory checks the
+ address, cti and bte of every Wishbone beat against the AXI burst, and
+ the master checks the read data, the responses, rlast and the IDs
+ against a reference copy of the memory.
+ */
+`default_nettype none
+module wb_axi_slave_tb
+  #(parameter AUTORUN = 1);
+
+   localparam aw = 32;
+   localparam iw = 4;
+
+   localparam MEM_WORDS = 256;
+
+   localparam [1:0]
+     BURST_FIXED = 2'b00,
+     BURST_INCR  = 2'b01,
+     BURST_WRAP  = 2'b10;
+
+   reg wb_clk = 1'b1;
+   reg wb_rst = 1'b1;
+
+   //AXI4 master
+   reg [iw-1:0]  awid    = {iw{1'b0}};
+   reg [aw-1:0]  awaddr  = {aw{1'b0}};
+   reg [7:0] 	 awlen   = 8'd0;
+   reg [2:0] 	 awsize  = 3'd0;
+   reg [1:0] 	 awburst = 2'd0;
+   reg 		 awvalid = 1'b0;
+   wire 	 awready;
+   reg [31:0] 	 wdata   = 32'd0;
+   reg [3:0] 	 wstrb   = 4'h0;
+   reg 		 wlast   = 1'b0;
+   reg 		 wvalid  = 1'b0;
+   wire 	 wready;
+   wire [iw-1:0] bid;
+   wire [1:0] 	 bresp;
+   wire 	 bvalid;
+   reg 		 bready  = 1'b0;
+   reg [iw-1:0]  arid    = {iw{1'b0}};
+   reg [aw-1:0]  araddr  = {aw{1'b0}};
+   reg [7:0] 	 arlen   = 8'd0;
+   reg [2:0] 	 arsize  = 3'd0;
+   reg [1:0] 	 arburst = 2'd0;
+   reg 		 arvalid = 1'b0;
+   wire 	 arready;
+   wire [iw-1:0] rid;
+   wire [31:0] 	 rdata;
+   wire [1:0] 	 rresp;
+   wire 	 rlast;
+   wire 	 rvalid;
+   reg 		 rready  = 1'b0;
+
+   //Wishbone memory
+   wire [aw-1:0] wb_adr;
+   wire [31:0] 	 wb_dat;
+   wire [3:0] 	 wb_sel;
+   wire 	 wb_we;
+   wire 	 wb_cyc;
+   wire 	 wb_stb;
+   wire [2:0] 	 wb_cti;
+   wire [1:0] 	 wb_bte;
+   reg 		 wb_rdy = 1'b0;
+   reg [31:0] 	 mem [0:MEM_WORDS-1];
+   wire 	 wb_req = wb_cyc & wb_stb & wb_rdy;
+   wire 	 wb_ack = wb_req & !wb_adr[10];
+   wire 	 wb_err = wb_req &  wb_adr[10];
+   //Only the selected byte lanes are driven
+   wire [31:0] 	 wb_rdt = mem[wb_adr[9:2]] & {{8{wb_sel[3]}}, {8{wb_sel[2]}},
+					      {8{wb_sel[1]}}, {8{wb_sel[0]}}};
+
+   //Burst in progress, as seen by the AXI master
+   reg [aw-1:0]  cur_addr;
+   reg [7:0] 	 cur_len;
+   reg [2:0] 	 cur_size;
+   reg [1:0] 	 cur_burst;
+   reg 		 cur_we;
+   integer 	 wb_beat = 0;
+
+   reg [31:0] 	 ref_mem [0:MEM_WORDS-1];
+
+   integer  TRANSACTIONS;
+
+   generate
+      if (AUTORUN) begin
+         vlog_tb_utils vtu();
+         vlog_tap_generator #("wb_axi_slave.tap", 1) vtg();
+
+         initial begin
+            run;
+            vtg.ok("wb_axi_slave: All tests passed!");
+            $finish;
+         end
+      end
+   endgenerate
+
+   always #5 wb_clk <= ~wb_clk;
+
+   wb_axi_slave
+     #(.aw (aw),
+       .iw (iw))
+   dut
+     (.wb_clk_i        (wb_clk),
+      .wb_rst_i        (wb_rst),
+      .wbm_adr_o       (wb_adr),
+      .wbm_dat_o       (wb_dat),
+      .wbm_sel_o       (wb_sel),
+      .wbm_we_o        (wb_we),
+      .wbm_cyc_o       (wb_cyc),
+      .wbm_stb_o       (wb_stb),
+      .wbm_cti_o       (wb_cti),
+      .wbm_bte_o       (wb_bte),
+      .wbm_dat_i       (wb_rdt),
+      .wbm_ack_i       (wb_ack),
+      .wbm_err_i       (wb_err),
+      .wbm_rty_i       (1'b0),
+      .s_axi_awid_i    (awid),
+      .s_axi_awaddr_i  (awaddr),
+      .s_axi_awlen_i   (awlen),
+      .s_axi_awsize_i  (awsize),
+      .s_axi_awburst_i (awburst),
+      .s_axi_awlock_i  (1'b0),
+      .s_axi_awcache_i (4'b0000),
+      .s_axi_awprot_i  (3'b000),
+      .s_axi_awvalid_i (awvalid),
+      .s_axi_awready_o (awready),
+      .s_axi_wdata_i   (wdata),
+      .s_axi_wstrb_i   (wstrb),
+      .s_axi_wlast_i   (wlast),
+      .s_axi_wvalid_i  (wvalid),
+      .s_axi_wready_o  (wready),
+      .s_axi_bid_o     (bid),
+      .s_axi_bresp_o   (bresp),
+      .s_axi_bvalid_o  (bvalid),
+      .s_axi_bready_i  (bready),
+      .s_axi_arid_i    (arid),
+      .s_axi_araddr_i  (araddr),
+      .s_axi_arlen_i   (arlen),
+      .s_axi_arsize_i  (arsize),
+      .s_axi_arburst_i (arburst),
+      .s_axi_arlock_i  (1'b0),
+      .s_axi_arcache_i (4'b0000),
+      .s_axi_arprot_i  (3'b000),
+      .s_axi_arvalid_i (arvalid),
+      .s_axi_arready_o (arready),
+      .s_axi_rid_o     (rid),
+      .s_axi_rdata_o   (rdata),
+      .s_axi_rresp_o   (rresp),
+      .s_axi_rlast_o   (rlast),
+      .s_axi_rvalid_o  (rvalid),
+      .s_axi_rready_i  (rready));
+
+   //Address of beat n of an AXI burst
+   function [aw-1:0] beat_addr;
+      input [aw-1:0] addr;
+      input integer  n;
+      input [2:0]    size;
+      input [7:0]    len;
+      input [1:0]    burst;
+      integer 	     total;
+      reg [aw-1:0]   base;
+      begin
+	 total = (len + 1) << size;
+	 base = addr - addr % total;
+	 case (burst)
+	   BURST_FIXED : beat_addr = addr;
+	   BURST_WRAP  : beat_addr = base + (addr - base + (n << size)) % total;
+	   default     : beat_addr = addr + (n << size);
+	 endcase
+      end
+   endfunction
+
+   //Byte lanes of a beat
+   function [3:0] lanes;
+      input [aw-1:0] addr;
+      input [2:0]    size;
+      begin
+	 lanes = (size == 3'd0) ? 4'b0001 << addr[1:0] :
+		 (size == 3'd1) ? 4'b0011 << addr[1:0] :
+		 4'b1111;
+      end
+   endfunction
+
+   //Bursts that should become Wishbone bursts
+   function wb_burst;
+      input [2:0] size;
+      input [7:0] len;
+      input [1:0] burst;
+      begin
+	 wb_burst = (size == 3'd2) & (len != 8'd0) &
+		    ((burst == BURST_INCR) |
+		     ((burst == BURST_WRAP) & ((len == 3) | (len == 7) | (len == 15))));
+      end
+   endfunction
+
+   //Wishbone memory with random wait states. Checks every beat against
+   //the AXI burst in progress
+   always @(posedge wb_clk) begin
+      wb_rdy <= $urandom % 2;
+      if (!wb_cyc)
+	wb_beat <= 0;
+      if (wb_cyc & wb_stb & (wb_ack | wb_err)) begin
+	 if (wb_beat > cur_len) begin
+	    $display("%m : Error: Beat %0d of a burst with %0d beats", wb_beat, cur_len + 1);
+	    $finish;
+	 end
+	 if ((wb_we != cur_we) |
+	     (wb_adr != (beat_addr(cur_addr, wb_beat, cur_size, cur_len, cur_burst) & ~32'd3))) begin
+	    $display("%m : Error: Beat %0d at 0x%08x (we=%0d), expected 0x%08x (we=%0d)",
+		     wb_beat, wb_adr, wb_we,
+		     beat_addr(cur_addr, wb_beat, cur_size, cur_len, cur_burst) & ~32'd3, cur_we);
+	    $finish;
+	 end
+	 if (!wb_burst(cur_size, cur_len, cur_burst)) begin
+	    if ((wb_cti != 3'b000) | (wb_bte != 2'b00)) begin
+	       $display("%m : Error: cti=%0d bte=%0d in a classic access", wb_cti, wb_bte);
+	       $finish;
+	    end
+	 end else if ((wb_cti != ((wb_beat == cur_len) ? 3'b111 : 3'b010)) |
+		      (wb_bte != ((cur_burst == BURST_INCR) ? 2'b00 :
+				  (cur_len == 3) ? 2'b01 :
+				  (cur_len == 7) ? 2'b10 : 2'b11))) begin
+	    $display("%m : Error: cti=%0d bte=%0d in beat %0d of a burst with %0d beats",
+		     wb_cti, wb_bte, wb_beat, cur_len + 1);
+	    $finish;
+	 end
+	 if (wb_ack & wb_we) begin
+	    if (wb_sel[0]) mem[wb_adr[9:2]][7:0]   <= wb_dat[7:0];
+	    if (wb_sel[1]) mem[wb_adr[9:2]][15:8]  <= wb_dat[15:8];
+	    if (wb_sel[2]) mem[wb_adr[9:2]][23:16] <= wb_dat[23:16];
+	    if (wb_sel[3]) mem[wb_adr[9:2]][31:24] <= wb_dat[31:24];
+	 end
+	 wb_beat <= wb_beat + 1;
+      end
+   end
+
+   task axi_write;
+      input [iw-1:0] id;
+      input [aw-1:0] addr;
+      input [7:0]    len;
+      input [2:0]    size;
+      input [1:0]    burst;
+      integer 	     n;
+      integer 	     timeout;
+      reg [aw-1:0]   a;
+      reg 	     err;
+      begin
+	 cur_addr  = addr;
+	 cur_len   = len;
+	 cur_size  = size;
+	 cur_burst = burst;
+	 cur_we    = 1'b1;
+	 @(posedge wb_clk) #1;
+	 awid    = id;
+	 awaddr  = addr;
+	 awlen   = len;
+	 awsize  = size;
+	 awburst = burst;
+	 awvalid = 1'b1;
+	 #1;
+	 timeout = 0;
+	 while (!awready) begin
+	    @(posedge wb_clk) #2;
+	    timeout = timeout + 1;
+	    if (timeout > 100) begin
+	       $display("%m : Error: Timeout on the write address channel");
+	       $finish;
+	    end
+	 end
+	 @(posedge wb_clk) #1;
+	 awvalid = 1'b0;
+
+	 err = 1'b0;
+	 n = 0;
+	 timeout = 0;
+	 while (n <= len) begin
+	    a = beat_addr(addr, n, size, len, burst);
+	    if (!wvalid & ($urandom % 4 != 0)) begin
+	       wvalid = 1'b1;
+	       wdata  = $urandom;
+	       wstrb  = lanes(a, size) & $urandom;
+	       wlast  = (n == len);
+	    end
+	    #1;
+	    if (wvalid & wready) begin
+	       if (a[10])
+		 err = 1'b1;
+	       else begin
+		  if (wstrb[0]) ref_mem[a[9:2]][7:0]   = wdata[7:0];
+		  if (wstrb[1]) ref_mem[a[9:2]][15:8]  = wdata[15:8];
+		  if (wstrb[2]) ref_mem[a[9:2]][23:16] = wdata[23:16];
+		  if (wstrb[3]) ref_mem[a[9:2]][31:24] = wdata[31:24];
+	       end
+	       n = n + 1;
+	       timeout = 0;
+	       @(posedge wb_clk) #1;
+	       wvalid = 1'b0;
+	    end else begin
+	       @(posedge wb_clk) #1;
+	       timeout = timeout + 1;
+	       if (timeout > 100) begin
+		  $display("%m : Error: Timeout on beat %0d of the write data channel", n);
+		  $finish;
+	       end
+	    end
+	 end
+
+	 timeout = 0;
+	 bready = $urandom;
+	 #1;
+	 while (!(bvalid & bready)) begin
+	    @(posedge wb_clk) #1;
+	    bready = $urandom;
+	    #1;
+	    timeout = timeout + 1;
+	    if (timeout > 100) begin
+	       $display("%m : Error: Timeout on the write response channel");
+	       $finish;
+	    end
+	 end
+	 if ((bid != id) | (bresp != (err ? 2'b10 : 2'b00))) begin
+	    $display("%m : Error: Write response id=%0d resp=%0d, expected id=%0d resp=%0d",
+		     bid, bresp, id, err ? 2 : 0);
+	    $finish;
+	 end
+	 @(posedge wb_clk) #1;
+	 bready = 1'b0;
+      end
+   endtask
+
+   task axi_read;
+      input [iw-1:0] id;
+      input [aw-1:0] addr;
+      input [7:0]    len;
+      input [2:0]    size;
+      input [1:0]    burst;
+      integer 	     n;
+      integer 	     timeout;
+      reg [aw-1:0]   a;
+      reg [3:0]      sel;
+      reg [31:0]     mask;
+      begin
+	 cur_addr  = addr;
+	 cur_len   = len;
+	 cur_size  = size;
+	 cur_burst = burst;
+	 cur_we    = 1'b0;
+	 @(posedge wb_clk) #1;
+	 arid    = id;
+	 araddr  = addr;
+	 arlen   = len;
+	 arsize  = size;
+	 arburst = burst;
+	 arvalid = 1'b1;
+	 #1;
+	 timeout = 0;
+	 while (!arready) begin
+	    @(posedge wb_clk) #2;
+	    timeout = timeout + 1;
+	    if (timeout > 100) begin
+	       $display("%m : Error: Timeout on the read address channel");
+	       $finish;
+	    end
+	 end
+	 @(posedge wb_clk) #1;
+	 arvalid = 1'b0;
+
+	 n = 0;
+	 timeout = 0;
+	 while (n <= len) begin
+	    a = beat_addr(addr, n, size, len, burst);
+	    rready = ($urandom % 4 != 0);
+	    #1;
+	    if (rvalid & rready) begin
+	       sel  = lanes(a, size);
+	       mask = {{8{sel[3]}}, {8{sel[2]}}, {8{sel[1]}}, {8{sel[0]}}};
+	       if ((rid != id) | (rlast != (n == len)) |
+		   (rresp != (a[10] ? 2'b10 : 2'b00))) begin
+		  $display("%m : Error: Read beat %0d id=%0d resp=%0d last=%0d, expected id=%0d resp=%0d last=%0d",
+			   n, rid, rresp, rlast, id, a[10] ? 2 : 0, n == len);
+		  $finish;
+	       end
+	       if (!a[10] & ((rdata & mask) !== (ref_mem[a[9:2]] & mask))) begin
+		  $display("%m : Error: Read 0x%08x from 0x%08x, expected 0x%08x",
+			   rdata & mask, a, ref_mem[a[9:2]] & mask);
+		  $finish;
+	       end
+	       n = n + 1;
+	       timeout = 0;
+	    end else begin
+	       timeout = timeout + 1;
+	       if (timeout > 100) begin
+		  $display("%m : Error: Timeout on beat %0d of the read data channel", n);
+		  $finish;
+	       end
+	    end
+	    @(posedge wb_clk) #1;
+	 end
+	 rready = 1'b0;
+      end
+   endtask
+
+   task run;
+      integer 	     n;
+      integer 	     idx;
+      reg [aw-1:0]   addr;
+      reg [7:0]      len;
+      reg [2:0]      size;
+      reg [1:0]      burst;
+      begin
+	 if(!$value$plusargs("transactions=%d", TRANSACTIONS))
+	   TRANSACTIONS = 1000;
+	 for (idx=0;idx<MEM_WORDS;idx=idx+1) begin
+	    mem[idx] = 0;
+	    ref_mem[idx] = 0;
+	 end
+	 repeat (2) @(posedge wb_clk);
+	 #1 wb_rst = 1'b0;
+
+	 for (n=0;n<TRANSACTIONS;n=n+1) begin
+	    burst = $urandom % 3;
+	    //Mostly full width
+	    size = ($urandom % 2) ? 3'd2 : $urandom % 3;
+	    if (burst == BURST_WRAP)
+	      len = (2 << ($urandom % 4)) - 1;
+	    else
+	      len = $urandom % 32;
+	    //Aligned to the size. One in eight bursts is in the err region
+	    addr = (($urandom % 1024) & ~((1 << size) - 1)) |
+		   ((($urandom % 8) == 0) << 10);
+	    if ($urandom % 2)
+	      axi_write($urandom, addr, len, size, burst);
+	    else
+	      axi_read($urandom, addr, len, size, burst);
+	 end
+      end
+   endtask
+
+endmodule
@@ -123,6 +123,8 @@ module wb_cdc_tb
       .wbm_stb_i (wbm_m2s_stb),
       .wbm_dat_o (wbm_s2m_dat),
       .wbm_ack_o (wbm_s2m_ack),
+      .wbm_err_o (),
+      .wbm_rty_o (),
       // Wishbone Slave interface
       .wbs_clk   (wbs_clk),
       .wbs_rst   (wbs_rst),
@@ -133,7 +135,9 @@ module wb_cdc_tb
       .wbs_cyc_o (wbs_m2s_cyc),
       .wbs_stb_o (wbs_m2s_stb),
       .wbs_dat_i (wbs_s2m_dat),
-      .wbs_ack_i (wbs_s2m_ack & !wbs_rst));
+      .wbs_ack_i (wbs_s2m_ack & !wbs_rst),
+      .wbs_err_i (1'b0),
+      .wbs_rty_i (1'b0));
 
    wb_bfm_memory
      #(.DEBUG (0),
@@ -0,0 +1,183 @@
+/* wb_error_device_tb. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*Testbench for wb_error_device
+
+ Error devices with a latency of 1, 2 and 5 cycles get random accesses,
+ some of which are aborted by dropping cyc before the err arrives. Every
+ completed access must be terminated with err after exactly latency
+ cycles and never with ack or rty. The faulting address must be captured
+ with a single fault pulse, and the device must stall while it is busy.
+ */
+`default_nettype none
+module wb_error_device_tb
+  #(parameter AUTORUN = 1);
+
+   localparam aw = 32;
+   localparam dw = 32;
+
+   localparam NUM_DEVICES = 3;
+   localparam [32*NUM_DEVICES-1:0] LATENCIES = {32'd5, 32'd2, 32'd1};
+
+   reg wb_clk = 1'b1;
+   reg wb_rst = 1'b1;
+
+   reg [aw-1:0]  wbs_adr = {aw{1'b0}};
+   reg 		 wbs_we  = 1'b0;
+   reg 		 wbs_cyc = 1'b0;
+   reg 		 wbs_stb = 1'b0;
+
+   reg [1:0] 	 cfg = 2'd0;
+
+   wire [dw-1:0] wbs_rdt [0:NUM_DEVICES-1];
+   wire [NUM_DEVICES-1:0] wbs_ack;
+   wire [NUM_DEVICES-1:0] wbs_err;
+   wire [NUM_DEVICES-1:0] wbs_rty;
+   wire [NUM_DEVICES-1:0] wbs_stall;
+   wire [aw-1:0] 	  fault_adr [0:NUM_DEVICES-1];
+   wire [NUM_DEVICES-1:0] fault;
+
+   integer 		  faults = 0;
+
+   integer  TRANSACTIONS;
+
+   genvar   i;
+
+   generate
+      if (AUTORUN) begin
+         vlog_tb_utils vtu();
+         vlog_tap_generator #("wb_error_device.tap", 1) vtg();
+
+         initial begin
+            run;
+            vtg.ok("wb_error_device: All tests passed!");
+            $finish;
+         end
+      end
+   endgenerate
+
+   always #5 wb_clk <= ~wb_clk;
+
+   generate
+      for (i=0;i<NUM_DEVICES;i=i+1) begin : devices
+	 wb_error_device
+	   #(.dw (dw),
+	     .aw (aw),
+	     .latency (LATENCIES[i*32+:32]))
+	 dut
+	   (.wb_clk_i    (wb_clk),
+	    .wb_rst_i    (wb_rst),
+	    .wbs_adr_i   (wbs_adr),
+	    .wbs_dat_i   ({dw{1'b0}}),
+	    .wbs_sel_i   (4'hf),
+	    .wbs_we_i    (wbs_we),
+	    .wbs_cyc_i   (wbs_cyc & (cfg == i)),
+	    .wbs_stb_i   (wbs_stb & (cfg == i)),
+	    .wbs_cti_i   (3'b000),
+	    .wbs_bte_i   (2'b00),
+	    .wbs_dat_o   (wbs_rdt[i]),
+	    .wbs_ack_o   (wbs_ack[i]),
+	    .wbs_err_o   (wbs_err[i]),
+	    .wbs_rty_o   (wbs_rty[i]),
+	    .wbs_stall_o (wbs_stall[i]),
+	    .fault_adr_o (fault_adr[i]),
+	    .fault_o     (fault[i]));
+      end
+   endgenerate
+
+   //Count the fault pulses of the selected device
+   always @(posedge wb_clk)
+     if (fault[cfg])
+       faults <= faults + 1;
+
+   task run;
+      integer 	     n;
+      integer 	     idx;
+      integer 	     cycles;
+      integer 	     latency;
+      integer 	     abort;
+      integer 	     expected_faults;
+      begin
+	 if(!$value$plusargs("transactions=%d", TRANSACTIONS))
+	   TRANSACTIONS = 200;
+	 repeat (2) @(posedge wb_clk);
+	 #1 wb_rst = 1'b0;
+
+	 for (idx=0;idx<NUM_DEVICES;idx=idx+1) begin
+	    cfg = idx;
+	    latency = LATENCIES[idx*32+:32];
+	    expected_faults = faults;
+	    for (n=0;n<TRANSACTIONS;n=n+1) begin
+	       //Drop cyc before the err in one of four accesses
+	       abort = (($urandom % 4) == 0) ? $urandom % latency : -1;
+	       @(posedge wb_clk) #1;
+	       wbs_adr = $urandom;
+	       wbs_we  = $urandom;
+	       wbs_cyc = 1'b1;
+	       wbs_stb = 1'b1;
+	       #1;
+	       cycles = 0;
+	       while (!wbs_err[cfg] & (cycles != abort)) begin
+		  if (wbs_ack[cfg] | wbs_rty[cfg] | (wbs_rdt[cfg] !== {dw{1'b0}})) begin
+		     $display("%m : Error: Unexpected response from device %0d", cfg);
+		     $finish;
+		  end
+		  if ((cycles > 0) & !wbs_stall[cfg]) begin
+		     $display("%m : Error: Device %0d is busy but not stalled", cfg);
+		     $finish;
+		  end
+		  @(posedge wb_clk) #2;
+		  cycles = cycles + 1;
+	       end
+	       if (cycles == abort) begin
+		  wbs_cyc = 1'b0;
+		  wbs_stb = 1'b0;
+	       end else begin
+		  if (cycles != latency) begin
+		     $display("%m : Error: err after %0d cycles from device %0d, expected %0d",
+			      cycles, cfg, latency);
+		     $finish;
+		  end
+		  if (fault_adr[cfg] !== wbs_adr) begin
+		     $display("%m : Error: Fault address 0x%08x, expected 0x%08x",
+			      fault_adr[cfg], wbs_adr);
+		     $finish;
+		  end
+		  expected_faults = expected_faults + 1;
+		  @(posedge wb_clk) #1;
+		  wbs_cyc = 1'b0;
+		  wbs_stb = 1'b0;
+		  #1;
+		  if (wbs_err[cfg]) begin
+		     $display("%m : Error: err from device %0d after the end of the cycle", cfg);
+		     $finish;
+		  end
+	       end
+	    end
+	    @(posedge wb_clk) #1;
+	    if (faults != expected_faults) begin
+	       $display("%m : Error: %0d fault pulses from device %0d, expected %0d",
+			faults, cfg, expected_faults);
+	       $finish;
+	    end
+	 end
+      end
+   endtask
+
+endmodule
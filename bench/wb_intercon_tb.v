@@ -19,19 +19,49 @@
 module wb_intercon_tb;
 
    vlog_tb_utils vlog_tb_utils0();
-   vlog_tap_generator #("wb_intercon.tap", 3) vtg();
+   vlog_tap_generator #("wb_intercon.tap", 13) vtg();
 
-   wb_mux_tb     #(.AUTORUN (0)) wb_mux_tb();
-   wb_arbiter_tb #(.AUTORUN (0)) wb_arb_tb();
-   wb_cdc_tb     #(.AUTORUN (0)) wb_cdc_tb();
+   wb_mux_tb               #(.AUTORUN (0)) wb_mux_tb();
+   wb_mux_one_hot_tb       #(.AUTORUN (0)) wb_mux_one_hot_tb();
+   wb_upsizer_tb           #(.AUTORUN (0)) wb_upsizer_tb();
+   wb_arbiter_tb           #(.AUTORUN (0)) wb_arb_tb();
+   wb_cdc_tb               #(.AUTORUN (0)) wb_cdc_tb();
+   wb_reg_slice_tb         #(.AUTORUN (0)) wb_reg_slice_tb();
+   wb_mux_pipelined_tb     #(.AUTORUN (0)) wb_mux_pipelined_tb();
+   wb_arbiter_pipelined_tb #(.AUTORUN (0)) wb_arbiter_pipelined_tb();
+   wb_arbiter_qos_tb       #(.AUTORUN (0)) wb_arbiter_qos_tb();
+   wb_error_device_tb      #(.AUTORUN (0)) wb_error_device_tb();
+   wb_perf_counters_tb     #(.AUTORUN (0)) wb_perf_counters_tb();
+   wb_axi_slave_tb         #(.AUTORUN (0)) wb_axi_slave_tb();
+   wb_axi_master_tb        #(.AUTORUN (0)) wb_axi_master_tb();
 
    initial begin
       wb_mux_tb.run;
       vtg.ok("wb_mux: All tests passed!");
+      wb_mux_one_hot_tb.run;
+      vtg.ok("wb_mux_one_hot: All tests passed!");
+      wb_upsizer_tb.run;
+      vtg.ok("wb_upsizer: All tests passed!");
       wb_arb_tb.run;
       vtg.ok("wb_arbiter: All tests passed!");
       wb_cdc_tb.run;
       vtg.ok("wb_cdc: All tests passed!");
+      wb_reg_slice_tb.run;
+      vtg.ok("wb_reg_slice: All tests passed!");
+      wb_mux_pipelined_tb.run;
+      vtg.ok("wb_mux_pipelined: All tests passed!");
+      wb_arbiter_pipelined_tb.run;
+      vtg.ok("wb_arbiter_pipelined: All tests passed!");
+      wb_arbiter_qos_tb.run;
+      vtg.ok("wb_arbiter_qos: All tests passed!");
+      wb_error_device_tb.run;
+      vtg.ok("wb_error_device: All tests passed!");
+      wb_perf_counters_tb.run;
+      vtg.ok("wb_perf_counters: All tests passed!");
+      wb_axi_slave_tb.run;
+      vtg.ok("wb_axi_slave: All tests passed!");
+      wb_axi_master_tb.run;
+      vtg.ok("wb_axi_master: All tests passed!");
 
       #3 $finish;
    end
@@ -0,0 +1,207 @@
+/* wb_mux_one_hot_tb. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*Testbench for the one_hot mode of wb_mux
+
+ Two wb_muxes decode the same address map with overlapping regions and
+ an error device, one with one_hot=0 and one with one_hot=1. The
+ parameters are those that wb_intercon_gen2 emits for the map below
+ with decode set to priority and with the default decode. Both muxes
+ get the same accesses and device responses, and must select the same
+ device and give the same response for every address. The addresses
+ are swept around all regions and picked at random near the region
+ boundaries and in the whole address space.
+
+ hosts   : {cpu : {devices : [mem, boot, uart, gpio, spi, timer]}}
+ devices :
+   mem   : {offset : 0x00000000, size : 0x10000}
+   boot  : {offset : 0x00000000, size : 0x4000}
+   uart  : {offset : 0x00008000, size : 0x100}
+   gpio  : {offset : 0x00008100, size : 0x100}
+   spi   : {offset : 0x90000000, size : 0x1000}
+   timer : {offset : 0x90001000, size : 0x1000}
+ */
+`default_nettype none
+module wb_mux_one_hot_tb
+  #(parameter AUTORUN = 1);
+
+   localparam NUM_DEVICES = 7;
+
+   localparam aw = 32;
+   localparam dw = 32;
+
+   localparam [aw*NUM_DEVICES-1:0] MATCH_ADDR =
+     {32'h00000000, 32'h00000000, 32'h00000000, 32'h00008000,
+      32'h00008100, 32'h90000000, 32'h90001000};
+   localparam [aw*NUM_DEVICES-1:0] MATCH_MASK =
+     {32'h00000000, 32'hffff0000, 32'hffffc000, 32'hffffff00,
+      32'hffffff00, 32'hfffff000, 32'hfffff000};
+
+   localparam NUM_TERMS = 12;
+
+   localparam [aw*NUM_TERMS-1:0] TERM_ADDR =
+     {32'h00004000, 32'h00008200, 32'h00008400, 32'h00008800,
+      32'h00009000, 32'h0000a000, 32'h0000c000, 32'h00000000,
+      32'h00008000, 32'h00008100, 32'h90000000, 32'h90001000};
+   localparam [aw*NUM_TERMS-1:0] TERM_MASK =
+     {32'h9000c000, 32'h9000fe00, 32'h9000fc00, 32'h9000f800,
+      32'h9000f000, 32'h9000e000, 32'h9000c000, 32'h9000c000,
+      32'h9000ff00, 32'h9000ff00, 32'h9000f000, 32'h9000f000};
+   localparam [32*NUM_TERMS-1:0] TERM_DEVICE =
+     {32'd5, 32'd5, 32'd5, 32'd5, 32'd5, 32'd5, 32'd5, 32'd4,
+      32'd3, 32'd2, 32'd1, 32'd0};
+
+   reg wb_clk = 1'b1;
+   reg wb_rst = 1'b1;
+
+   reg [aw-1:0]  wbm_adr = {aw{1'b0}};
+   reg 		 wbm_cyc = 1'b0;
+   reg 		 wbm_stb = 1'b0;
+
+   reg [NUM_DEVICES*dw-1:0] wbs_rdt = {NUM_DEVICES*dw{1'b0}};
+   reg [NUM_DEVICES-1:0]    wbs_ack = {NUM_DEVICES{1'b0}};
+   reg [NUM_DEVICES-1:0]    wbs_err = {NUM_DEVICES{1'b0}};
+   reg [NUM_DEVICES-1:0]    wbs_rty = {NUM_DEVICES{1'b0}};
+
+   wire [NUM_DEVICES-1:0]   cyc [0:1];
+   wire [dw-1:0] 	    rdt [0:1];
+   wire [1:0] 		    ack;
+   wire [1:0] 		    err;
+   wire [1:0] 		    rty;
+
+   integer  TRANSACTIONS;
+
+   genvar   i;
+
+   generate
+      if (AUTORUN) begin
+         vlog_tb_utils vtu();
+         vlog_tap_generator #("wb_mux_one_hot.tap", 1) vtg();
+
+         initial begin
+            run;
+            vtg.ok("wb_mux_one_hot: All tests passed!");
+            $finish;
+         end
+      end
+   endgenerate
+
+   always #5 wb_clk <= ~wb_clk;
+
+   generate
+      for (i=0;i<2;i=i+1) begin : muxes
+	 wb_mux
+	   #(.num_devices    (NUM_DEVICES),
+	     .one_hot        (i),
+	     .num_terms      (i ? NUM_TERMS : NUM_DEVICES),
+	     .MATCH_ADDR     (i ? TERM_ADDR : MATCH_ADDR),
+	     .MATCH_MASK     (i ? TERM_MASK : MATCH_MASK),
+	     .MATCH_DEVICE   (TERM_DEVICE),
+	     .COMMON_ADDR    (32'h00000000),
+	     .COMMON_MASK    (32'h6fff0000),
+	     .default_device (i ? NUM_DEVICES-1 : -1))
+	 dut
+	   (.wb_clk_i  (wb_clk),
+	    .wb_rst_i  (wb_rst),
+	    .wbm_adr_i (wbm_adr),
+	    .wbm_dat_i ({dw{1'b0}}),
+	    .wbm_sel_i (4'hf),
+	    .wbm_we_i  (1'b0),
+	    .wbm_cyc_i (wbm_cyc),
+	    .wbm_stb_i (wbm_stb),
+	    .wbm_cti_i (3'b000),
+	    .wbm_bte_i (2'b00),
+	    .wbm_dat_o (rdt[i]),
+	    .wbm_ack_o (ack[i]),
+	    .wbm_err_o (err[i]),
+	    .wbm_rty_o (rty[i]),
+	    .wbs_adr_o (),
+	    .wbs_dat_o (),
+	    .wbs_sel_o (),
+	    .wbs_we_o  (),
+	    .wbs_cyc_o (cyc[i]),
+	    .wbs_stb_o (),
+	    .wbs_cti_o (),
+	    .wbs_bte_o (),
+	    .wbs_dat_i (wbs_rdt),
+	    .wbs_ack_i (wbs_ack),
+	    .wbs_err_i (wbs_err),
+	    .wbs_rty_i (wbs_rty));
+      end
+   endgenerate
+
+   //Both muxes must select the same device and pass on its response
+   task check;
+      input [aw-1:0] adr;
+      integer 	     idx;
+      begin
+	 @(posedge wb_clk) #1;
+	 wbm_adr = adr;
+	 wbm_cyc = $urandom;
+	 wbm_stb = $urandom;
+	 for (idx=0;idx<NUM_DEVICES;idx=idx+1)
+	   wbs_rdt[idx*dw+:dw] = $urandom;
+	 wbs_ack = $urandom;
+	 wbs_err = $urandom;
+	 wbs_rty = $urandom;
+	 #1;
+	 if ((cyc[0] !== cyc[1]) | (rdt[0] !== rdt[1]) |
+	     (ack[0] !== ack[1]) | (err[0] !== err[1]) | (rty[0] !== rty[1])) begin
+	    $display("%m : Error: Address 0x%08x: cyc %b/%b ack %b err %b rty %b with one_hot=0/1",
+		     adr, cyc[0], cyc[1], ack, err, rty);
+	    $finish;
+	 end
+	 if (wbm_cyc & (cyc[0] == {NUM_DEVICES{1'b0}})) begin
+	    $display("%m : Error: No device selected for address 0x%08x", adr);
+	    $finish;
+	 end
+      end
+   endtask
+
+   task run;
+      integer 	     n;
+      integer 	     idx;
+      reg [aw-1:0]   base;
+      begin
+	 if(!$value$plusargs("transactions=%d", TRANSACTIONS))
+	   TRANSACTIONS = 10000;
+	 repeat (2) @(posedge wb_clk);
+	 #1 wb_rst = 1'b0;
+
+	 //Sweep around all regions
+	 for (idx=0;idx<'h200;idx=idx+1) begin
+	    check(idx << 8);
+	    check(32'h90000000 | (idx << 6));
+	 end
+
+	 for (n=0;n<TRANSACTIONS;n=n+1) begin
+	    base = MATCH_ADDR[($urandom % NUM_DEVICES)*aw+:aw];
+	    case ($urandom % 3)
+	      //Near a region
+	      0 : check(base + ($urandom % 'h20000) - 'h8000);
+	      //A region with random bits flipped
+	      1 : check(base ^ (1 << ($urandom % aw)) ^ ($urandom % 'h10000));
+	      //Anywhere
+	      default : check($urandom);
+	    endcase
+	 end
+      end
+   endtask
+
+endmodule
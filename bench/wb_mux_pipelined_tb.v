@@ -0,0 +1,282 @@
+/* wb_mux_pipelined_tb. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*Testbench for wb_mux_pipelined
+
+ A pipelined master issues bursts of random reads and writes to three
+ pipelined memories and to an unmapped segment, which must be terminated
+ with err. The memories stall and answer at random, but in order. The
+ master checks that every request gets exactly one response, in the
+ order the requests were issued, with the expected data.
+ */
+`default_nettype none
+module wb_mux_pipelined_tb
+  #(parameter AUTORUN = 1);
+
+   localparam NUM_SLAVES = 3;
+
+   localparam aw = 32;
+   localparam dw = 32;
+
+   localparam MAX_OUTSTANDING = 4;
+
+   //Each slave has a 64 word segment. The fourth segment is unmapped
+   localparam MEM_WORDS = 64;
+   localparam [aw*NUM_SLAVES-1:0] MATCH_ADDR = {32'h00000200,
+						32'h00000100,
+						32'h00000000};
+   localparam [aw*NUM_SLAVES-1:0] MATCH_MASK = {NUM_SLAVES{32'hffffff00}};
+
+   reg wb_clk = 1'b1;
+   reg wb_rst = 1'b1;
+
+   //Master
+   reg [aw-1:0]  wbm_adr = {aw{1'b0}};
+   reg [dw-1:0]  wbm_dat = {dw{1'b0}};
+   reg 		 wbm_we  = 1'b0;
+   reg 		 wbm_cyc = 1'b0;
+   reg 		 wbm_stb = 1'b0;
+   wire [dw-1:0] wbm_rdt;
+   wire 	 wbm_ack;
+   wire 	 wbm_err;
+   wire 	 wbm_rty;
+   wire 	 wbm_stall;
+
+   wire [NUM_SLAVES*aw-1:0] wbs_adr;
+   wire [NUM_SLAVES*dw-1:0] wbs_dat;
+   wire [NUM_SLAVES-1:0]    wbs_we;
+   wire [NUM_SLAVES-1:0]    wbs_cyc;
+   wire [NUM_SLAVES-1:0]    wbs_stb;
+   wire [NUM_SLAVES*dw-1:0] wbs_rdt;
+   wire [NUM_SLAVES-1:0]    wbs_ack;
+   wire [NUM_SLAVES-1:0]    wbs_stall;
+
+   //Expected responses in request order
+   localparam EXP_SIZE = 64;
+   reg [dw-1:0]  exp_dat [0:EXP_SIZE-1];
+   reg 		 exp_rd  [0:EXP_SIZE-1];
+   reg 		 exp_err [0:EXP_SIZE-1];
+   integer 	 exp_wr = 0;
+   integer 	 exp_rd_ptr = 0;
+
+   reg [dw-1:0]  ref_mem [0:4*MEM_WORDS-1];
+
+   integer  TRANSACTIONS;
+
+   genvar   i;
+
+   generate
+      if (AUTORUN) begin
+         vlog_tb_utils vtu();
+         vlog_tap_generator #("wb_mux_pipelined.tap", 1) vtg();
+
+         initial begin
+            run;
+            vtg.ok("wb_mux_pipelined: All tests passed!");
+            $finish;
+         end
+      end
+   endgenerate
+
+   always #5 wb_clk <= ~wb_clk;
+
+   wb_mux_pipelined
+     #(.dw (dw),
+       .aw (aw),
+       .num_devices (NUM_SLAVES),
+       .max_outstanding (MAX_OUTSTANDING),
+       .MATCH_ADDR (MATCH_ADDR),
+       .MATCH_MASK (MATCH_MASK))
+   dut
+     (.wb_clk_i    (wb_clk),
+      .wb_rst_i    (wb_rst),
+      .wbm_adr_i   (wbm_adr),
+      .wbm_dat_i   (wbm_dat),
+      .wbm_sel_i   (4'hf),
+      .wbm_we_i    (wbm_we),
+      .wbm_cyc_i   (wbm_cyc),
+      .wbm_stb_i   (wbm_stb),
+      .wbm_cti_i   (3'b000),
+      .wbm_bte_i   (2'b00),
+      .wbm_dat_o   (wbm_rdt),
+      .wbm_ack_o   (wbm_ack),
+      .wbm_err_o   (wbm_err),
+      .wbm_rty_o   (wbm_rty),
+      .wbm_stall_o (wbm_stall),
+      .wbs_adr_o   (wbs_adr),
+      .wbs_dat_o   (wbs_dat),
+      .wbs_sel_o   (),
+      .wbs_we_o    (wbs_we),
+      .wbs_cyc_o   (wbs_cyc),
+      .wbs_stb_o   (wbs_stb),
+      .wbs_cti_o   (),
+      .wbs_bte_o   (),
+      .wbs_dat_i   (wbs_rdt),
+      .wbs_ack_i   (wbs_ack),
+      .wbs_err_i   ({NUM_SLAVES{1'b0}}),
+      .wbs_rty_i   ({NUM_SLAVES{1'b0}}),
+      .wbs_stall_i (wbs_stall));
+
+   //Pipelined memories that stall at random and answer their requests in
+   //order after a random delay
+   generate
+      for (i=0;i<NUM_SLAVES;i=i+1) begin : slaves
+	 reg [dw-1:0] mem [0:MEM_WORDS-1];
+	 reg [dw-1:0] fifo [0:15];
+	 integer      wr = 0;
+	 integer      rd = 0;
+	 integer      outstanding;
+	 reg [dw-1:0] rdt;
+	 reg 	      ack = 1'b0;
+	 reg 	      stall = 1'b0;
+	 wire [aw-1:0] adr = wbs_adr[i*aw+:aw];
+
+	 always @(posedge wb_clk) begin
+	    stall <= ($urandom % 4) == 0;
+	    ack <= 1'b0;
+	    if (wbs_cyc[i] & wbs_stb[i] & !stall) begin
+	       if (adr[31:8] != i) begin
+		  $display("%m : Error: Request to address 0x%08x", adr);
+		  $finish;
+	       end
+	       fifo[wr%16] <= mem[adr[7:2]];
+	       if (wbs_we[i])
+		 mem[adr[7:2]] <= wbs_dat[i*dw+:dw];
+	       wr <= wr + 1;
+	    end
+	    if ((rd != wr) & ($urandom % 2)) begin
+	       ack <= 1'b1;
+	       rdt <= fifo[rd%16];
+	       rd <= rd + 1;
+	    end
+	    if (!wbs_cyc[i] & (rd != wr)) begin
+	       $display("%m : Error: cyc dropped with responses outstanding");
+	       $finish;
+	    end
+	    //Accepted requests that have not been acknowledged yet
+	    outstanding = wr - rd + ack;
+	    if (outstanding > MAX_OUTSTANDING) begin
+	       $display("%m : Error: %0d requests in flight", outstanding);
+	       $finish;
+	    end
+	 end
+
+	 assign wbs_rdt[i*dw+:dw] = rdt;
+	 assign wbs_ack[i] = ack & wbs_cyc[i];
+	 assign wbs_stall[i] = stall;
+      end
+   endgenerate
+
+   //Check the responses against the expected ones
+   always @(posedge wb_clk) begin
+      if (wbm_cyc & (wbm_ack | wbm_err | wbm_rty)) begin
+	 if (exp_rd_ptr == exp_wr) begin
+	    $display("%m : Error: Response without a request");
+	    $finish;
+	 end
+	 if (wbm_rty | (wbm_ack & wbm_err) | (wbm_err != exp_err[exp_rd_ptr%EXP_SIZE])) begin
+	    $display("%m : Error: Unexpected response ack=%0d err=%0d rty=%0d",
+		     wbm_ack, wbm_err, wbm_rty);
+	    $finish;
+	 end
+	 if (wbm_ack & exp_rd[exp_rd_ptr%EXP_SIZE] &
+	     (wbm_rdt !== exp_dat[exp_rd_ptr%EXP_SIZE])) begin
+	    $display("%m : Error: Read 0x%08x, expected 0x%08x",
+		     wbm_rdt, exp_dat[exp_rd_ptr%EXP_SIZE]);
+	    $finish;
+	 end
+	 exp_rd_ptr <= exp_rd_ptr + 1;
+      end
+   end
+
+   task run;
+      integer 	     n;
+      integer 	     len;
+      integer 	     timeout;
+      integer 	     idx;
+      begin
+	 if(!$value$plusargs("transactions=%d", TRANSACTIONS))
+	   TRANSACTIONS = 2000;
+	 for (idx=0;idx<4*MEM_WORDS;idx=idx+1)
+	   ref_mem[idx] = 0;
+	 for (idx=0;idx<MEM_WORDS;idx=idx+1) begin
+	    slaves[0].mem[idx] = 0;
+	    slaves[1].mem[idx] = 0;
+	    slaves[2].mem[idx] = 0;
+	 end
+	 repeat (2) @(posedge wb_clk);
+	 #1 wb_rst = 1'b0;
+
+	 n = 0;
+	 while (n < TRANSACTIONS) begin
+	    //Bursts of 1 to 16 requests in one cycle
+	    @(posedge wb_clk) #1;
+	    wbm_cyc = 1'b1;
+	    len = 1 + $urandom % 16;
+	    while (len > 0) begin
+	       if ($urandom % 4) begin
+		  //Stay within one segment most of the time
+		  if ($urandom % 4)
+		    wbm_adr = (wbm_adr & 32'h00000300) | (($urandom % MEM_WORDS) << 2);
+		  else
+		    wbm_adr = (($urandom % 4) << 8) | (($urandom % MEM_WORDS) << 2);
+		  wbm_dat = $urandom;
+		  wbm_we  = $urandom;
+		  wbm_stb = 1'b1;
+		  #1;
+		  timeout = 0;
+		  while (wbm_stall) begin
+		     @(posedge wb_clk) #2;
+		     timeout = timeout + 1;
+		     if (timeout > 100) begin
+			$display("%m : Error: Stalled at address 0x%08x", wbm_adr);
+			$finish;
+		     end
+		  end
+		  //The request is accepted at the next clock edge
+		  exp_err[exp_wr%EXP_SIZE] = wbm_adr[9:8] == 2'd3;
+		  exp_rd[exp_wr%EXP_SIZE]  = !wbm_we;
+		  exp_dat[exp_wr%EXP_SIZE] = ref_mem[wbm_adr[9:2]];
+		  if (wbm_we)
+		    ref_mem[wbm_adr[9:2]] = wbm_dat;
+		  exp_wr = exp_wr + 1;
+		  len = len - 1;
+		  n = n + 1;
+		  @(posedge wb_clk) #1;
+		  wbm_stb = 1'b0;
+	       end else
+		 @(posedge wb_clk) #1;
+	    end
+	    //Wait for the remaining responses before ending the cycle
+	    timeout = 0;
+	    while (exp_rd_ptr != exp_wr) begin
+	       @(posedge wb_clk) #1;
+	       timeout = timeout + 1;
+	       if (timeout > 100) begin
+		  $display("%m : Error: Timeout waiting for %0d responses",
+			   exp_wr - exp_rd_ptr);
+		  $finish;
+	       end
+	    end
+	    wbm_cyc = 1'b0;
+	 end
+      end
+   endtask
+
+endmodule
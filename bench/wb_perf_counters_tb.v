@@ -0,0 +1,288 @@
+/* wb_perf_counters_tb. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*Testbench for wb_perf_counters
+
+ Random activity is put on the monitored edges and counted by a reference
+ model. Between the bursts of activity, the edges are idle and the
+ counters are read out at random addresses in the whole register space,
+ or the control register is written to clear the counters and to enable
+ or freeze them. Writes to other registers must be ignored. Every read
+ is checked against the reference model.
+ */
+`default_nettype none
+module wb_perf_counters_tb
+  #(parameter AUTORUN = 1);
+
+   localparam NUM_EDGES = 3;
+   localparam aw = 8;
+
+   reg wb_clk = 1'b1;
+   reg wb_rst = 1'b1;
+
+   //Monitored edges
+   reg [NUM_EDGES-1:0] edge_cyc  = {NUM_EDGES{1'b0}};
+   reg [NUM_EDGES-1:0] edge_stb  = {NUM_EDGES{1'b0}};
+   reg [NUM_EDGES-1:0] edge_ack  = {NUM_EDGES{1'b0}};
+   reg [NUM_EDGES-1:0] edge_err  = {NUM_EDGES{1'b0}};
+   reg [NUM_EDGES-1:0] edge_rty  = {NUM_EDGES{1'b0}};
+   reg [NUM_EDGES-1:0] edge_wait = {NUM_EDGES{1'b0}};
+
+   //Register interface
+   reg [aw-1:0]  wbs_adr = {aw{1'b0}};
+   reg [31:0] 	 wbs_dat = 32'd0;
+   reg [3:0] 	 wbs_sel = 4'hf;
+   reg 		 wbs_we  = 1'b0;
+   reg 		 wbs_cyc = 1'b0;
+   reg 		 wbs_stb = 1'b0;
+   wire [31:0] 	 wbs_rdt;
+   wire 	 wbs_ack;
+   wire 	 wbs_err;
+   wire 	 wbs_rty;
+   wire 	 wbs_stall;
+
+   //Reference model
+   reg [31:0] 	 transactions [0:NUM_EDGES-1];
+   reg [31:0] 	 busy         [0:NUM_EDGES-1];
+   reg [31:0] 	 waits        [0:NUM_EDGES-1];
+   reg [31:0] 	 errs         [0:NUM_EDGES-1];
+   reg [31:0] 	 rtys         [0:NUM_EDGES-1];
+   reg 		 enable;
+
+   integer  TRANSACTIONS;
+
+   integer  e;
+
+   generate
+      if (AUTORUN) begin
+         vlog_tb_utils vtu();
+         vlog_tap_generator #("wb_perf_counters.tap", 1) vtg();
+
+         initial begin
+            run;
+            vtg.ok("wb_perf_counters: All tests passed!");
+            $finish;
+         end
+      end
+   endgenerate
+
+   always #5 wb_clk <= ~wb_clk;
+
+   wb_perf_counters
+     #(.num_edges (NUM_EDGES),
+       .aw        (aw))
+   dut
+     (.wb_clk_i    (wb_clk),
+      .wb_rst_i    (wb_rst),
+      .edge_cyc_i  (edge_cyc),
+      .edge_stb_i  (edge_stb),
+      .edge_ack_i  (edge_ack),
+      .edge_err_i  (edge_err),
+      .edge_rty_i  (edge_rty),
+      .edge_wait_i (edge_wait),
+      .wbs_adr_i   (wbs_adr),
+      .wbs_dat_i   (wbs_dat),
+      .wbs_sel_i   (wbs_sel),
+      .wbs_we_i    (wbs_we),
+      .wbs_cyc_i   (wbs_cyc),
+      .wbs_stb_i   (wbs_stb),
+      .wbs_cti_i   (3'b000),
+      .wbs_bte_i   (2'b00),
+      .wbs_dat_o   (wbs_rdt),
+      .wbs_ack_o   (wbs_ack),
+      .wbs_err_o   (wbs_err),
+      .wbs_rty_o   (wbs_rty),
+      .wbs_stall_o (wbs_stall));
+
+   always @(posedge wb_clk)
+     if (enable)
+       for (e=0;e<NUM_EDGES;e=e+1) begin
+	  if (edge_ack[e])
+	    transactions[e] <= transactions[e] + 1;
+	  if (edge_cyc[e] & edge_stb[e])
+	    busy[e] <= busy[e] + 1;
+	  if (edge_cyc[e] & edge_stb[e] & edge_wait[e])
+	    waits[e] <= waits[e] + 1;
+	  if (edge_err[e])
+	    errs[e] <= errs[e] + 1;
+	  if (edge_rty[e])
+	    rtys[e] <= rtys[e] + 1;
+       end
+
+   //Expected contents of the register at adr
+   function [31:0] expected;
+      input [aw-1:0] adr;
+      integer 	     edge_sel;
+      begin
+	 expected = 32'd0;
+	 edge_sel = (adr >> 5) - 1;
+	 if ((adr >> 5) == 0) begin
+	    if (adr[4:2] == 3'd0)
+	      expected = {30'd0, enable, 1'b0};
+	    if (adr[4:2] == 3'd1)
+	      expected = NUM_EDGES;
+	 end else if (edge_sel < NUM_EDGES)
+	   case (adr[4:2])
+	     3'd0 : expected = transactions[edge_sel];
+	     3'd1 : expected = busy[edge_sel];
+	     3'd2 : expected = waits[edge_sel];
+	     3'd3 : expected = errs[edge_sel];
+	     3'd4 : expected = rtys[edge_sel];
+	     default : expected = 32'd0;
+	   endcase
+      end
+   endfunction
+
+   task clear;
+      integer idx;
+      begin
+	 for (idx=0;idx<NUM_EDGES;idx=idx+1) begin
+	    transactions[idx] = 32'd0;
+	    busy[idx]         = 32'd0;
+	    waits[idx]        = 32'd0;
+	    errs[idx]         = 32'd0;
+	    rtys[idx]         = 32'd0;
+	 end
+      end
+   endtask
+
+   task access;
+      input 	      we;
+      input [aw-1:0]  adr;
+      input [31:0]    dat;
+      input [3:0]     sel;
+      output [31:0]   rdt;
+      integer 	      timeout;
+      begin
+	 @(posedge wb_clk) #1;
+	 wbs_adr = adr;
+	 wbs_dat = dat;
+	 wbs_sel = sel;
+	 wbs_we  = we;
+	 wbs_cyc = 1'b1;
+	 wbs_stb = 1'b1;
+	 #1;
+	 if (wbs_stall) begin
+	    $display("%m : Error: Stall at the start of an access");
+	    $finish;
+	 end
+	 timeout = 0;
+	 while (!wbs_ack) begin
+	    @(posedge wb_clk) #2;
+	    timeout = timeout + 1;
+	    if (timeout > 10) begin
+	       $display("%m : Error: Timeout at address 0x%02x", adr);
+	       $finish;
+	    end
+	 end
+	 if (wbs_err | wbs_rty) begin
+	    $display("%m : Error: Unexpected err or rty at address 0x%02x", adr);
+	    $finish;
+	 end
+	 rdt = wbs_rdt;
+	 @(posedge wb_clk) #1;
+	 wbs_cyc = 1'b0;
+	 wbs_stb = 1'b0;
+      end
+   endtask
+
+   task read_check;
+      input [aw-1:0] adr;
+      reg [31:0]     rdt;
+      begin
+	 access(1'b0, adr, $urandom, 4'hf, rdt);
+	 if (rdt !== expected(adr)) begin
+	    $display("%m : Error: Read 0x%08x from address 0x%02x, expected 0x%08x",
+		     rdt, adr, expected(adr));
+	    $finish;
+	 end
+      end
+   endtask
+
+   task run;
+      integer 	     n;
+      integer 	     len;
+      integer 	     idx;
+      reg [aw-1:0]   adr;
+      reg [31:0]     dat;
+      reg [3:0]      sel;
+      reg [31:0]     rdt;
+      begin
+	 if(!$value$plusargs("transactions=%d", TRANSACTIONS))
+	   TRANSACTIONS = 500;
+	 clear;
+	 enable = 1'b1;
+	 repeat (2) @(posedge wb_clk);
+	 #1 wb_rst = 1'b0;
+
+	 for (idx=0;idx<64;idx=idx+1)
+	   read_check(idx*4);
+
+	 for (n=0;n<TRANSACTIONS;n=n+1) begin
+	    //Random activity on the edges
+	    len = $urandom % 50;
+	    for (idx=0;idx<len;idx=idx+1) begin
+	       @(posedge wb_clk) #1;
+	       edge_cyc  = $urandom;
+	       edge_stb  = $urandom;
+	       edge_ack  = $urandom;
+	       edge_err  = $urandom;
+	       edge_rty  = $urandom;
+	       edge_wait = $urandom;
+	    end
+	    @(posedge wb_clk) #1;
+	    edge_cyc  = {NUM_EDGES{1'b0}};
+	    edge_stb  = {NUM_EDGES{1'b0}};
+	    edge_ack  = {NUM_EDGES{1'b0}};
+	    edge_err  = {NUM_EDGES{1'b0}};
+	    edge_rty  = {NUM_EDGES{1'b0}};
+	    edge_wait = {NUM_EDGES{1'b0}};
+
+	    case ($urandom % 4)
+	      0 : begin
+		 //Write the control register
+		 dat = $urandom;
+		 sel = $urandom;
+		 access(1'b1, 8'h00, dat, sel, rdt);
+		 if (sel[0]) begin
+		    if (dat[0])
+		      clear;
+		    enable = dat[1];
+		 end
+		 read_check(8'h00);
+	      end
+	      1 : begin
+		 //Writes to other registers are ignored
+		 adr = {$urandom % 63 + 1, 2'b00};
+		 access(1'b1, adr, 32'hffffffff, 4'hf, rdt);
+	      end
+	      default : begin
+		 //Read out the counters
+		 for (idx=0;idx<8;idx=idx+1)
+		   read_check({$urandom % 64, 2'b00});
+	      end
+	    endcase
+	 end
+
+	 for (idx=0;idx<64;idx=idx+1)
+	   read_check(idx*4);
+      end
+   endtask
+
+endmodule
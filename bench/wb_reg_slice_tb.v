@@ -0,0 +1,242 @@
+/* wb_reg_slice_tb. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*Testbench for wb_reg_slice
+
+ One slice per combination of register_request and register_response sits
+ between a common master and a memory with random wait states. Only the
+ slice selected by cfg gets cyc from the master. Accesses above the memory
+ are terminated with err. Every read is checked against a reference copy
+ of the memory and every access must reach the memory exactly once.
+ */
+`default_nettype none
+module wb_reg_slice_tb
+  #(parameter AUTORUN = 1);
+
+   localparam aw = 32;
+   localparam dw = 32;
+
+   localparam MEM_WORDS = 64;
+   localparam MAX_WAIT  = 3;
+
+   reg wb_clk = 1'b1;
+   reg wb_rst = 1'b1;
+
+   //Master
+   reg [aw-1:0]  wbm_adr = {aw{1'b0}};
+   reg [dw-1:0]  wbm_dat = {dw{1'b0}};
+   reg [3:0] 	 wbm_sel = 4'hf;
+   reg 		 wbm_we  = 1'b0;
+   reg 		 wbm_cyc = 1'b0;
+   reg 		 wbm_stb = 1'b0;
+
+   reg [1:0] 	 cfg = 2'd0;
+
+   wire [dw-1:0] wbm_rdt [0:3];
+   wire [3:0] 	 wbm_ack;
+   wire [3:0] 	 wbm_err;
+   wire [3:0] 	 wbm_rty;
+
+   //Slave side of each slice
+   wire [aw-1:0] wbs_adr [0:3];
+   wire [dw-1:0] wbs_dat [0:3];
+   wire [3:0] 	 wbs_sel [0:3];
+   wire [3:0] 	 wbs_we;
+   wire [3:0] 	 wbs_cyc;
+   wire [3:0] 	 wbs_stb;
+
+   //Memory
+   reg [dw-1:0]  mem_rdt;
+   reg 		 mem_ack = 1'b0;
+   reg 		 mem_err = 1'b0;
+   reg [dw-1:0]  mem [0:MEM_WORDS-1];
+   reg [dw-1:0]  ref_mem [0:MEM_WORDS-1];
+   integer 	 mem_wait = 0;
+   integer 	 mem_accesses = 0;
+
+   integer  TRANSACTIONS;
+
+   genvar   i;
+
+   generate
+      if (AUTORUN) begin
+         vlog_tb_utils vtu();
+         vlog_tap_generator #("wb_reg_slice.tap", 1) vtg();
+
+         initial begin
+            run;
+            vtg.ok("wb_reg_slice: All tests passed!");
+            $finish;
+         end
+      end
+   endgenerate
+
+   always #5 wb_clk <= ~wb_clk;
+
+   generate
+      for (i=0;i<4;i=i+1) begin : slices
+	 wb_reg_slice
+	   #(.aw (aw),
+	    .dw (dw),
+	    .register_request  (i/2),
+	    .register_response (i%2))
+	 dut
+	   (.wb_clk_i  (wb_clk),
+	    .wb_rst_i  (wb_rst),
+	    .wbm_adr_i (wbm_adr),
+	    .wbm_dat_i (wbm_dat),
+	    .wbm_sel_i (wbm_sel),
+	    .wbm_we_i  (wbm_we),
+	    .wbm_cyc_i (wbm_cyc & (cfg == i)),
+	    .wbm_stb_i (wbm_stb & (cfg == i)),
+	    .wbm_cti_i (3'b000),
+	    .wbm_bte_i (2'b00),
+	    .wbm_dat_o (wbm_rdt[i]),
+	    .wbm_ack_o (wbm_ack[i]),
+	    .wbm_err_o (wbm_err[i]),
+	    .wbm_rty_o (wbm_rty[i]),
+	    .wbs_adr_o (wbs_adr[i]),
+	    .wbs_dat_o (wbs_dat[i]),
+	    .wbs_sel_o (wbs_sel[i]),
+	    .wbs_we_o  (wbs_we[i]),
+	    .wbs_cyc_o (wbs_cyc[i]),
+	    .wbs_stb_o (wbs_stb[i]),
+	    .wbs_cti_o (),
+	    .wbs_bte_o (),
+	    .wbs_dat_i (mem_rdt),
+	    .wbs_ack_i (mem_ack & (cfg == i)),
+	    .wbs_err_i (mem_err & (cfg == i)),
+	    .wbs_rty_i (1'b0));
+      end
+   endgenerate
+
+   //Memory with registered responses and 0 to MAX_WAIT wait states
+   wire [aw-1:0] s_adr = wbs_adr[cfg];
+   wire 	 s_req = wbs_cyc[cfg] & wbs_stb[cfg] & !mem_ack & !mem_err;
+
+   always @(posedge wb_clk) begin
+      mem_ack <= 1'b0;
+      mem_err <= 1'b0;
+      if (s_req) begin
+	 if (mem_wait > 0)
+	   mem_wait <= mem_wait - 1;
+	 else begin
+	    mem_wait <= $urandom % (MAX_WAIT+1);
+	    mem_accesses <= mem_accesses + 1;
+	    if (s_adr >= MEM_WORDS*4)
+	      mem_err <= 1'b1;
+	    else begin
+	       mem_ack <= 1'b1;
+	       mem_rdt <= mem[s_adr[31:2]];
+	       if (wbs_we[cfg])
+		 mem[s_adr[31:2]] <= wbs_dat[cfg];
+	    end
+	 end
+      end
+   end
+
+   task access;
+      input 	      we;
+      input [aw-1:0]  adr;
+      input [dw-1:0]  dat;
+      output [dw-1:0] rdt;
+      output 	      err;
+      integer 	      timeout;
+      begin
+	 @(posedge wb_clk) #1;
+	 wbm_adr = adr;
+	 wbm_dat = dat;
+	 wbm_we  = we;
+	 wbm_cyc = 1'b1;
+	 wbm_stb = 1'b1;
+	 #1;
+	 timeout = 0;
+	 while (!(wbm_ack[cfg] | wbm_err[cfg])) begin
+	    @(posedge wb_clk) #2;
+	    timeout = timeout + 1;
+	    if (timeout > 100) begin
+	       $display("%m : Error: Timeout at address 0x%08x", adr);
+	       $finish;
+	    end
+	 end
+	 if (wbm_rty[cfg]) begin
+	    $display("%m : Error: Unexpected rty at address 0x%08x", adr);
+	    $finish;
+	 end
+	 rdt = wbm_rdt[cfg];
+	 err = wbm_err[cfg];
+	 @(posedge wb_clk) #1;
+	 wbm_cyc = 1'b0;
+	 wbm_stb = 1'b0;
+      end
+   endtask
+
+   task run;
+      integer 	     n;
+      integer 	     idx;
+      integer 	     accesses;
+      reg [aw-1:0]   adr;
+      reg [dw-1:0]   dat;
+      reg [dw-1:0]   rdt;
+      reg 	     we;
+      reg 	     err;
+      begin
+	 if(!$value$plusargs("transactions=%d", TRANSACTIONS))
+	   TRANSACTIONS = 1000;
+	 for (idx=0;idx<MEM_WORDS;idx=idx+1) begin
+	    mem[idx] = 0;
+	    ref_mem[idx] = 0;
+	 end
+	 repeat (2) @(posedge wb_clk);
+	 #1 wb_rst = 1'b0;
+
+	 for (idx=0;idx<4;idx=idx+1) begin
+	    cfg = idx;
+	    accesses = mem_accesses;
+	    for (n=0;n<TRANSACTIONS;n=n+1) begin
+	       //One in eight accesses is outside of the memory
+	       adr = {($urandom % (MEM_WORDS+MEM_WORDS/8)), 2'b00};
+	       dat = $urandom;
+	       we  = $urandom;
+	       access(we, adr, dat, rdt, err);
+	       if (err != (adr >= MEM_WORDS*4)) begin
+		  $display("%m : Error: err=%0d at address 0x%08x (cfg %0d)", err, adr, cfg);
+		  $finish;
+	       end
+	       if (!err) begin
+		  if (!we && (rdt !== ref_mem[adr[31:2]])) begin
+		     $display("%m : Error: Read 0x%08x from address 0x%08x, expected 0x%08x (cfg %0d)",
+			      rdt, adr, ref_mem[adr[31:2]], cfg);
+		     $finish;
+		  end
+		  if (we)
+		    ref_mem[adr[31:2]] = dat;
+	       end
+	    end
+	    @(posedge wb_clk) #1;
+	    if (mem_accesses - accesses != TRANSACTIONS) begin
+	       $display("%m : Error: %0d accesses reached the memory, expected %0d (cfg %0d)",
+			mem_accesses - accesses, TRANSACTIONS, cfg);
+	       $finish;
+	    end
+	 end
+      end
+   endtask
+
+endmodule
@@ -16,147 +16,393 @@
  * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
  * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
  */
+
+/*Testbench for wb_upsizer
+
+ Upsizers with SCALE 2, 4 and 8 get single accesses and linear and wrap
+ bursts with random wait states, each to its own wide memory with random
+ wait states. Bursts end with cti or by dropping cyc, and may be
+ followed by another access in the same cycle, which is a single access
+ if the burst was not ended. Some accesses continue at the next address
+ of the last read, or write next to the last write before its merged
+ write has finished. Accesses with bit 10 of the address set get err
+ from the memory.
+
+ The master checks every ack, err and read against a reference copy of
+ the memory. The memory checks that wide reads only select the addressed
+ lane unless they are part of a burst, and that wide bursts continue at
+ the next address of the burst. It also counts the wide accesses, which
+ must be one for each run of beats in the same wide word, so that write
+ beats are merged and read beats are fetched once per wide word.
+ */
+`default_nettype none
 module wb_upsizer_tb
-  (input wire  wb_clk_i,
-   input wire  wb_rst_i,
-   output wire done);
+  #(parameter AUTORUN = 1);
 
    localparam aw = 32;
-   localparam MEMORY_SIZE_WORDS = 2**10;
-
-   localparam DW_IN = 32;
-   localparam SCALE = 2;
-   localparam DW_OUT = DW_IN * SCALE;
-
-   wire [aw-1:0] wbm_m2s_adr;
-   wire [DW_IN-1:0] wbm_m2s_dat;
-   wire [DW_IN/8-1:0] wbm_m2s_sel;
-   wire 	      wbm_m2s_we ;
-   wire 	      wbm_m2s_cyc;
-   wire 	      wbm_m2s_stb;
-   wire [2:0] 	      wbm_m2s_cti;
-   wire [1:0] 	      wbm_m2s_bte;
-   wire [DW_IN-1:0]   wbm_s2m_dat;
-   wire 	      wbm_s2m_ack;
-   wire 	      wbm_s2m_err;
-   wire 	      wbm_s2m_rty;
-
-   wire [aw-1:0]      wbs_m2s_adr;
-   wire [DW_OUT-1:0]  wbs_m2s_dat;
-   wire [DW_OUT/8-1:0] wbs_m2s_sel;
-   wire 	       wbs_m2s_we ;
-   wire 	       wbs_m2s_cyc;
-   wire 	       wbs_m2s_stb;
-   wire [2:0] 	       wbs_m2s_cti;
-   wire [1:0] 	       wbs_m2s_bte;
-   wire [DW_OUT-1:0]   wbs_s2m_dat;
-   wire 	       wbs_s2m_ack;
-   wire 	       wbs_s2m_err;
-   wire 	       wbs_s2m_rty;
-
-   wire [31:0] 	 slave_writes;
-   wire [31:0] 	 slave_reads;
-
-   wb_bfm_transactor
-     #(.MEM_HIGH(MEMORY_SIZE_WORDS-1),
-       .MEM_LOW (0),
-       .VERBOSE (0))
-   wb_bfm_transactor0
-     (.wb_clk_i (wb_clk_i),
-      .wb_rst_i (wb_rst_i),
-      .wb_adr_o (wbm_m2s_adr),
-      .wb_dat_o (wbm_m2s_dat),
-      .wb_sel_o (wbm_m2s_sel),
-      .wb_we_o  (wbm_m2s_we ),
-      .wb_cyc_o (wbm_m2s_cyc),
-      .wb_stb_o (wbm_m2s_stb),
-      .wb_cti_o (wbm_m2s_cti),
-      .wb_bte_o (wbm_m2s_bte),
-      .wb_dat_i (wbm_s2m_dat),
-      .wb_ack_i (wbm_s2m_ack),
-      .wb_err_i (wbm_s2m_err),
-      .wb_rty_i (wbm_s2m_rty),
-      //Test Control
-      .done(done));
-
-   integer 	 idx;
-
-   always @(done) begin
-      if(done === 1) begin
-	 $display("Average wait times");
-	 $display("Master : %f", ack_delay/num_transactions);
-	 $display("%0d : All tests passed!", $time);
+
+   localparam NUM_DUTS = 3;
+   localparam [32*NUM_DUTS-1:0] SCALES = {32'd8, 32'd4, 32'd2};
+
+   localparam MEM_BYTES = 1024;
+
+   reg wb_clk = 1'b1;
+   reg wb_rst = 1'b1;
+
+   //Narrow master
+   reg [aw-1:0]  wb_adr = {aw{1'b0}};
+   reg [31:0] 	 wb_dat = 32'd0;
+   reg [3:0] 	 wb_sel = 4'hf;
+   reg 		 wb_we  = 1'b0;
+   reg 		 wb_cyc = 1'b0;
+   reg 		 wb_stb = 1'b0;
+   reg [2:0] 	 wb_cti = 3'b000;
+   reg [1:0] 	 wb_bte = 2'b00;
+
+   reg [1:0] 	 cfg = 2'd0;
+
+   wire [31:0] 	 wb_rdt [0:NUM_DUTS-1];
+   wire [NUM_DUTS-1:0] wb_ack;
+   wire [NUM_DUTS-1:0] wb_err;
+   wire [NUM_DUTS-1:0] wb_rty;
+
+   //Activity on the wide side
+   wire [NUM_DUTS-1:0] wide_cyc;
+   wire [31:0] 	       accesses [0:NUM_DUTS-1];
+
+   reg [7:0] 	       ref_mem [0:NUM_DUTS*MEM_BYTES-1];
+
+   integer  TRANSACTIONS;
+
+   genvar   i;
+
+   generate
+      if (AUTORUN) begin
+         vlog_tb_utils vtu();
+         vlog_tap_generator #("wb_upsizer.tap", 1) vtg();
+
+         initial begin
+            run;
+            vtg.ok("wb_upsizer: All tests passed!");
+            $finish;
+         end
+      end
+   endgenerate
+
+   always #5 wb_clk <= ~wb_clk;
+
+   //Address of the next beat of a burst with burst type bte, in bytes of
+   //size bytes
+   function [aw-1:0] next_addr;
+      input [aw-1:0] addr;
+      input [1:0]    bte;
+      input integer  size;
+      reg [aw-1:0]   mask;
+      begin
+	 mask = (bte == 2'b00) ? {aw{1'b1}} : (size << (bte + 1)) - 1;
+	 next_addr = (addr & ~mask) | ((addr + size) & mask);
       end
-   end
-
-   wb_upsizer
-     #(.DW_IN (DW_IN),
-       .SCALE (SCALE))
-   dut
-     (.wb_clk_i  (wb_clk_i),
-      .wb_rst_i  (wb_rst_i),
-      // Master Interface
-      .wbs_adr_i (wbm_m2s_adr),
-      .wbs_dat_i (wbm_m2s_dat),
-      .wbs_sel_i (wbm_m2s_sel),
-      .wbs_we_i  (wbm_m2s_we ),
-      .wbs_cyc_i (wbm_m2s_cyc),
-      .wbs_stb_i (wbm_m2s_stb),
-      .wbs_cti_i (wbm_m2s_cti),
-      .wbs_bte_i (wbm_m2s_bte),
-      .wbs_dat_o (wbm_s2m_dat),
-      .wbs_ack_o (wbm_s2m_ack),
-      .wbs_err_o (wbm_s2m_err),
-      .wbs_rty_o (wbm_s2m_rty),
-      // Wishbone Slave interface
-      .wbm_adr_o (wbs_m2s_adr),
-      .wbm_dat_o (wbs_m2s_dat),
-      .wbm_sel_o (wbs_m2s_sel),
-      .wbm_we_o  (wbs_m2s_we),
-      .wbm_cyc_o (wbs_m2s_cyc),
-      .wbm_stb_o (wbs_m2s_stb),
-      .wbm_cti_o (wbs_m2s_cti),
-      .wbm_bte_o (wbs_m2s_bte),
-      .wbm_dat_i (wbs_s2m_dat),
-      .wbm_ack_i (wbs_s2m_ack),
-      .wbm_err_i (wbs_s2m_err),
-      .wbm_rty_i (wbs_s2m_rty));
-
-   assign slave_writes = mem.writes;
-   assign slave_reads  = mem.reads;
-
-   time start_time;
-   time ack_delay;
-   integer num_transactions;
-
-   initial begin
-      ack_delay = 0;
-      num_transactions = 0;
-      while(1) begin
-	 @(posedge wbm_m2s_cyc);
-	 start_time = $time;
-	 @(posedge wbm_s2m_ack);
-	 ack_delay = ack_delay + $time-start_time;
-	 num_transactions = num_transactions+1;
+   endfunction
+
+   generate
+      for (i=0;i<NUM_DUTS;i=i+1) begin : duts
+	 localparam SCALE = SCALES[i*32+:32];
+	 localparam DW = 32*SCALE;
+	 localparam SW = DW/8;
+
+	 wire [aw-1:0] adr;
+	 wire [DW-1:0] wdat;
+	 wire [SW-1:0] sel;
+	 wire 	       we;
+	 wire 	       cyc;
+	 wire 	       stb;
+	 wire [2:0]    cti;
+	 wire [1:0]    bte;
+	 reg [DW-1:0]  rdat;
+	 wire 	       ack;
+	 wire 	       err;
+
+	 reg [7:0]     mem [0:MEM_BYTES-1];
+	 reg 	       rdy = 1'b0;
+	 reg [31:0]    count = 32'd0;
+	 //Next address of a wide burst
+	 reg 	       cont = 1'b0;
+	 reg [aw-1:0]  cont_adr;
+
+	 integer       b;
+
+	 wb_upsizer
+	   #(.DW_IN (32),
+	     .SCALE (SCALE),
+	     .AW    (aw))
+	 dut
+	   (.wb_clk_i  (wb_clk),
+	    .wb_rst_i  (wb_rst),
+	    .wbs_adr_i (wb_adr),
+	    .wbs_dat_i (wb_dat),
+	    .wbs_sel_i (wb_sel),
+	    .wbs_we_i  (wb_we),
+	    .wbs_cyc_i (wb_cyc & (cfg == i)),
+	    .wbs_stb_i (wb_stb & (cfg == i)),
+	    .wbs_cti_i (wb_cti),
+	    .wbs_bte_i (wb_bte),
+	    .wbs_dat_o (wb_rdt[i]),
+	    .wbs_ack_o (wb_ack[i]),
+	    .wbs_err_o (wb_err[i]),
+	    .wbs_rty_o (wb_rty[i]),
+	    .wbm_adr_o (adr),
+	    .wbm_dat_o (wdat),
+	    .wbm_sel_o (sel),
+	    .wbm_we_o  (we),
+	    .wbm_cyc_o (cyc),
+	    .wbm_stb_o (stb),
+	    .wbm_cti_o (cti),
+	    .wbm_bte_o (bte),
+	    .wbm_dat_i (rdat),
+	    .wbm_ack_i (ack),
+	    .wbm_err_i (err),
+	    .wbm_rty_i (1'b0));
+
+	 assign ack = cyc & stb & rdy & !adr[10];
+	 assign err = cyc & stb & rdy &  adr[10];
+
+	 assign wide_cyc[i] = cyc;
+	 assign accesses[i] = count;
+
+	 //Only the selected lanes are driven on reads
+	 always @(*)
+	   for (b=0;b<SW;b=b+1)
+	     rdat[b*8+:8] = sel[b] ? mem[(adr+b) % MEM_BYTES] : 8'hxx;
+
+	 initial
+	   for (b=0;b<MEM_BYTES;b=b+1)
+	     mem[b] = 8'd0;
+
+	 always @(posedge wb_clk) begin
+	    rdy <= ($urandom % 3) != 0;
+	    if (cyc & stb & (ack | err)) begin
+	       if (adr % SW) begin
+		  $display("%m : Error: Unaligned wide address 0x%08x", adr);
+		  $finish;
+	       end
+	       //Reads are never merged, so they belong to the current beat
+	       if (!we & (sel !== ((wb_cti == 3'b010) ? {SW{1'b1}} :
+				   {{SW-4{1'b0}}, 4'hf} << (wb_adr % SW)))) begin
+		  $display("%m : Error: Read from 0x%08x with sel %b for 0x%08x with cti %b",
+			   adr, sel, wb_adr, wb_cti);
+		  $finish;
+	       end
+	       //Read bursts are wide bursts unless they wrap within 4 wide words
+	       if (!we & ((wb_cti == 3'b010) & ((wb_bte == 2'b00) | ((8 << wb_bte) >= 16*SCALE)) ?
+			  ((cti != 3'b010) | (bte != ((wb_bte == 2'b00) ? 2'b00 : wb_bte - $clog2(SCALE)))) :
+			  (cti == 3'b010))) begin
+		  $display("%m : Error: Read from 0x%08x with cti %b bte %b for cti %b bte %b",
+			   adr, cti, bte, wb_cti, wb_bte);
+		  $finish;
+	       end
+	       if (((cti == 3'b010) | (cti == 3'b111)) & cont & (adr != cont_adr)) begin
+		  $display("%m : Error: Burst continued at 0x%08x, expected 0x%08x", adr, cont_adr);
+		  $finish;
+	       end
+	       if ((cti == 3'b111) & !cont) begin
+		  $display("%m : Error: End of burst at 0x%08x outside a burst", adr);
+		  $finish;
+	       end
+	       if (we & ack)
+		 for (b=0;b<SW;b=b+1)
+		   if (sel[b])
+		     mem[(adr+b) % MEM_BYTES] <= wdat[b*8+:8];
+	       count    <= count + 1;
+	       cont     <= ack & (cti == 3'b010);
+	       cont_adr <= next_addr(adr, bte, SW);
+	    end
+	    if (!cyc)
+	      cont <= 1'b0;
+	 end
       end
-   end
-
-   wb_bfm_memory #(.DEBUG (0),
-		   .dw (DW_OUT),
-		   .mem_size_bytes(MEMORY_SIZE_WORDS*(DW_IN/8)))
-   mem
-     (.wb_clk_i (wb_clk_i),
-      .wb_rst_i (wb_rst_i),
-      .wb_adr_i (wbs_m2s_adr),
-      .wb_dat_i (wbs_m2s_dat),
-      .wb_sel_i (wbs_m2s_sel),
-      .wb_we_i  (wbs_m2s_we),
-      .wb_cyc_i (wbs_m2s_cyc),
-      .wb_stb_i (wbs_m2s_stb),
-      .wb_cti_i (wbs_m2s_cti),
-      .wb_bte_i (wbs_m2s_bte),
-      .wb_dat_o (wbs_s2m_dat),
-      .wb_ack_o (wbs_s2m_ack),
-      .wb_err_o (wbs_s2m_err),
-      .wb_rty_o (wbs_s2m_rty));
+   endgenerate
+
+   //Responses must only be given to requests
+   always @(posedge wb_clk)
+     if ((wb_ack[cfg] | wb_err[cfg] | wb_rty[cfg]) & !(wb_cyc & wb_stb)) begin
+	$display("%m : Error: Response without a request");
+	$finish;
+     end
+
+   //One narrow beat
+   task beat;
+      input [aw-1:0]  adr;
+      input 	      we;
+      input [2:0]     cti;
+      input 	      exp_err;
+      integer 	      timeout;
+      integer 	      b;
+      begin
+	 //Random wait states from the master
+	 wb_stb = 1'b0;
+	 while ($urandom % 4 == 0)
+	   @(posedge wb_clk) #1;
+	 wb_adr = adr;
+	 wb_we  = we;
+	 wb_dat = $urandom;
+	 wb_sel = we ? $urandom % 15 + 1 : 4'hf;
+	 wb_cti = cti;
+	 wb_stb = 1'b1;
+	 #1;
+	 timeout = 0;
+	 while (!(wb_ack[cfg] | wb_err[cfg])) begin
+	    @(posedge wb_clk) #2;
+	    timeout = timeout + 1;
+	    if (timeout > 100) begin
+	       $display("%m : Error: Timeout at address 0x%08x", adr);
+	       $finish;
+	    end
+	 end
+	 if ((wb_ack[cfg] & wb_err[cfg]) | wb_rty[cfg] | (wb_err[cfg] != exp_err)) begin
+	    $display("%m : Error: ack=%0d err=%0d rty=%0d at address 0x%08x, expected err=%0d",
+		     wb_ack[cfg], wb_err[cfg], wb_rty[cfg], adr, exp_err);
+	    $finish;
+	 end
+	 for (b=0;b<4;b=b+1)
+	   if (we & !adr[10] & wb_sel[b])
+	     ref_mem[cfg*MEM_BYTES + (adr+b) % MEM_BYTES] = wb_dat[b*8+:8];
+	   else if (!we & !exp_err &
+		    (wb_rdt[cfg][b*8+:8] !== ref_mem[cfg*MEM_BYTES + (adr+b) % MEM_BYTES])) begin
+	      $display("%m : Error: Read 0x%08x from 0x%08x with SCALE %0d", wb_rdt[cfg], adr,
+		       SCALES[cfg*32+:32]);
+	      $finish;
+	   end
+	 @(posedge wb_clk) #1;
+      end
+   endtask
+
+   //Wait for the upsizer to finish after the end of the cycle
+   task idle;
+      integer timeout;
+      begin
+	 timeout = 0;
+	 while (wide_cyc[cfg]) begin
+	    @(posedge wb_clk) #1;
+	    timeout = timeout + 1;
+	    if (timeout > 100) begin
+	       $display("%m : Error: Wide cycle still in progress");
+	       $finish;
+	    end
+	 end
+      end
+   endtask
+
+   task run;
+      integer 	     n;
+      integer 	     idx;
+      integer 	     len;
+      integer 	     kind;
+      integer 	     wsize;
+      integer 	     expected;
+      integer 	     count;
+      reg [aw-1:0]   adr;
+      reg [aw-1:0]   last_adr;
+      reg 	     we;
+      reg 	     last_we;
+      reg [2:0]      cti;
+      reg 	     in_err;
+      reg 	     keep_cyc;
+      reg 	     wait_idle;
+      reg 	     single;
+      begin
+	 if(!$value$plusargs("transactions=%d", TRANSACTIONS))
+	   TRANSACTIONS = 1000;
+	 for (idx=0;idx<NUM_DUTS*MEM_BYTES;idx=idx+1)
+	   ref_mem[idx] = 8'd0;
+	 repeat (2) @(posedge wb_clk);
+	 #1 wb_rst = 1'b0;
+
+	 for (cfg=0;cfg<NUM_DUTS;cfg=cfg+1) begin
+	    wsize = 4*SCALES[cfg*32+:32];
+	    keep_cyc = 1'b0;
+	    wait_idle = 1'b1;
+	    single = 1'b0;
+	    in_err = 1'b0;
+	    last_we = 1'b0;
+	    last_adr = {aw{1'b0}};
+	    expected = 0;
+	    count = accesses[cfg];
+	    for (n=0;n<TRANSACTIONS;n=n+1) begin
+	       kind = single ? 0 : $urandom % 5;
+	       we = $urandom % 2;
+	       //One in eight accesses starts in the err region
+	       adr = {($urandom % 256), 2'b00} | ((($urandom % 8) == 0) << 10);
+	       if (keep_cyc & last_we) begin
+		  //Start in another wide word after a write in the same
+		  //cycle, as merged writes are not kept across accesses
+		  if (adr / wsize == last_adr / wsize)
+		    adr = adr ^ wsize;
+	       end else if (keep_cyc) begin
+		  //Continue where a read stopped, which must not be
+		  //answered from the wide word of the last read
+		  if ($urandom % 2)
+		    adr = next_addr(last_adr, wb_bte, 4);
+	       end else if (!wait_idle & last_we) begin
+		  //Write next to where a write stopped while the merged
+		  //write may still be in progress
+		  if ($urandom % 2)
+		    adr = last_adr ^ 4;
+	       end
+	       if (kind == 0)
+		 len = 1;
+	       else if (kind == 1)
+		 len = 1 + $urandom % 24;
+	       else
+		 len = 1 + $urandom % (4 << kind);
+	       wb_bte = (kind >= 2) ? kind - 1 : 2'b00;
+	       if (!keep_cyc) begin
+		  @(posedge wb_clk) #1;
+		  wb_cyc = 1'b1;
+	       end
+	       for (idx=0;idx<len;idx=idx+1) begin
+		  //Bursts end with cti=111 or by dropping cyc
+		  cti = (kind == 0) ? 3'b000 :
+			(idx == len - 1) & ($urandom % 2) ? 3'b111 : 3'b010;
+		  //One wide access for each run of beats in a wide word
+		  if ((idx == 0) | (adr / wsize != last_adr / wsize))
+		    expected = expected + 1;
+		  in_err = in_err | adr[10];
+		  //Write beats that are merged are acked at once
+		  beat(adr, we, cti, adr[10] &
+		       !(we & (cti == 3'b010) &
+			 (next_addr(adr, wb_bte, 4) / wsize == adr / wsize)));
+		  last_adr = adr;
+		  adr = next_addr(adr, wb_bte, 4);
+	       end
+	       last_we = we;
+	       wb_stb = 1'b0;
+	       //Another access may follow in the same cycle, which is a
+	       //single access if the burst was not ended
+	       keep_cyc = ($urandom % 3) == 0;
+	       single = keep_cyc & (cti == 3'b010);
+	       if (!keep_cyc) begin
+		  wb_cyc = 1'b0;
+		  //The wide accesses are counted when the upsizer is idle
+		  wait_idle = ($urandom % 4) != 0;
+		  if (wait_idle) begin
+		     idle;
+		     //Reads that fail are fetched again for each beat
+		     if (!in_err & (accesses[cfg] - count != expected)) begin
+			$display("%m : Error: %0d wide accesses with SCALE %0d, expected %0d",
+				 accesses[cfg] - count, wsize/4, expected);
+			$finish;
+		     end
+		     in_err = 1'b0;
+		     expected = 0;
+		     count = accesses[cfg];
+		  end
+		  repeat ($urandom % 3) @(posedge wb_clk);
+	       end
+	    end
+	    wb_cyc = 1'b0;
+	    idle;
+	 end
+      end
+   endtask
+
 endmodule
@@ -44,6 +44,8 @@ module wb_arbiter
    output wire [num_masters-1:0]    wbm_ack_o,
    output wire [num_masters-1:0]    wbm_err_o,
    output wire [num_masters-1:0]    wbm_rty_o,
+   //Master currently granted access to the slave, for monitoring
+   output wire [num_masters-1:0]    wbm_grant_o,
 
    // Wishbone Slave interface
    output wire [aw-1:0]		    wbs_adr_o,
@@ -109,6 +111,7 @@ module wb_arbiter
    assign wbm_ack_o = ((wbs_ack_i & active) << master_sel);
    assign wbm_err_o = ((wbs_err_i & active) << master_sel);
    assign wbm_rty_o = ((wbs_rty_i & active) << master_sel);
+   assign wbm_grant_o = (active << master_sel);
 /* verilator lint_on WIDTH */
 
 endmodule // wb_arbiter
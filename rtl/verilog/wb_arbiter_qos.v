@@ -0,0 +1,189 @@
+/* wb_arbiter_qos. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2013-2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*
+ Wishbone arbiter with selectable arbitration policy
+
+ Unlike wb_arbiter, which keeps the grant for as long as the master
+ holds cyc, the grant is reconsidered at the end of every transfer. This
+ bounds the time a master has to wait for the slave, regardless of how
+ long the other masters keep their bus cycles open.
+
+ fixed_priority = 0 : Weighted round-robin. The granted master can do up
+                      to WEIGHTS[i] transfers in a row before the grant is
+                      passed on to the next requesting master. With all
+                      weights set to 1, this is plain round-robin per
+                      transfer. A master waits for at most the sum of the
+                      weights of the other masters.
+ fixed_priority = 1 : Fixed priority. The requesting master with the
+                      lowest index is granted at the end of every transfer.
+                      Master 0 waits for at most one transfer.
+
+ With lock_burst set, incrementing bursts are kept together and a
+ transfer ends with the last beat of the burst. Otherwise the grant can
+ move to another master after any beat, which gives the shortest waiting
+ time but requires slaves that accept a change of address in the middle
+ of a burst.
+
+ WEIGHTS holds one 8-bit weight per master, master 0 in the LSBs.
+ */
+module wb_arbiter_qos
+ #(parameter dw = 32,
+   parameter aw = 32,
+   parameter num_masters = 2,
+   parameter fixed_priority = 0,
+   parameter lock_burst = 1,
+   parameter [num_masters*8-1:0] WEIGHTS = {num_masters{8'd1}})
+  (
+   input wire			    wb_clk_i,
+   input wire			    wb_rst_i,
+
+   // Wishbone Master Interface
+   input wire [num_masters*aw-1:0]  wbm_adr_i,
+   input wire [num_masters*dw-1:0]  wbm_dat_i,
+   input wire [num_masters*4-1:0]   wbm_sel_i,
+   input wire [num_masters-1:0]	    wbm_we_i,
+   input wire [num_masters-1:0]	    wbm_cyc_i,
+   input wire [num_masters-1:0]	    wbm_stb_i,
+   input wire [num_masters*3-1:0]   wbm_cti_i,
+   input wire [num_masters*2-1:0]   wbm_bte_i,
+   output wire [num_masters*dw-1:0] wbm_dat_o,
+   output wire [num_masters-1:0]    wbm_ack_o,
+   output wire [num_masters-1:0]    wbm_err_o,
+   output wire [num_masters-1:0]    wbm_rty_o,
+   //Master currently granted access to the slave, for monitoring
+   output wire [num_masters-1:0]    wbm_grant_o,
+
+   // Wishbone Slave interface
+   output wire [aw-1:0]		    wbs_adr_o,
+   output wire [dw-1:0]		    wbs_dat_o,
+   output wire [3:0]		    wbs_sel_o,
+   output wire			    wbs_we_o,
+   output wire			    wbs_cyc_o,
+   output wire			    wbs_stb_o,
+   output wire [2:0]		    wbs_cti_o,
+   output wire [1:0]		    wbs_bte_o,
+   input wire [dw-1:0]		    wbs_dat_i,
+   input wire			    wbs_ack_i,
+   input wire			    wbs_err_i,
+   input wire			    wbs_rty_i);
+
+   //Use parameter instead of localparam to work around a bug in Xilinx ISE
+   parameter master_sel_bits = num_masters > 1 ? $clog2(num_masters) : 1;
+
+   reg [master_sel_bits-1:0] master_sel;
+   reg			     active;
+   reg [7:0]		     count;
+
+//
+// Find First 1 - Start from MSB and count downwards, returns 0 when no bit set
+//
+   function [master_sel_bits-1:0] ff1;
+      input [num_masters-1:0] in;
+      integer		      i;
+
+      begin
+	 ff1 = 0;
+	 for (i = num_masters-1; i >= 0; i=i-1) begin
+	    if (in[i])
+/* verilator lint_off WIDTH */
+	      ff1 = i;
+/* verilator lint_on WIDTH */
+	 end
+      end
+   endfunction
+
+//
+// Round-robin - First requesting master after cur, wrapping around
+//
+   function [master_sel_bits-1:0] rr_next;
+      input [num_masters-1:0]	   in;
+      input [master_sel_bits-1:0] cur;
+      integer			   i;
+      integer			   idx;
+
+      begin
+	 rr_next = cur;
+	 for (i = num_masters; i > 0; i=i-1) begin
+	    idx = cur + i;
+	    if (idx >= num_masters)
+	      idx = idx - num_masters;
+	    if (in[idx])
+/* verilator lint_off WIDTH */
+	      rr_next = idx;
+/* verilator lint_on WIDTH */
+	 end
+      end
+   endfunction
+
+/* verilator lint_off WIDTH */
+   wire [num_masters-1:0] current = 1'b1 << master_sel;
+/* verilator lint_on WIDTH */
+   wire [num_masters-1:0] others  = wbm_cyc_i & ~current;
+
+   wire cur_req   = wbm_cyc_i[master_sel];
+   wire done      = wbs_ack_i | wbs_err_i | wbs_rty_i;
+   wire burst_end = !lock_burst | (wbs_cti_o == 3'b000) | (wbs_cti_o == 3'b111);
+   //End of a transfer where the grant may be passed on
+   wire boundary  = active & cur_req & done & burst_end;
+   wire used_up   = (count + 8'd1) >= WEIGHTS[master_sel*8+:8];
+
+   wire rearbitrate = !active | !cur_req |
+		      boundary & (|others) & (fixed_priority | used_up);
+
+   //After a transfer, round-robin only considers the other masters
+   wire [num_masters-1:0] candidates = (boundary & !fixed_priority) ? others : wbm_cyc_i;
+   wire [master_sel_bits-1:0] next = fixed_priority ? ff1(candidates) :
+				     rr_next(candidates, master_sel);
+
+   always @(posedge wb_clk_i) begin
+      if (boundary)
+	count <= count + 8'd1;
+      if (rearbitrate) begin
+	 active <= |candidates;
+	 count  <= 8'd0;
+	 if (|candidates)
+	   master_sel <= next;
+      end
+      if (wb_rst_i) begin
+	 master_sel <= 0;
+	 active <= 1'b0;
+	 count <= 8'd0;
+      end
+   end
+
+/* verilator lint_off WIDTH */
+   //Mux active master
+   assign wbs_adr_o = wbm_adr_i[master_sel*aw+:aw];
+   assign wbs_dat_o = wbm_dat_i[master_sel*dw+:dw];
+   assign wbs_sel_o = wbm_sel_i[master_sel*4+:4];
+   assign wbs_we_o  = wbm_we_i [master_sel];
+   assign wbs_cyc_o = wbm_cyc_i[master_sel] & active;
+   assign wbs_stb_o = wbm_stb_i[master_sel];
+   assign wbs_cti_o = wbm_cti_i[master_sel*3+:3];
+   assign wbs_bte_o = wbm_bte_i[master_sel*2+:2];
+
+   assign wbm_dat_o = {num_masters{wbs_dat_i}};
+   assign wbm_ack_o = ((wbs_ack_i & active) << master_sel);
+   assign wbm_err_o = ((wbs_err_i & active) << master_sel);
+   assign wbm_rty_o = ((wbs_rty_i & active) << master_sel);
+   assign wbm_grant_o = (active << master_sel);
+/* verilator lint_on WIDTH */
+
+endmodule // wb_arbiter_qos
@@ -0,0 +1,205 @@
+/* wb_axi_master. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2013-2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*
+ Wishbone slave to AXI4 master bridge
+
+ Connects a 32-bit Wishbone interconnect to an AXI4 slave. One access is
+ handled at a time.
+
+ Reads that start a Wishbone burst (cti=3'b010) are sent as a single AXI
+ burst, and the beats are acked as they arrive. Wrap bursts become WRAP
+ bursts of 4, 8 or 16 beats. Linear bursts become INCR bursts that end
+ at the next 64 byte boundary, so up to 15 words may be read ahead of a
+ burst that ends early. Beats that the master does not ask for are
+ dropped. Longer bursts continue with a new AXI burst.
+
+ Writes are sent as single beat AXI writes and acked when the write
+ response arrives, so that errors can be returned with err. SLVERR and
+ DECERR are returned as err. rty is never asserted.
+*/
+module wb_axi_master
+  #(parameter aw = 32)        // Address width
+   (
+    input wire		 wb_clk_i,
+    input wire		 wb_rst_i,
+
+    // Wishbone Slave Interface
+    input wire [aw-1:0]	 wbs_adr_i,
+    input wire [31:0]	 wbs_dat_i,
+    input wire [3:0]	 wbs_sel_i,
+    input wire		 wbs_we_i,
+    input wire		 wbs_cyc_i,
+    input wire		 wbs_stb_i,
+    input wire [2:0]	 wbs_cti_i,
+    input wire [1:0]	 wbs_bte_i,
+    output wire [31:0]	 wbs_dat_o,
+    output wire		 wbs_ack_o,
+    output wire		 wbs_err_o,
+    output wire		 wbs_rty_o,
+
+    // AXI4 Master Interface
+    output wire [0:0]	 m_axi_awid_o,
+    output wire [aw-1:0] m_axi_awaddr_o,
+    output wire [7:0]	 m_axi_awlen_o,
+    output wire [2:0]	 m_axi_awsize_o,
+    output wire [1:0]	 m_axi_awburst_o,
+    output wire		 m_axi_awlock_o,
+    output wire [3:0]	 m_axi_awcache_o,
+    output wire [2:0]	 m_axi_awprot_o,
+    output reg		 m_axi_awvalid_o,
+    input wire		 m_axi_awready_i,
+    output reg [31:0]	 m_axi_wdata_o,
+    output reg [3:0]	 m_axi_wstrb_o,
+    output wire		 m_axi_wlast_o,
+    output reg		 m_axi_wvalid_o,
+    input wire		 m_axi_wready_i,
+    input wire [0:0]	 m_axi_bid_i,
+    input wire [1:0]	 m_axi_bresp_i,
+    input wire		 m_axi_bvalid_i,
+    output wire		 m_axi_bready_o,
+    output wire [0:0]	 m_axi_arid_o,
+    output wire [aw-1:0] m_axi_araddr_o,
+    output reg [7:0]	 m_axi_arlen_o,
+    output wire [2:0]	 m_axi_arsize_o,
+    output reg [1:0]	 m_axi_arburst_o,
+    output wire		 m_axi_arlock_o,
+    output wire [3:0]	 m_axi_arcache_o,
+    output wire [2:0]	 m_axi_arprot_o,
+    output reg		 m_axi_arvalid_o,
+    input wire		 m_axi_arready_i,
+    input wire [0:0]	 m_axi_rid_i,
+    input wire [31:0]	 m_axi_rdata_i,
+    input wire [1:0]	 m_axi_rresp_i,
+    input wire		 m_axi_rlast_i,
+    input wire		 m_axi_rvalid_i,
+    output wire		 m_axi_rready_o);
+
+   localparam [1:0]
+     S_IDLE  = 2'd0,
+     S_READ  = 2'd1,
+     S_WRITE = 2'd2;
+
+   localparam [1:0]
+     BURST_INCR = 2'b01,
+     BURST_WRAP = 2'b10;
+
+   reg [1:0]	state;
+
+   //Address of the current access or the next beat of a read burst
+   reg [aw-1:0] adr;
+   //Drop the remaining read beats
+   reg		drain;
+
+   wire req = wbs_cyc_i & wbs_stb_i;
+
+   //Next address of a read burst, wrapping at (arlen+1) words
+   wire [aw-1:0] wrap_mask = (m_axi_arburst_o == BURST_WRAP) ?
+			     (({{aw-8{1'b0}}, m_axi_arlen_o} + 1) << 2) - 1 :
+			     {aw{1'b1}};
+   wire [aw-1:0] adr_next = (adr & ~wrap_mask) | ((adr + 4) & wrap_mask);
+
+   //The master asks for the next beat of the read burst
+   wire rd_match = req & !wbs_we_i & (wbs_adr_i[aw-1:2] == adr[aw-1:2]);
+
+   wire rd_beat = (state == S_READ) & m_axi_rvalid_i & m_axi_rready_o;
+   wire rd_ack  = rd_beat & !drain;
+   wire wr_done = (state == S_WRITE) & m_axi_bvalid_i;
+
+   assign wbs_dat_o = m_axi_rdata_i;
+   assign wbs_ack_o = (rd_ack & !m_axi_rresp_i[1]) | (wr_done & !m_axi_bresp_i[1]);
+   assign wbs_err_o = (rd_ack &  m_axi_rresp_i[1]) | (wr_done &  m_axi_bresp_i[1]);
+   assign wbs_rty_o = 1'b0;
+
+   assign m_axi_awid_o    = 1'b0;
+   assign m_axi_awaddr_o  = adr;
+   assign m_axi_awlen_o   = 8'd0;
+   assign m_axi_awsize_o  = 3'b010;
+   assign m_axi_awburst_o = BURST_INCR;
+   assign m_axi_awlock_o  = 1'b0;
+   assign m_axi_awcache_o = 4'b0000;
+   assign m_axi_awprot_o  = 3'b000;
+   assign m_axi_wlast_o   = 1'b1;
+   assign m_axi_bready_o  = (state == S_WRITE);
+
+   assign m_axi_arid_o    = 1'b0;
+   assign m_axi_araddr_o  = adr;
+   assign m_axi_arsize_o  = 3'b010;
+   assign m_axi_arlock_o  = 1'b0;
+   assign m_axi_arcache_o = 4'b0000;
+   assign m_axi_arprot_o  = 3'b000;
+   assign m_axi_rready_o  = (state == S_READ) & (drain | rd_match);
+
+   always @(posedge wb_clk_i) begin
+      if (m_axi_awready_i)
+	m_axi_awvalid_o <= 1'b0;
+      if (m_axi_wready_i)
+	m_axi_wvalid_o <= 1'b0;
+      if (m_axi_arready_i)
+	m_axi_arvalid_o <= 1'b0;
+      case (state)
+	S_IDLE : begin
+	   adr   <= {wbs_adr_i[aw-1:2], 2'b00};
+	   drain <= 1'b0;
+	   m_axi_wdata_o <= wbs_dat_i;
+	   m_axi_wstrb_o <= wbs_sel_i;
+	   if (wbs_cti_i != 3'b010) begin
+	      m_axi_arlen_o   <= 8'd0;
+	      m_axi_arburst_o <= BURST_INCR;
+	   end else if (wbs_bte_i == 2'b00) begin
+	      m_axi_arlen_o   <= {4'd0, ~wbs_adr_i[5:2]};
+	      m_axi_arburst_o <= BURST_INCR;
+	   end else begin
+	      m_axi_arlen_o   <= {4'd0, wbs_bte_i[1] & wbs_bte_i[0], wbs_bte_i[1], 2'b11};
+	      m_axi_arburst_o <= BURST_WRAP;
+	   end
+	   if (req & wbs_we_i) begin
+	      m_axi_awvalid_o <= 1'b1;
+	      m_axi_wvalid_o  <= 1'b1;
+	      state <= S_WRITE;
+	   end else if (req) begin
+	      m_axi_arvalid_o <= 1'b1;
+	      state <= S_READ;
+	   end
+	end
+	S_READ : begin
+	   //The burst ends when the master drops cyc, asks for another
+	   //address or ends it with cti
+	   if (!wbs_cyc_i | (req & !rd_match) | (rd_ack & (wbs_cti_i != 3'b010)))
+	     drain <= 1'b1;
+	   if (rd_beat) begin
+	      adr <= adr_next;
+	      if (m_axi_rlast_i)
+		state <= S_IDLE;
+	   end
+	end
+	S_WRITE :
+	  if (m_axi_bvalid_i)
+	    state <= S_IDLE;
+	default : state <= S_IDLE;
+      endcase
+      if (wb_rst_i) begin
+	 state <= S_IDLE;
+	 m_axi_awvalid_o <= 1'b0;
+	 m_axi_wvalid_o  <= 1'b0;
+	 m_axi_arvalid_o <= 1'b0;
+      end
+   end
+
+endmodule
@@ -0,0 +1,241 @@
+/* wb_axi_slave. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2013-2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*
+ AXI4 slave to Wishbone master bridge
+
+ Connects an AXI4 master to a 32-bit Wishbone interconnect. One AXI
+ transaction is handled at a time, with writes taking priority over
+ reads. Each beat of the AXI burst becomes one Wishbone access and the
+ whole burst is done in a single Wishbone cycle.
+
+ Full width INCR bursts are sent as Wishbone linear bursts (cti=3'b010,
+ bte=2'b00) and WRAP bursts of 4, 8 and 16 beats as wrap bursts with
+ the same length, so that the slave can ack one beat per cycle. The last
+ beat of a burst has cti=3'b111. FIXED and narrow bursts, and WRAP
+ bursts of two beats, are sent as classic accesses.
+
+ The master can stall the Wishbone burst by holding back wvalid or
+ rready. err and rty are returned as SLVERR. Exclusive accesses are not
+ supported and awlock, awcache, awprot and their read counterparts are
+ ignored.
+*/
+module wb_axi_slave
+  #(parameter aw = 32,        // Address width
+    parameter iw = 1)         // AXI ID width
+   (
+    input wire		 wb_clk_i,
+    input wire		 wb_rst_i,
+
+    // Wishbone Master Interface
+    output wire [aw-1:0] wbm_adr_o,
+    output wire [31:0]	 wbm_dat_o,
+    output wire [3:0]	 wbm_sel_o,
+    output wire		 wbm_we_o,
+    output wire		 wbm_cyc_o,
+    output wire		 wbm_stb_o,
+    output wire [2:0]	 wbm_cti_o,
+    output wire [1:0]	 wbm_bte_o,
+    input wire [31:0]	 wbm_dat_i,
+    input wire		 wbm_ack_i,
+    input wire		 wbm_err_i,
+    input wire		 wbm_rty_i,
+
+    // AXI4 Slave Interface
+    input wire [iw-1:0]	 s_axi_awid_i,
+    input wire [aw-1:0]	 s_axi_awaddr_i,
+    input wire [7:0]	 s_axi_awlen_i,
+    input wire [2:0]	 s_axi_awsize_i,
+    input wire [1:0]	 s_axi_awburst_i,
+    input wire		 s_axi_awlock_i,
+    input wire [3:0]	 s_axi_awcache_i,
+    input wire [2:0]	 s_axi_awprot_i,
+    input wire		 s_axi_awvalid_i,
+    output wire		 s_axi_awready_o,
+    input wire [31:0]	 s_axi_wdata_i,
+    input wire [3:0]	 s_axi_wstrb_i,
+    input wire		 s_axi_wlast_i,
+    input wire		 s_axi_wvalid_i,
+    output wire		 s_axi_wready_o,
+    output wire [iw-1:0] s_axi_bid_o,
+    output wire [1:0]	 s_axi_bresp_o,
+    output wire		 s_axi_bvalid_o,
+    input wire		 s_axi_bready_i,
+    input wire [iw-1:0]	 s_axi_arid_i,
+    input wire [aw-1:0]	 s_axi_araddr_i,
+    input wire [7:0]	 s_axi_arlen_i,
+    input wire [2:0]	 s_axi_arsize_i,
+    input wire [1:0]	 s_axi_arburst_i,
+    input wire		 s_axi_arlock_i,
+    input wire [3:0]	 s_axi_arcache_i,
+    input wire [2:0]	 s_axi_arprot_i,
+    input wire		 s_axi_arvalid_i,
+    output wire		 s_axi_arready_o,
+    output wire [iw-1:0] s_axi_rid_o,
+    output wire [31:0]	 s_axi_rdata_o,
+    output wire [1:0]	 s_axi_rresp_o,
+    output wire		 s_axi_rlast_o,
+    output wire		 s_axi_rvalid_o,
+    input wire		 s_axi_rready_i);
+
+   localparam [1:0]
+     S_IDLE  = 2'd0,
+     S_READ  = 2'd1,
+     S_WRITE = 2'd2,
+     S_RESP  = 2'd3;
+
+   localparam [1:0]
+     BURST_FIXED = 2'b00,
+     BURST_INCR  = 2'b01,
+     BURST_WRAP  = 2'b10;
+
+   reg [1:0]	state;
+
+   //Current transaction
+   reg [iw-1:0] id;
+   reg [aw-1:0] adr;
+   reg [7:0]	len;
+   reg [2:0]	size;
+   reg [1:0]	burst;
+   reg [7:0]	beat;
+   reg		done;
+   reg		err;
+
+   //Read data buffer
+   reg [31:0]	rdata;
+   reg		rerr;
+   reg		rlast;
+   reg		rvalid;
+
+   //Address of the next beat. INCR bursts align the address to the
+   //transfer size after the first beat. WRAP bursts wrap at a boundary
+   //of (len+1) transfers
+   wire [aw-1:0] incr      = {{aw-1{1'b0}}, 1'b1} << size;
+   wire [aw-1:0] adr_align = adr & ~(incr - 1);
+   wire [aw-1:0] wrap_mask = (({{aw-8{1'b0}}, len} + 1) << size) - 1;
+   wire [aw-1:0] adr_next  = (burst == BURST_FIXED) ? adr :
+			     (burst == BURST_WRAP)  ? (adr & ~wrap_mask) | ((adr_align + incr) & wrap_mask) :
+			     adr_align + incr;
+
+   //Bursts that map directly to Wishbone registered feedback bursts
+   wire wrap_len = (len == 8'd3) | (len == 8'd7) | (len == 8'd15);
+   wire wb_burst = (size == 3'd2) & (len != 8'd0) &
+		   ((burst == BURST_INCR) | ((burst == BURST_WRAP) & wrap_len));
+
+   wire reading = (state == S_READ)  & !done;
+   wire writing = (state == S_WRITE) & !done;
+
+   //Byte lanes of narrow reads. Writes use wstrb
+   wire [3:0] rd_sel = (size == 3'd0) ? 4'b0001 << adr[1:0] :
+		       (size == 3'd1) ? (adr[1] ? 4'b1100 : 4'b0011) :
+		       4'b1111;
+
+   assign wbm_adr_o = {adr[aw-1:2], 2'b00};
+   assign wbm_dat_o = s_axi_wdata_i;
+   assign wbm_sel_o = writing ? s_axi_wstrb_i : rd_sel;
+   assign wbm_we_o  = (state == S_WRITE);
+   assign wbm_cyc_o = reading | writing;
+   //Only start a read beat when there is room for its data
+   assign wbm_stb_o = (reading & (!rvalid | s_axi_rready_i)) |
+		      (writing & s_axi_wvalid_i);
+   assign wbm_cti_o = !wb_burst     ? 3'b000 :
+		      (beat == len) ? 3'b111 :
+		      3'b010;
+   assign wbm_bte_o = (!wb_burst | (burst != BURST_WRAP)) ? 2'b00 :
+		      (len == 8'd3) ? 2'b01 :
+		      (len == 8'd7) ? 2'b10 :
+		      2'b11;
+
+   wire beat_done = wbm_cyc_o & wbm_stb_o & (wbm_ack_i | wbm_err_i | wbm_rty_i);
+   wire beat_err  = wbm_err_i | wbm_rty_i;
+
+   assign s_axi_awready_o = (state == S_IDLE);
+   assign s_axi_arready_o = (state == S_IDLE) & !s_axi_awvalid_i;
+
+   assign s_axi_wready_o = writing & beat_done;
+
+   assign s_axi_bid_o    = id;
+   assign s_axi_bresp_o  = {err, 1'b0};
+   assign s_axi_bvalid_o = (state == S_RESP);
+
+   assign s_axi_rid_o    = id;
+   assign s_axi_rdata_o  = rdata;
+   assign s_axi_rresp_o  = {rerr, 1'b0};
+   assign s_axi_rlast_o  = rlast;
+   assign s_axi_rvalid_o = rvalid;
+
+   always @(posedge wb_clk_i) begin
+      if (s_axi_rready_i)
+	rvalid <= 1'b0;
+      case (state)
+	S_IDLE : begin
+	   beat <= 8'd0;
+	   done <= 1'b0;
+	   err  <= 1'b0;
+	   if (s_axi_awvalid_i) begin
+	      id    <= s_axi_awid_i;
+	      adr   <= s_axi_awaddr_i;
+	      len   <= s_axi_awlen_i;
+	      size  <= s_axi_awsize_i;
+	      burst <= s_axi_awburst_i;
+	      state <= S_WRITE;
+	   end else if (s_axi_arvalid_i) begin
+	      id    <= s_axi_arid_i;
+	      adr   <= s_axi_araddr_i;
+	      len   <= s_axi_arlen_i;
+	      size  <= s_axi_arsize_i;
+	      burst <= s_axi_arburst_i;
+	      state <= S_READ;
+	   end
+	end
+	S_READ : begin
+	   if (beat_done) begin
+	      rdata  <= wbm_dat_i;
+	      rerr   <= beat_err;
+	      rlast  <= (beat == len);
+	      rvalid <= 1'b1;
+	   end
+	   //Done when the last beat has been taken by the master
+	   if (rvalid & s_axi_rready_i & rlast)
+	     state <= S_IDLE;
+	end
+	S_WRITE : begin
+	   if (beat_done) begin
+	      err <= err | beat_err;
+	      if (beat == len)
+		state <= S_RESP;
+	   end
+	end
+	S_RESP :
+	  if (s_axi_bready_i)
+	    state <= S_IDLE;
+      endcase
+      if (beat_done) begin
+	 adr  <= adr_next;
+	 beat <= beat + 8'd1;
+	 if (beat == len)
+	   done <= 1'b1;
+      end
+      if (wb_rst_i) begin
+	 state  <= S_IDLE;
+	 rvalid <= 1'b0;
+      end
+   end
+
+endmodule
@@ -18,6 +18,10 @@
  */
 
 /*Wishbone Clock-domain crossing core.
+
+ err and rty from the slave are carried back to the master together
+ with ack.
+
  TODO:
  - Bursts
  - Pipelining
@@ -35,6 +39,8 @@ module wb_cdc
    input wire		wbm_stb_i,
    output wire [31:0]	wbm_dat_o,
    output wire		wbm_ack_o,
+   output wire		wbm_err_o,
+   output wire		wbm_rty_o,
    input wire		wbs_clk,
    input wire		wbs_rst,
    output wire [AW-1:0]	wbs_adr_o,
@@ -44,15 +50,20 @@ module wb_cdc
    output wire		wbs_cyc_o,
    output wire		wbs_stb_o,
    input wire [31:0]	wbs_dat_i,
-   input wire		wbs_ack_i);
+   input wire		wbs_ack_i,
+   input wire		wbs_err_i,
+   input wire		wbs_rty_i);
 
    wire 	   wbm_m2s_en;
    reg 		   wbm_busy = 1'b0;
    wire 	   wbm_cs;
    wire 	   wbm_done;
+   wire 	   wbm_err;
+   wire 	   wbm_rty;
 
    wire 	   wbs_m2s_en;
    reg 		   wbs_cs = 1'b0;
+   wire 	   wbs_done = wbs_ack_i | wbs_err_i | wbs_rty_i;
 
    cc561
      #(.DW (AW+32+4+1))
@@ -69,14 +80,14 @@ module wb_cdc
    assign wbm_m2s_en = wbm_cs & ~wbm_busy;
 
    always @(posedge wbm_clk) begin
-      if (wbm_ack_o | wbm_rst)
+      if (wbm_done | wbm_rst)
 	wbm_busy <= 1'b0;
       else if (wbm_cs)
 	wbm_busy <= 1'b1;
    end
 
    always @(posedge wbs_clk) begin
-      if (wbs_ack_i)
+      if (wbs_done)
 	wbs_cs <= 1'b0;
       else if (wbs_m2s_en)
 	wbs_cs <= 1'b1;
@@ -86,14 +97,18 @@ module wb_cdc
    assign wbs_stb_o = wbs_m2s_en | wbs_cs;
 
    cc561
-     #(.DW (32))
+     #(.DW (32+1+1))
    cdc_s2m
      (.aclk  (wbs_clk),
       .arst  (wbs_rst),
-      .adata (wbs_dat_i),
-      .aen   (wbs_ack_i),
+      .adata ({wbs_dat_i, wbs_err_i, wbs_rty_i}),
+      .aen   (wbs_done),
       .bclk  (wbm_clk),
-      .bdata (wbm_dat_o),
-      .ben   (wbm_ack_o));
+      .bdata ({wbm_dat_o, wbm_err, wbm_rty}),
+      .ben   (wbm_done));
+
+   assign wbm_ack_o = wbm_done & !wbm_err & !wbm_rty;
+   assign wbm_err_o = wbm_done & wbm_err;
+   assign wbm_rty_o = wbm_done & wbm_rty;
 
 endmodule
@@ -0,0 +1,95 @@
+/* wb_error_device. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2013-2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*
+ Wishbone error device
+
+ Fallback slave that terminates every access with err after exactly
+ latency cycles. Meant to be connected as the last slave of a wb_mux
+ with a mask of zero, so that it catches all accesses that do not match
+ any other slave.
+
+ The address of the last faulting access is kept in fault_adr_o and
+ fault_o is asserted for one cycle when it is updated.
+
+ Accesses are handled one at a time. wbs_stall_o is provided for B4
+ pipelined masters.
+*/
+module wb_error_device
+  #(parameter dw = 32,        // Data width
+    parameter aw = 32,        // Address width
+    parameter latency = 1)    // Cycles from request to err, at least 1
+   (
+    input wire		 wb_clk_i,
+    input wire		 wb_rst_i,
+
+    input wire [aw-1:0]	 wbs_adr_i,
+    input wire [dw-1:0]	 wbs_dat_i,
+    input wire [3:0]	 wbs_sel_i,
+    input wire		 wbs_we_i,
+    input wire		 wbs_cyc_i,
+    input wire		 wbs_stb_i,
+    input wire [2:0]	 wbs_cti_i,
+    input wire [1:0]	 wbs_bte_i,
+    output wire [dw-1:0] wbs_dat_o,
+    output wire		 wbs_ack_o,
+    output reg		 wbs_err_o,
+    output wire		 wbs_rty_o,
+    output wire		 wbs_stall_o,
+
+    output reg [aw-1:0]	 fault_adr_o,
+    output reg		 fault_o);
+
+   //Use parameter instead of localparam to work around a bug in Xilinx ISE
+   parameter cnt_bits = latency > 1 ? $clog2(latency) : 1;
+
+   reg [cnt_bits-1:0] cnt;
+   reg		      busy;
+
+   wire req = wbs_cyc_i & wbs_stb_i & !wbs_err_o;
+
+   always @(posedge wb_clk_i) begin
+      wbs_err_o <= 1'b0;
+      fault_o   <= 1'b0;
+      if (req & !busy) begin
+	 fault_adr_o <= wbs_adr_i;
+	 cnt <= 0;
+	 busy <= 1'b1;
+      end
+/* verilator lint_off WIDTH */
+      if ((req & !busy & (latency <= 1)) | (busy & (cnt == latency-2))) begin
+/* verilator lint_on WIDTH */
+	 wbs_err_o <= 1'b1;
+	 fault_o <= 1'b1;
+	 busy <= 1'b0;
+      end else if (busy)
+	cnt <= cnt + 1;
+      if (wb_rst_i | !wbs_cyc_i) begin
+	 wbs_err_o <= 1'b0;
+	 fault_o <= 1'b0;
+	 busy <= 1'b0;
+      end
+   end
+
+   assign wbs_dat_o   = {dw{1'b0}};
+   assign wbs_ack_o   = 1'b0;
+   assign wbs_rty_o   = 1'b0;
+   assign wbs_stall_o = busy | wbs_err_o;
+
+endmodule
@@ -32,8 +32,17 @@
  functionality in the last slave, in case no other slave was
  selected.
 
- If no match is found, the wishbone transaction will stall and
- an external watchdog is required to abort the transaction
+ If no match is found, wbm_err_o is asserted in the cycle after the
+ access starts. To get a configurable latency or to record the
+ faulting address, connect a wb_error_device as the last slave.
+
+ With one_hot set, MATCH_ADDR and MATCH_MASK instead hold num_terms
+ match terms, and term i selects slave MATCH_DEVICE[i*32+:32]. An
+ address must also match COMMON_ADDR under COMMON_MASK, which is
+ compared once for all terms. The terms must never match the same
+ address for different slaves, so the priority encoder is replaced by
+ a plain encoder. Slave default_device, if set, has no terms and is
+ selected when no other slave matches.
 
  Todo:
  Registered master/slave connections
@@ -44,8 +53,14 @@ module wb_mux
     parameter aw = 32,        // Address width
     parameter num_devices = 2, // Number of devices
     parameter num_slaves = num_devices, // Number of devices (deprecated)
-    parameter [num_slaves*aw-1:0] MATCH_ADDR = 0,
-    parameter [num_slaves*aw-1:0] MATCH_MASK = 0)
+    parameter one_hot = 0,    // Decode with disjoint match terms
+    parameter num_terms = num_slaves, // Number of match terms
+    parameter [num_terms*aw-1:0] MATCH_ADDR = 0,
+    parameter [num_terms*aw-1:0] MATCH_MASK = 0,
+    parameter [num_terms*32-1:0] MATCH_DEVICE = 0,
+    parameter [aw-1:0] COMMON_ADDR = 0,
+    parameter [aw-1:0] COMMON_MASK = 0,
+    parameter default_device = -1)
 
    (
     input wire			    wb_clk_i,
@@ -88,12 +103,44 @@ module wb_mux
    reg  			 wbm_err;
    wire [slave_sel_bits-1:0] 	 slave_sel;
    wire [num_slaves-1:0] 	 match;
+   wire [num_terms-1:0] 	 term_match;
+   wire [num_slaves-1:0] 	 term_devices;
 
    genvar 			 idx;
 
    generate
-      for(idx=0; idx<num_slaves ; idx=idx+1) begin : addr_match
-	 assign match[idx] = (wbm_adr_i & MATCH_MASK[idx*aw+:aw]) == MATCH_ADDR[idx*aw+:aw];
+      for(idx=0; idx<num_terms ; idx=idx+1) begin : addr_match
+	 assign term_match[idx] = (wbm_adr_i & MATCH_MASK[idx*aw+:aw]) == MATCH_ADDR[idx*aw+:aw];
+      end
+   endgenerate
+
+//
+// Slaves selected by the matching terms
+//
+   function [num_slaves-1:0] term_sel;
+      input [num_terms-1:0] in;
+      integer 		    i;
+
+      begin
+	 term_sel = 0;
+	 for (i = 0; i < num_terms; i=i+1) begin
+	    if (in[i])
+	      term_sel[MATCH_DEVICE[i*32+:32]] = 1'b1;
+	 end
+      end
+   endfunction
+
+   assign term_devices = ((wbm_adr_i & COMMON_MASK) == COMMON_ADDR) ?
+			 term_sel(term_match) : {num_slaves{1'b0}};
+
+   generate
+      for(idx=0; idx<num_slaves ; idx=idx+1) begin : slave_match
+	 if (!one_hot)
+	   assign match[idx] = term_match[idx];
+	 else if (idx == default_device)
+	   assign match[idx] = !(|term_devices);
+	 else
+	   assign match[idx] = term_devices[idx];
       end
    endgenerate
 
@@ -115,7 +162,25 @@ module wb_mux
       end
    endfunction
 
-   assign slave_sel = ff1(match);
+//
+// Binary encoder for a match with at most one bit set
+//
+   function [slave_sel_bits-1:0] enc;
+      input [num_slaves-1:0] in;
+      integer 		     i;
+
+      begin
+	 enc = 0;
+	 for (i = 0; i < num_slaves; i=i+1) begin
+	    if (in[i])
+/* verilator lint_off WIDTH */
+	      enc = enc | i;
+/* verilator lint_on WIDTH */
+	 end
+      end
+   endfunction
+
+   assign slave_sel = one_hot ? enc(match) : ff1(match);
 
    always @(posedge wb_clk_i)
      wbm_err <= wbm_cyc_i & !(|match);
@@ -126,7 +191,8 @@ module wb_mux
    assign wbs_we_o  = {num_slaves{wbm_we_i}};
 /* verilator lint_off WIDTH */
 
-   assign wbs_cyc_o = match & (wbm_cyc_i << slave_sel);
+   assign wbs_cyc_o = one_hot ? match & {num_slaves{wbm_cyc_i}} :
+		      match & (wbm_cyc_i << slave_sel);
 /* verilator lint_on WIDTH */
    assign wbs_stb_o = {num_slaves{wbm_stb_i}};
 
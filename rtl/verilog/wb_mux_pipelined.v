@@ -0,0 +1,165 @@
+/* wb_mux_pipelined. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2013-2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*
+ Wishbone multiplexer, B4 pipelined mode
+
+ Address decoding works as in wb_mux. A request is accepted in every
+ cycle where stb is asserted and stall is not, so the master can have
+ several requests in flight at once.
+
+ Responses are only kept in order within one slave. The mux therefore
+ counts the outstanding requests and stalls the master when it wants
+ to switch to another slave until all responses from the current one
+ have arrived, or when max_outstanding requests are already in flight.
+
+ If no match is found, the request is accepted once all earlier
+ requests have been answered and is terminated with err.
+*/
+module wb_mux_pipelined
+  #(parameter dw = 32,        // Data width
+    parameter aw = 32,        // Address width
+    parameter num_devices = 2, // Number of devices
+    parameter max_outstanding = 4, // Maximum number of requests in flight
+    parameter [num_devices*aw-1:0] MATCH_ADDR = 0,
+    parameter [num_devices*aw-1:0] MATCH_MASK = 0)
+
+   (
+    input wire			     wb_clk_i,
+    input wire			     wb_rst_i,
+
+    // Master Interface
+    input wire [aw-1:0]		     wbm_adr_i,
+    input wire [dw-1:0]		     wbm_dat_i,
+    input wire [3:0]		     wbm_sel_i,
+    input wire			     wbm_we_i,
+    input wire			     wbm_cyc_i,
+    input wire			     wbm_stb_i,
+    input wire [2:0]		     wbm_cti_i,
+    input wire [1:0]		     wbm_bte_i,
+    output wire [dw-1:0]	     wbm_dat_o,
+    output wire			     wbm_ack_o,
+    output wire			     wbm_err_o,
+    output wire			     wbm_rty_o,
+    output wire			     wbm_stall_o,
+    // Wishbone Slave interface
+    output wire [num_devices*aw-1:0] wbs_adr_o,
+    output wire [num_devices*dw-1:0] wbs_dat_o,
+    output wire [num_devices*4-1:0]  wbs_sel_o,
+    output wire [num_devices-1:0]    wbs_we_o,
+    output wire [num_devices-1:0]    wbs_cyc_o,
+    output wire [num_devices-1:0]    wbs_stb_o,
+    output wire [num_devices*3-1:0]  wbs_cti_o,
+    output wire [num_devices*2-1:0]  wbs_bte_o,
+    input wire [num_devices*dw-1:0]  wbs_dat_i,
+    input wire [num_devices-1:0]     wbs_ack_i,
+    input wire [num_devices-1:0]     wbs_err_i,
+    input wire [num_devices-1:0]     wbs_rty_i,
+    input wire [num_devices-1:0]     wbs_stall_i);
+
+   //Use parameter instead of localparam to work around a bug in Xilinx ISE
+   parameter slave_sel_bits = num_devices > 1 ? $clog2(num_devices) : 1;
+   parameter cnt_bits = $clog2(max_outstanding+1);
+
+   reg				  wbm_err;
+   wire [slave_sel_bits-1:0]	  slave_sel;
+   wire [num_devices-1:0]	  match;
+
+   reg [slave_sel_bits-1:0]	  active_sel;
+   reg [cnt_bits-1:0]		  outstanding;
+
+   genvar			  idx;
+
+   generate
+      for(idx=0; idx<num_devices ; idx=idx+1) begin : addr_match
+	 assign match[idx] = (wbm_adr_i & MATCH_MASK[idx*aw+:aw]) == MATCH_ADDR[idx*aw+:aw];
+      end
+   endgenerate
+
+//
+// Find First 1 - Start from MSB and count downwards, returns 0 when no bit set
+//
+   function [slave_sel_bits-1:0] ff1;
+      input [num_devices-1:0] in;
+      integer		      i;
+
+      begin
+	 ff1 = 0;
+	 for (i = num_devices-1; i >= 0; i=i-1) begin
+	    if (in[i])
+/* verilator lint_off WIDTH */
+	      ff1 = i;
+/* verilator lint_on WIDTH */
+	 end
+      end
+   endfunction
+
+   assign slave_sel = ff1(match);
+
+   wire busy      = |outstanding;
+   wire req       = wbm_cyc_i & wbm_stb_i;
+   //Hold new requests while waiting for responses from another slave
+   //and while an error for an unmatched request is returned
+   wire blocked   = wbm_err |
+		    busy & ((slave_sel != active_sel) | !(|match) |
+			    (outstanding == max_outstanding));
+   //Responses come from the active slave, or from the addressed slave
+   //when it answers in the same cycle as it accepts the request
+   wire [slave_sel_bits-1:0] resp_sel = busy ? active_sel : slave_sel;
+
+/* verilator lint_off WIDTH */
+   wire [num_devices-1:0] sel_onehot  = match & (1'b1 << slave_sel);
+   wire [num_devices-1:0] resp_onehot = busy ? (1'b1 << active_sel) : sel_onehot;
+/* verilator lint_on WIDTH */
+
+   wire accepted = req & (|match) & !blocked & !wbs_stall_i[slave_sel];
+   wire resp     = wbs_ack_i[resp_sel] | wbs_err_i[resp_sel] | wbs_rty_i[resp_sel];
+
+   always @(posedge wb_clk_i) begin
+      if (accepted)
+	active_sel <= slave_sel;
+      if (accepted & !resp)
+	outstanding <= outstanding + 1;
+      else if (!accepted & resp & busy)
+	outstanding <= outstanding - 1;
+      wbm_err <= req & !(|match) & !blocked;
+      if (wb_rst_i | !wbm_cyc_i) begin
+	 outstanding <= 0;
+	 wbm_err <= 1'b0;
+      end
+   end
+
+   assign wbs_adr_o = {num_devices{wbm_adr_i}};
+   assign wbs_dat_o = {num_devices{wbm_dat_i}};
+   assign wbs_sel_o = {num_devices{wbm_sel_i}};
+   assign wbs_we_o  = {num_devices{wbm_we_i}};
+
+   assign wbs_cyc_o = {num_devices{wbm_cyc_i}} & resp_onehot;
+   assign wbs_stb_o = {num_devices{wbm_stb_i & !blocked}} & sel_onehot;
+
+   assign wbs_cti_o = {num_devices{wbm_cti_i}};
+   assign wbs_bte_o = {num_devices{wbm_bte_i}};
+
+   assign wbm_dat_o   = wbs_dat_i[resp_sel*dw+:dw];
+   assign wbm_ack_o   = wbs_ack_i[resp_sel];
+   assign wbm_err_o   = wbs_err_i[resp_sel] | wbm_err;
+   assign wbm_rty_o   = wbs_rty_i[resp_sel];
+   assign wbm_stall_o = req & (blocked | (|match) & wbs_stall_i[slave_sel]);
+
+endmodule
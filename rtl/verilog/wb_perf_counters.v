@@ -0,0 +1,150 @@
+/* wb_perf_counters. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2013-2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*
+ Wishbone performance counters
+
+ Counts the activity on num_edges host to device connections of an
+ interconnect and makes the counters readable as a Wishbone slave. For
+ each edge, the following 32-bit counters are kept
+
+ transactions : Accesses terminated with ack
+ busy         : Cycles with cyc and stb asserted
+ wait         : Cycles with cyc and stb asserted while waiting for an
+                arbiter to grant the edge access to the device
+ err          : Accesses terminated with err
+ rty          : Accesses terminated with rty
+
+ Register map (byte offsets)
+
+ 0x00            : Control. Bit 0 (write only) clears all counters. Bit 1
+                   enables counting and is set after reset. Clear it to
+                   freeze the counters while reading them out
+ 0x04            : Number of edges (read only)
+ 0x20*(n+1)+0x00 : transactions of edge n
+ 0x20*(n+1)+0x04 : busy of edge n
+ 0x20*(n+1)+0x08 : wait of edge n
+ 0x20*(n+1)+0x0c : err of edge n
+ 0x20*(n+1)+0x10 : rty of edge n
+
+ Counters wrap around. All other registers read as zero.
+*/
+module wb_perf_counters
+  #(parameter num_edges = 1,
+    parameter aw = 32)        // Address width
+   (
+    input wire		      wb_clk_i,
+    input wire		      wb_rst_i,
+
+    // Monitored edges
+    input wire [num_edges-1:0] edge_cyc_i,
+    input wire [num_edges-1:0] edge_stb_i,
+    input wire [num_edges-1:0] edge_ack_i,
+    input wire [num_edges-1:0] edge_err_i,
+    input wire [num_edges-1:0] edge_rty_i,
+    input wire [num_edges-1:0] edge_wait_i,
+
+    // Wishbone Slave interface
+    input wire [aw-1:0]	      wbs_adr_i,
+    input wire [31:0]	      wbs_dat_i,
+    input wire [3:0]	      wbs_sel_i,
+    input wire		      wbs_we_i,
+    input wire		      wbs_cyc_i,
+    input wire		      wbs_stb_i,
+    input wire [2:0]	      wbs_cti_i,
+    input wire [1:0]	      wbs_bte_i,
+    output reg [31:0]	      wbs_dat_o,
+    output reg		      wbs_ack_o,
+    output wire		      wbs_err_o,
+    output wire		      wbs_rty_o,
+    output wire		      wbs_stall_o);
+
+   reg [31:0] transactions [0:num_edges-1];
+   reg [31:0] busy	   [0:num_edges-1];
+   reg [31:0] waits	   [0:num_edges-1];
+   reg [31:0] errs	   [0:num_edges-1];
+   reg [31:0] rtys	   [0:num_edges-1];
+   reg	      enable;
+
+   wire	      access = wbs_cyc_i & wbs_stb_i & !wbs_ack_o;
+   wire	      clear  = access & wbs_we_i & wbs_sel_i[0] & (wbs_adr_i[aw-1:2] == 0) & wbs_dat_i[0];
+
+   integer    i;
+
+   always @(posedge wb_clk_i) begin
+      for (i = 0; i < num_edges; i = i + 1) begin
+	 if (enable) begin
+	    if (edge_ack_i[i])
+	      transactions[i] <= transactions[i] + 1;
+	    if (edge_cyc_i[i] & edge_stb_i[i])
+	      busy[i] <= busy[i] + 1;
+	    if (edge_cyc_i[i] & edge_stb_i[i] & edge_wait_i[i])
+	      waits[i] <= waits[i] + 1;
+	    if (edge_err_i[i])
+	      errs[i] <= errs[i] + 1;
+	    if (edge_rty_i[i])
+	      rtys[i] <= rtys[i] + 1;
+	 end
+	 if (clear | wb_rst_i) begin
+	    transactions[i] <= 32'd0;
+	    busy[i]	    <= 32'd0;
+	    waits[i]	    <= 32'd0;
+	    errs[i]	    <= 32'd0;
+	    rtys[i]	    <= 32'd0;
+	 end
+      end
+      if (access & wbs_we_i & wbs_sel_i[0] & (wbs_adr_i[aw-1:2] == 0))
+	enable <= wbs_dat_i[1];
+      if (wb_rst_i)
+	enable <= 1'b1;
+   end
+
+   //Register read out
+/* verilator lint_off WIDTH */
+   wire [aw-1:0] block = wbs_adr_i >> 5;
+   wire [aw-1:0] edge_sel = block - 1;
+/* verilator lint_on WIDTH */
+
+   always @(posedge wb_clk_i) begin
+      wbs_ack_o <= access;
+      wbs_dat_o <= 32'd0;
+      if (block == 0) begin
+	 if (wbs_adr_i[4:2] == 3'd0)
+	   wbs_dat_o <= {30'd0, enable, 1'b0};
+	 if (wbs_adr_i[4:2] == 3'd1)
+	   wbs_dat_o <= num_edges;
+      end else if (edge_sel < num_edges)
+	case (wbs_adr_i[4:2])
+	  3'd0 : wbs_dat_o <= transactions[edge_sel];
+	  3'd1 : wbs_dat_o <= busy[edge_sel];
+	  3'd2 : wbs_dat_o <= waits[edge_sel];
+	  3'd3 : wbs_dat_o <= errs[edge_sel];
+	  3'd4 : wbs_dat_o <= rtys[edge_sel];
+	  default : wbs_dat_o <= 32'd0;
+	endcase
+      if (wb_rst_i)
+	wbs_ack_o <= 1'b0;
+   end
+
+   assign wbs_err_o = 1'b0;
+   assign wbs_rty_o = 1'b0;
+   //One access at a time for B4 pipelined masters
+   assign wbs_stall_o = wbs_ack_o;
+
+endmodule
@@ -0,0 +1,153 @@
+/* wb_reg_slice. Part of wb_intercon
+ *
+ * ISC License
+ *
+ * Copyright (C) 2013-2019  Olof Kindgren <olof.kindgren@gmail.com>
+ *
+ * Permission to use, copy, modify, and/or distribute this software for any
+ * purpose with or without fee is hereby granted, provided that the above
+ * copyright notice and this permission notice appear in all copies.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+ * WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+ * MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ * ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+ * WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+ * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+ */
+
+/*
+ Wishbone register slice
+
+ Breaks the combinational path between a master and a slave by
+ registering the request (master to slave) path, the response (slave to
+ master) path or both. Each registered direction adds one cycle of
+ latency to every access.
+
+ Only one access at a time is in flight through the slice. Bursts are
+ split into single classic cycles on the slave side, since a slave that
+ acknowledges beats back-to-back can not see the end of the burst in
+ time through a registered path.
+*/
+module wb_reg_slice
+  #(parameter dw = 32,        // Data width
+    parameter aw = 32,        // Address width
+    parameter register_request  = 1,
+    parameter register_response = 1)
+   (
+    input wire		 wb_clk_i,
+    input wire		 wb_rst_i,
+
+    // Master Interface
+    input wire [aw-1:0]	 wbm_adr_i,
+    input wire [dw-1:0]	 wbm_dat_i,
+    input wire [3:0]	 wbm_sel_i,
+    input wire		 wbm_we_i,
+    input wire		 wbm_cyc_i,
+    input wire		 wbm_stb_i,
+    input wire [2:0]	 wbm_cti_i,
+    input wire [1:0]	 wbm_bte_i,
+    output wire [dw-1:0] wbm_dat_o,
+    output wire		 wbm_ack_o,
+    output wire		 wbm_err_o,
+    output wire		 wbm_rty_o,
+    // Wishbone Slave interface
+    output wire [aw-1:0] wbs_adr_o,
+    output wire [dw-1:0] wbs_dat_o,
+    output wire [3:0]	 wbs_sel_o,
+    output wire		 wbs_we_o,
+    output wire		 wbs_cyc_o,
+    output wire		 wbs_stb_o,
+    output wire [2:0]	 wbs_cti_o,
+    output wire [1:0]	 wbs_bte_o,
+    input wire [dw-1:0]	 wbs_dat_i,
+    input wire		 wbs_ack_i,
+    input wire		 wbs_err_i,
+    input wire		 wbs_rty_i);
+
+   //Access terminated on the slave side and as seen by the master
+   wire wbs_done = wbs_ack_i | wbs_err_i | wbs_rty_i;
+   wire wbm_done = wbm_ack_o | wbm_err_o | wbm_rty_o;
+
+   generate
+      if (register_request) begin : req_reg
+	 reg [aw-1:0] adr;
+	 reg [dw-1:0] dat;
+	 reg [3:0]    sel;
+	 reg 	      we;
+	 reg 	      cyc;
+	 reg 	      stb;
+
+	 always @(posedge wb_clk_i) begin
+	    cyc <= wbm_cyc_i;
+	    //Hold the request until the slave terminates it. Don't pick up
+	    //the master's request again in the cycle where it sees the
+	    //response for it
+	    if (wbs_done | !wbm_cyc_i)
+	      stb <= 1'b0;
+	    else if (wbm_cyc_i & wbm_stb_i & !stb & !wbm_done) begin
+	       stb <= 1'b1;
+	       adr <= wbm_adr_i;
+	       dat <= wbm_dat_i;
+	       sel <= wbm_sel_i;
+	       we  <= wbm_we_i;
+	    end
+	    if (wb_rst_i) begin
+	       cyc <= 1'b0;
+	       stb <= 1'b0;
+	    end
+	 end
+
+	 assign wbs_adr_o = adr;
+	 assign wbs_dat_o = dat;
+	 assign wbs_sel_o = sel;
+	 assign wbs_we_o  = we;
+	 assign wbs_cyc_o = cyc;
+	 assign wbs_stb_o = stb;
+      end else begin : req_comb
+	 assign wbs_adr_o = wbm_adr_i;
+	 assign wbs_dat_o = wbm_dat_i;
+	 assign wbs_sel_o = wbm_sel_i;
+	 assign wbs_we_o  = wbm_we_i;
+	 assign wbs_cyc_o = wbm_cyc_i;
+	 //The master keeps stb asserted until it has seen the registered
+	 //response. Hide it from the slave during that cycle
+	 assign wbs_stb_o = wbm_stb_i & !(register_response & wbm_done);
+      end
+
+      if (register_response) begin : rsp_reg
+	 reg [dw-1:0] dat;
+	 reg 	      ack;
+	 reg 	      err;
+	 reg 	      rty;
+
+	 always @(posedge wb_clk_i) begin
+	    dat <= wbs_dat_i;
+	    ack <= wbs_ack_i & wbm_cyc_i;
+	    err <= wbs_err_i & wbm_cyc_i;
+	    rty <= wbs_rty_i & wbm_cyc_i;
+	    if (wb_rst_i) begin
+	       ack <= 1'b0;
+	       err <= 1'b0;
+	       rty <= 1'b0;
+	    end
+	 end
+
+	 assign wbm_dat_o = dat;
+	 assign wbm_ack_o = ack;
+	 assign wbm_err_o = err;
+	 assign wbm_rty_o = rty;
+      end else begin : rsp_comb
+	 assign wbm_dat_o = wbs_dat_i;
+	 assign wbm_ack_o = wbs_ack_i;
+	 assign wbm_err_o = wbs_err_i;
+	 assign wbm_rty_o = wbs_rty_i;
+      end
+   endgenerate
+
+   //Classic cycles only when anything is registered
+   assign wbs_cti_o = (register_request | register_response) ? 3'b000 : wbm_cti_i;
+   assign wbs_bte_o = (register_request | register_response) ? 2'b00  : wbm_bte_i;
+
+endmodule
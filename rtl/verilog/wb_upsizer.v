@@ -16,215 +16,195 @@
  * ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
  * OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
  */
+/*
+ Wishbone upsizer
+
+ Connects a master to a slave with a SCALE times wider data path.
+
+ Accesses go to the wide word that contains the address, with only the
+ sel bits of the addressed lane set. Bursts are passed on as bursts of
+ wide words, with one wide beat for each wide word that the burst
+ touches. Wrap bursts that cover fewer than 4 wide words are passed on
+ as classic accesses.
+
+ Write beats of a burst that are followed by a beat to the same wide
+ word are acked at once and merged. The merged word is written together
+ with the beat that leaves the wide word or ends the burst, so the slave
+ gets one write per wide word. err and rty for the merged beats are
+ returned for that last beat. If the master instead ends the cycle or
+ starts another access, the merged word is written first.
+
+ Read bursts fetch the whole wide word, and the following beats of the
+ burst that fall in the same word are answered from it. Single reads
+ and reads that do not continue a burst always go to the slave. When a
+ read burst ends in the middle of a wide word that was fetched with
+ cti=010, cyc to the slave is dropped for one cycle to end the burst
+ there as well.
+*/
 module wb_upsizer
   #(parameter DW_IN = 0,
     parameter SCALE = 0,
     parameter AW    = 32)
-   (input wire			      wb_clk_i,
-    input wire			      wb_rst_i,
-    input wire [AW-1:0]		      wbs_adr_i,
-
-    input wire [DW_IN-1:0]	      wbs_dat_i,
-    input wire [DW_IN/8-1:0]	      wbs_sel_i,
-    input wire			      wbs_we_i,
-    input wire			      wbs_cyc_i,
-    input wire			      wbs_stb_i,
-    input wire [2:0]		      wbs_cti_i,
-    input wire [1:0]		      wbs_bte_i,
-    output wire [DW_IN-1:0]	      wbs_dat_o,
-    output wire			      wbs_ack_o,
-    output wire			      wbs_err_o,
-    output wire			      wbs_rty_o,
+   (input wire			     wb_clk_i,
+    input wire			     wb_rst_i,
+    input wire [AW-1:0]		     wbs_adr_i,
+
+    input wire [DW_IN-1:0]	     wbs_dat_i,
+    input wire [DW_IN/8-1:0]	     wbs_sel_i,
+    input wire			     wbs_we_i,
+    input wire			     wbs_cyc_i,
+    input wire			     wbs_stb_i,
+    input wire [2:0]		     wbs_cti_i,
+    input wire [1:0]		     wbs_bte_i,
+    output wire [DW_IN-1:0]	     wbs_dat_o,
+    output wire			     wbs_ack_o,
+    output wire			     wbs_err_o,
+    output wire			     wbs_rty_o,
     //Master port
-    output wire [AW-1:0]	      wbm_adr_o,
-    output wire reg [DW_IN*SCALE-1:0] wbm_dat_o,
-    output wire [DW_IN*SCALE/8-1:0]   wbm_sel_o,
-    output wire			      wbm_we_o,
-    output wire			      wbm_cyc_o,
-    output wire			      wbm_stb_o,
-    output wire [2:0]		      wbm_cti_o,
-    output wire [1:0]		      wbm_bte_o,
-    input wire [DW_IN*SCALE-1:0]      wbm_dat_i,
-    input wire			      wbm_ack_i,
-    input wire			      wbm_err_i,
-    input wire			      wbm_rty_i);
-
-`include "wb_common.v"
+    output wire [AW-1:0]	     wbm_adr_o,
+    output wire [DW_IN*SCALE-1:0]    wbm_dat_o,
+    output wire [DW_IN*SCALE/8-1:0]  wbm_sel_o,
+    output wire			     wbm_we_o,
+    output wire			     wbm_cyc_o,
+    output wire			     wbm_stb_o,
+    output wire [2:0]		     wbm_cti_o,
+    output wire [1:0]		     wbm_bte_o,
+    input wire [DW_IN*SCALE-1:0]     wbm_dat_i,
+    input wire			     wbm_ack_i,
+    input wire			     wbm_err_i,
+    input wire			     wbm_rty_i);
 
    localparam SELW = DW_IN/8; //sel width
 
-   localparam DW_OUT = DW_IN*SCALE;
-   localparam SW_OUT = SELW*SCALE;
-
-   localparam BUFW = $clog2(DW_IN/8)-1; //Buffer width
-
-   localparam ADR_LSB = BUFW+1; //Bit position of the LSB of the buffer address. Lower bits are used for index part
-
-   localparam [1:0]
-     S_IDLE  = 2'b00,
-     S_READ  = 2'b01,
-     S_WRITE = 2'b10;
-
-   reg [1:0] 		      state;
-
-   wire [AW-1:ADR_LSB] 	      adr_i;
-   wire [BUFW-1:0] 	      idx_i;
-
-   reg [AW-1:ADR_LSB] 	      radr;
-   reg [DW_OUT-1:0] 	      rdat;
-   reg 			      rdat_vld;
-
-   wire [AW-1:0] next_adr = wb_next_adr(wbs_adr_i, wbs_cti_i, wbs_bte_i, DW_IN)>> ($clog2(SELW)+BUFW);
-
-   wire 		      req = wbs_cyc_i & wbs_stb_i;
-   wire 		      wr_req = req &  wbs_we_i;
-
-   wire 		      last = wbs_cyc_i & (wbs_cti_i == 3'b000 | wbs_cti_i == 3'b111);
-   wire 		      last_in_batch = (adr_i != next_adr) | last;
-   wire 		      bufhit      = (adr_i    == radr) & rdat_vld;
-   wire 		      next_bufhit = (next_adr == radr);
-
-   reg [AW-1:0] 	      wr_adr;
-   reg [DW_IN*SCALE/8-1:0]    wr_sel;
-   reg 			      wr_we;
-   reg 			      wr_cyc;
-   reg 			      wr_stb;
-   reg [2:0] 		      wr_cti;
-   reg [1:0] 		      wr_bte;
-
-
-   reg [DW_OUT-1:0] 	      wdat;
-   reg [DW_OUT/8-1:0] 	      sel;
-   reg 			      write_ack;
-   reg 			      first_ack;
-
-   assign {adr_i,idx_i} = wbs_adr_i>>$clog2(SELW);
-
-   reg [AW-1:0]  next_radr;
-
-   reg 		 wbm_stb_o_r;
-
-   wire 	 rd_cyc = wbs_cyc_i & !(last & bufhit);
-
-   assign wbs_dat_o = rdat_vld ?
-		      rdat[idx_i*DW_IN+:DW_IN] :
-		      wbm_dat_i[idx_i*DW_IN+:DW_IN];
+   localparam DW_OUT   = DW_IN*SCALE;
+   localparam SELW_OUT = SELW*SCALE;
+
+   //Address bits selecting a byte in the narrow and in the wide word
+   localparam IDX_LSB = $clog2(SELW);
+   localparam ADR_LSB = $clog2(SELW_OUT);
+   //Use at least one bit for the lane index, even if SCALE is 1
+   localparam IDXW = (ADR_LSB > IDX_LSB) ? ADR_LSB-IDX_LSB : 1;
+   localparam LOG_SCALE = ADR_LSB-IDX_LSB;
+
+   localparam [2:0]
+     CTI_CLASSIC = 3'b000,
+     CTI_INC     = 3'b010,
+     CTI_EOB     = 3'b111;
+
+   wire [AW-1:ADR_LSB] 	     line = wbs_adr_i[AW-1:ADR_LSB];
+   wire [IDXW-1:0] 	     idx  = (ADR_LSB > IDX_LSB) ? wbs_adr_i[ADR_LSB-1:IDX_LSB] : {IDXW{1'b0}};
+
+   wire 		     req   = wbs_cyc_i & wbs_stb_i;
+   wire 		     burst = (wbs_cti_i == CTI_INC);
+
+   //Address of the next beat of the burst, and whether it is in the same
+   //wide word
+   wire [AW-1:0] 	     wrap_mask = (wbs_bte_i == 2'b00) ? {AW{1'b1}} :
+			     ({{AW-1{1'b0}}, 1'b1} << (IDX_LSB + wbs_bte_i + 1)) - 1;
+   wire [AW-1:0] 	     adr_next = (wbs_adr_i & ~wrap_mask) | ((wbs_adr_i + SELW) & wrap_mask);
+   wire 		     next_in_line = (adr_next[AW-1:ADR_LSB] == line);
+
+   //A wrap burst of n narrow beats is a wrap burst of n/SCALE wide beats
+/* verilator lint_off WIDTH */
+   wire 		     wbte_ok = (wbs_bte_i == 2'b00) | (wbs_bte_i > LOG_SCALE);
+   wire [1:0] 		     wbte    = (wbs_bte_i == 2'b00) ? 2'b00 : wbs_bte_i - LOG_SCALE;
+/* verilator lint_on WIDTH */
+
+   wire [SELW_OUT-1:0] 	     beat_sel = {{(SELW_OUT-SELW){1'b0}}, wbs_sel_i} << (idx*SELW);
+
+   //Merged write beats that are not yet written to the slave
+   reg [DW_OUT-1:0] 	     wdat;
+   reg [SELW_OUT-1:0] 	     wsel;
+   reg [AW-1:ADR_LSB] 	     wadr;
+   reg 			     flushing;
+   wire 		     wpend = |wsel;
+
+   //Wide word of the read burst in progress and the next address in it
+   reg [DW_OUT-1:0] 	     rdat;
+   reg [AW-1:IDX_LSB] 	     radr;
+   reg 			     rdat_vld;
+
+   //The slave is in the middle of a burst, and the burst ended on this
+   //side without a beat to the slave
+   reg 			     wburst;
+   reg 			     wend;
+
+   function [DW_OUT-1:0] byte_mask;
+      input [SELW_OUT-1:0] sel;
+      integer 		   i;
+      begin
+	 for (i=0;i<SELW_OUT;i=i+1)
+	   byte_mask[i*8+:8] = {8{sel[i]}};
+      end
+   endfunction
 
-   wire wr = (wr_req | wr_cyc);
-   assign wbs_ack_o = wr ? write_ack : (wbm_ack_i | bufhit);
+   wire [DW_OUT-1:0] 	     merged = ({SCALE{wbs_dat_i}} & byte_mask(beat_sel)) |
+			     (wdat & ~byte_mask(beat_sel));
 
-   wire [AW-1:0] rd_adr = (first_ack/*wbm_stb_o_r*/ ? next_adr : adr_i) << ($clog2(SELW) + BUFW);
-   assign wbm_adr_o = wr ? wr_adr : rd_adr;
-   assign wbm_sel_o = wr ? wr_sel : {SW_OUT{1'b1}};
-   assign wbm_we_o  = wr ? wr_cyc : 1'b0;
-   assign wbm_cyc_o = wr ? wr_cyc : rd_cyc;
-   assign wbm_stb_o = wr ? wr_stb : rd_cyc;
-   assign wbm_cti_o = wr ? wr_cti : 3'b111;
-   assign wbm_bte_o = wr ? wr_bte : 2'b00;
+   //Merged writes are written before the cycle ends or another access
+   //starts
+   wire flush = wpend & (flushing | !wbs_cyc_i |
+			 (req & (!wbs_we_i | (line != wadr))));
 
+   wire post   = req & wbs_we_i & !flush & burst & next_in_line;
+   wire bufhit = req & !wbs_we_i & rdat_vld & (wbs_adr_i[AW-1:IDX_LSB] == radr) &
+		 (burst | (wbs_cti_i == CTI_EOB));
+   wire fwd    = req & !flush & !post & !bufhit & !wend;
 
+   wire wide_burst = !flush & burst & wbte_ok;
 
    always @(posedge wb_clk_i) begin
-      if (wbs_ack_o & !wr) begin
-	 first_ack <= 1'b1;
-	 if (last) first_ack <= 1'b0;
+      if (post) begin
+	 wdat <= merged;
+	 wsel <= wsel | beat_sel;
+	 wadr <= line;
       end
-      write_ack <= 1'b0;
-      wbm_stb_o_r <= wbm_stb_o & ! wbm_we_o;
-      if (wbm_cyc_o & wbm_ack_i & last) begin
-	 rdat_vld <= 1'b0;
+      if ((flush | (fwd & wbs_we_i)) & (wbm_ack_i | wbm_err_i))
+	wsel <= {SELW_OUT{1'b0}};
+      flushing <= flush & !(wbm_ack_i | wbm_err_i);
+
+      if (fwd | !wbs_cyc_i | (req & wbs_we_i))
+	rdat_vld <= 1'b0;
+      if (fwd & !wbs_we_i & wbm_ack_i) begin
+	 rdat     <= wbm_dat_i;
+	 rdat_vld <= burst & next_in_line;
+	 radr     <= adr_next[AW-1:IDX_LSB];
+      end
+      if (bufhit) begin
+	 rdat_vld <= burst & next_in_line;
+	 radr     <= adr_next[AW-1:IDX_LSB];
       end
 
-      case (state)
-	S_IDLE : begin
-	   wr_cyc <= 1'b0;
-	   wr_stb <= 1'b0;
-	   wr_cti <= 3'b000;
-	   wr_bte <= 2'b00;
-
-	   if (req) begin
-	      radr <= wbm_adr_o >> ($clog2(SELW)+BUFW);
-	      wr_adr <= adr_i << ($clog2(SELW)+BUFW);
-	      wr_cti <= wbs_cti_i;
-	      wr_bte <= wbs_bte_i;
-
-	      if (wbs_we_i) begin
-		 wr_cyc <= 1'b1;
-		 wr_stb <= last_in_batch;
-		 wbm_dat_o[idx_i*DW_IN+:DW_IN] <= wbs_dat_i;
-		 wr_sel[idx_i*SELW+:SELW] <= wbs_sel_i;
-
-		 //FIXME
-		 wbm_dat_o[(!idx_i)*DW_IN+:DW_IN] <= {DW_IN{1'b0}};
-		 wr_sel[(!idx_i)*SELW+:SELW]   <= {SELW{1'b0}};
-
-		 write_ack <= 1'b1 | (!last_in_batch) & !(last & wbs_ack_o);
-
-		 state <= S_WRITE;
-	      end else begin //Read request
-		 if (wbs_cti_i == 3'b111)
-		   rdat_vld <= 1'b0;
-		 if (!next_bufhit | !first_ack/*!wbm_stb_o_r*/) begin
-		    rdat_vld <= 1'b0;
-		    state <= S_READ;
-		 end
-	      end
-	   end
-	end
-
-	S_READ : begin
-	   if (wbm_ack_i) begin
-	      next_radr <= wb_next_adr(wbs_adr_i, wbs_cti_i, wbs_bte_i, DW_OUT)>> ($clog2(SELW)+BUFW);
-	      //next_radr <= next_adr;
-	      radr <= adr_i;
-	      rdat <= wbm_dat_i;
-	      rdat_vld <= !last;
-	      state <= S_IDLE;
-	      wbm_stb_o_r <= 1'b1;
-	   end
-	end
-
-	S_WRITE : begin
-	   //write_ack <= (!last_in_batch | wbm_ack_i) & !(last & wbs_ack_o);
-	   if (!wr_stb | wbm_ack_i) begin
-	      write_ack <= !last & (!last_in_batch | wbm_ack_i);
-		 wr_adr <= adr_i << ($clog2(SELW)+BUFW);
-		 wdat[idx_i*DW_IN+:DW_IN] <= wbs_dat_i;
-		 sel[idx_i*SELW+:SELW] <= wbs_sel_i;
-		 if (last_in_batch) begin
-		    wbm_dat_o[idx_i*DW_IN+:DW_IN] <= wbs_dat_i;
-		    wbm_dat_o[(!idx_i)*DW_IN+:DW_IN] <= wdat[(!idx_i)*DW_IN+:DW_IN];
-		    wr_sel[idx_i*SELW+:SELW] <= wbs_sel_i;
-		    wr_sel[(!idx_i)*SELW+:SELW] <= sel[(!idx_i)*SELW+:SELW];
-		    sel <= 0;
-
-		 end
-		 wr_sel[idx_i*SELW+:SELW] <= wbs_sel_i;
-		 wr_stb <= last_in_batch;
-	      wr_cti <= wbs_cti_i;
-		 wr_bte <= wbs_bte_i;
-	   end
-	   if ((wbm_cti_o == 3'b111) & wbm_ack_i) begin
-	      write_ack <= 1'b0;
-
-	      wr_adr <= 0;
-	      wbm_dat_o <= 0;
-	      wr_sel <= 0;
-
-	      wr_stb <= 1'b0;
-	      wr_cyc <= 1'b0;
-	      state <= S_IDLE;
-	   end
-	end
-	default : state <= S_IDLE;
-      endcase
+      if (wbm_stb_o & (wbm_ack_i | wbm_err_i))
+	wburst <= wbm_ack_i & (wbm_cti_o == CTI_INC);
+      if (!wbm_cyc_o)
+	wburst <= 1'b0;
+      wend <= bufhit & !burst & wburst;
 
       if (wb_rst_i) begin
-	state <= S_IDLE;
+	 wsel     <= {SELW_OUT{1'b0}};
+	 flushing <= 1'b0;
 	 rdat_vld <= 1'b0;
-	 first_ack <= 1'b0;
-
+	 wburst   <= 1'b0;
+	 wend     <= 1'b0;
       end
    end
 
+   assign wbm_adr_o = {flush ? wadr : line, {ADR_LSB{1'b0}}};
+   assign wbm_dat_o = flush ? wdat : merged;
+   assign wbm_sel_o = flush     ? wsel :
+		      wbs_we_i  ? wsel | beat_sel :
+		      burst     ? {SELW_OUT{1'b1}} : beat_sel;
+   assign wbm_we_o  = flush | wbs_we_i;
+   assign wbm_cyc_o = (wbs_cyc_i | wpend) & !wend;
+   assign wbm_stb_o = flush | fwd;
+   assign wbm_cti_o = wide_burst ? CTI_INC :
+		      (wburst & (flush | (wbs_cti_i == CTI_EOB))) ? CTI_EOB : CTI_CLASSIC;
+   assign wbm_bte_o = wide_burst ? wbte : 2'b00;
+
+   assign wbs_dat_o = bufhit ? rdat[idx*DW_IN+:DW_IN] : wbm_dat_i[idx*DW_IN+:DW_IN];
+   assign wbs_ack_o = post | bufhit | (fwd & wbm_ack_i);
+   assign wbs_err_o = fwd & wbm_err_i;
+   assign wbs_rty_o = fwd & wbm_rty_i;
+
 endmodule
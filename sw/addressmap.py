@@ -0,0 +1,230 @@
+# Copyright 2014-2022 Olof Kindgren <olof.kindgren@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+"""Sorted interval index over the devices decoded by one host
+
+wb_mux selects device i when (adr & MATCH_MASK[i]) == MATCH_ADDR[i] and
+picks the lowest index if several devices match. The generator connects
+the devices of a host in reverse order, with the first one in the MSBs,
+so of several matching devices the one listed last is selected. A
+device decodes a contiguous region only if its mask is a run of ones
+from the MSB down, and only if its offset has no bits set outside the
+mask. AddressMap checks this, indexes the valid regions sorted by base
+address and answers overlap, hole and lookup queries in O(log n) per
+query and O(n log n) for the whole map.
+
+It also derives a decoder that needs no priority between devices. The
+map is resolved into ranges decoded by a single device, each range is
+covered by the fewest aligned blocks, and the address bits that are
+the same in all blocks are split off to be compared only once.
+"""
+import heapq
+from bisect import bisect_right
+
+class Region:
+    __slots__ = ['name', 'index', 'base', 'size']
+
+    def __init__(self, name, index, base, size):
+        self.name  = name
+        self.index = index
+        self.base  = base
+        self.size  = size
+
+    @property
+    def end(self):
+        """First address after the region"""
+        return self.base + self.size
+
+    def __contains__(self, addr):
+        return self.base <= addr < self.end
+
+    def __repr__(self):
+        return "Region({}, 0x{:08x}-0x{:08x})".format(
+            self.name, self.base, self.end-1)
+
+class Decode:
+    """Disjoint match terms that decode exactly like the priority mux
+
+    terms is a list of (index, addr, mask) tuples sorted by index. An
+    address selects device index if it matches common_addr under
+    common_mask and addr under mask, and at most one term matches any
+    address. The bits of common_mask are cleared in all term masks."""
+    __slots__ = ['terms', 'common_addr', 'common_mask']
+
+    def __init__(self, terms, common_addr, common_mask):
+        self.terms       = terms
+        self.common_addr = common_addr
+        self.common_mask = common_mask
+
+    def find(self, addr):
+        """Index of the device selected for addr, or None"""
+        if addr & self.common_mask != self.common_addr:
+            return None
+        for index, a, m in self.terms:
+            if addr & m == a:
+                return index
+        return None
+
+class AddressMap:
+    def __init__(self, regions, aw=32):
+        """Build the index from (name, offset, mask) tuples in config order
+
+        Region indices and the indices returned by lookups are positions
+        in this order. names holds the device name at each index."""
+        self.aw = aw
+        self.errors = []
+        self.regions = []
+        self.names = []
+        full = (1 << aw) - 1
+        for index, (name, offset, mask) in enumerate(regions):
+            self.names.append(name)
+            size = (~mask & full) + 1
+            if size & (size - 1):
+                self.errors.append(
+                    "Device '{}' has mask 0x{:08x}, which does not decode a "
+                    "contiguous region. Size must be a power of two".format(
+                        name, mask))
+            elif offset & ~mask & full:
+                self.errors.append(
+                    "Device '{}' at offset 0x{:08x} is not aligned to its "
+                    "size 0x{:x} and can never be selected".format(
+                        name, offset, size))
+            else:
+                self.regions.append(Region(name, index, offset, size))
+        self.regions.sort(key=lambda r: (r.base, r.index))
+        self._bases = [r.base for r in self.regions]
+        #Running maximum of the region ends. Lets lookups stop scanning
+        #once no earlier region can reach the queried address
+        self._maxend = []
+        m = 0
+        for r in self.regions:
+            m = max(m, r.end)
+            self._maxend.append(m)
+
+    @classmethod
+    def from_devices(cls, devices, aw=32):
+        return cls([(d.name, d.offset, d.mask) for d in devices], aw)
+
+    def find_all(self, addr):
+        """All regions containing addr, in mux priority order"""
+        found = []
+        i = bisect_right(self._bases, addr) - 1
+        while i >= 0 and self._maxend[i] > addr:
+            if addr < self.regions[i].end:
+                found.append(self.regions[i])
+            i -= 1
+        return sorted(found, key=lambda r: -r.index)
+
+    def find(self, addr):
+        """The region selected by the mux for addr, or None"""
+        found = self.find_all(addr)
+        return found[0] if found else None
+
+    def overlapping(self, base, end):
+        """All regions that intersect [base, end)"""
+        found = []
+        i = bisect_right(self._bases, end - 1) - 1
+        while i >= 0 and self._maxend[i] > base:
+            if self.regions[i].end > base:
+                found.append(self.regions[i])
+            i -= 1
+        return found[::-1]
+
+    def overlaps(self):
+        """List of (region, region) pairs that overlap
+
+        The first region of each pair has priority in the mux."""
+        pairs = []
+        active = []
+        for r in self.regions:
+            while active and active[0][0] <= r.base:
+                heapq.heappop(active)
+            for _, _, other in active:
+                pairs.append(tuple(sorted((other, r), key=lambda x: -x.index)))
+            heapq.heappush(active, (r.end, r.index, r))
+        return pairs
+
+    def holes(self, base=0, end=None):
+        """List of (base, end) ranges in [base, end) not decoded by any region"""
+        if end is None:
+            end = 1 << self.aw
+        holes = []
+        pos = base
+        for r in self.regions:
+            if r.base >= end:
+                break
+            if r.base > pos:
+                holes.append((pos, r.base))
+            pos = max(pos, r.end)
+        if pos < end:
+            holes.append((pos, end))
+        return holes
+
+    def segments(self):
+        """Split the address space into ranges decoded by a single device
+
+        Returns (starts, indexes), where addresses from starts[k] up to
+        starts[k+1] select the device with index indexes[k], or no
+        device if it is -1. Priority between overlapping regions is
+        already resolved, so the table can be searched directly."""
+        top = 1 << self.aw
+        points = {0}
+        for r in self.regions:
+            points.add(r.base)
+            if r.end < top:
+                points.add(r.end)
+        starts = []
+        indexes = []
+        for p in sorted(points):
+            r = self.find(p)
+            index = r.index if r else -1
+            if indexes and indexes[-1] == index:
+                continue
+            starts.append(p)
+            indexes.append(index)
+        return starts, indexes
+
+    def _blocks(self, base, end):
+        """Fewest aligned power-of-two blocks that cover [base, end)"""
+        blocks = []
+        while base < end:
+            size = base & -base or 1 << self.aw
+            while base + size > end:
+                size >>= 1
+            blocks.append((base, size))
+            base += size
+        return blocks
+
+    def decode(self, max_terms=None):
+        """Decode without priority between devices
+
+        Returns a Decode, or None if there are no regions or the map
+        needs more than max_terms terms. A map without overlaps needs one
+        term per device. Where regions overlap, the part of a region that
+        is not hidden by devices with priority is covered by aligned
+        blocks, where adjacent blocks of the same device are merged."""
+        full = (1 << self.aw) - 1
+        starts, indexes = self.segments()
+        ends = starts[1:] + [1 << self.aw]
+        terms = []
+        for base, end, index in zip(starts, ends, indexes):
+            if index < 0:
+                continue
+            for addr, size in self._blocks(base, end):
+                terms.append((index, addr, ~(size - 1) & full))
+            if max_terms is not None and len(terms) > max_terms:
+                return None
+        if not terms:
+            return None
+        terms.sort(key=lambda t: (t[0], t[1]))
+
+        #Bits compared by all terms that have the same value in all of them
+        common_mask = full
+        diff = 0
+        for _, addr, mask in terms:
+            common_mask &= mask
+            diff |= addr ^ terms[0][1]
+        common_mask &= ~diff
+        common_addr = terms[0][1] & common_mask
+        terms = [(index, addr & ~common_mask, mask & ~common_mask)
+                 for index, addr, mask in terms]
+        return Decode(terms, common_addr, common_mask)
@@ -0,0 +1,272 @@
+# Copyright 2014-2022 Olof Kindgren <olof.kindgren@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+"""Static resource and timing estimate of an interconnect
+
+The estimate is computed from the host/device graph of a WbIntercon
+object without generating any Verilog, and is meant to compare address
+maps and topologies long before synthesis. It counts
+
+- the address comparators of each host mux and the number of address
+  bits each of them compares, i.e. the popcount of its MATCH_MASK. A
+  one-hot mux has a comparator per match term and one for the bits
+  shared by all terms
+- mux fan-in and arbiter sizes
+- width converters, register slices, clock domain crossings and error
+  devices
+- AXI4 bridges, i.e. a wb_axi_slave per AXI4 host and a wb_axi_master
+  per AXI4 device
+- ports and internal wires of the generated module, in signals and bits.
+  AXI4 ports are counted with their AXI4 signals, and separately
+
+Logic depth is counted in levels of lut_size-input lookup tables. A
+comparator against the constant MATCH_ADDR takes lut_size address bits
+per LUT, a data mux four inputs per LUT, as a 6-input LUT implements a
+4:1 mux. The arbiters register their grant, so only their data muxes
+are on the path. Register slices and clock domain crossings end a path.
+The longest path runs from a host through the mux, arbiter, bridge and
+width converter to a device that acks combinationally, and back. Logic
+inside the devices is not included. In a priority mux, cyc to a device
+also depends on the match of every device with priority over it, while
+in a one-hot mux it only depends on the device's own terms.
+"""
+
+def _levels(n, k):
+    """LUT levels needed to reduce n inputs to one with k-input LUTs"""
+    levels = 0
+    while n > 1:
+        n = -(-n // k)
+        levels += 1
+    return levels
+
+def _popcount(x):
+    return bin(x & 0xffffffff).count('1')
+
+class Estimate:
+    def __init__(self, intercon, lut_size=6):
+        self.intercon = intercon
+        self.lut_size = lut_size
+        self.pipelined = intercon.mode == 'pipelined'
+        self.error_device = bool(intercon.error_device)
+
+        nodes = list(intercon.hosts.values()) + list(intercon.bridges.values())
+        shared = [d for d in list(intercon.devices.values()) +
+                  list(intercon.bridges.values()) if len(d.hosts) > 1]
+
+        #Decoders and muxes, one per host and bridge
+        self.muxes = {}
+        for node in nodes:
+            terms, common = self._match_widths(node)
+            widths = [w for t in terms for w in t] + [common]
+            fan_in = len(terms) + self.error_device
+            self.muxes[node.name] = {
+                'fan_in'       : fan_in,
+                #A mask of zero matches everything without a comparator
+                'comparators'  : sum(w > 0 for w in widths),
+                'compare_bits' : sum(widths),
+                'max_width'    : max(widths),
+                'depth'        : self._select_depth(terms, common, fan_in),
+            }
+
+        self.arbiters = {d.name : {'hosts'  : len(d.hosts),
+                                   'policy' : d.arbitration} for d in shared}
+
+        devices = [d for d in intercon.devices.values() if d.hosts]
+        hosts = list(intercon.hosts.values())
+        self.resizers = sum(int(d.datawidth) < 32 for d in devices)
+        self.upsizers = sum(int(d.datawidth) > 32 for d in devices)
+        self.reg_slices = sum(bool(x.registered) for x in hosts + devices)
+        self.cdcs = sum(bool(x.clock) for x in hosts + devices)
+        self.error_devices = len(nodes) if self.error_device else 0
+        self.bridges = len(intercon.bridges)
+        self.axi_slaves = sum(h.bus == 'axi4' for h in hosts)
+        self.axi_masters = sum(d.bus == 'axi4' for d in devices)
+
+        self._count_signals(nodes, shared, devices)
+
+        #Longest combinational path over all host to device connections
+        self.depth = 0
+        self.path = []
+        for host in hosts:
+            for stages in self._paths(host):
+                for segment in self._segments(stages):
+                    levels = sum(l for _, l in segment)
+                    if levels > self.depth:
+                        self.depth = levels
+                        self.path = segment
+
+    def _match_widths(self, node):
+        """Compared address bits of the match terms of each device, and of
+        the comparator shared by all terms
+
+        A priority mux has one term per device and no shared comparator"""
+        decode = self.intercon._mux_decode(node)
+        if not decode:
+            return [[_popcount(d.mask)] for d in node.devices], 0
+        terms = [[] for d in node.devices]
+        for index, _, mask in decode.terms:
+            terms[index].append(_popcount(mask))
+        return terms, _popcount(decode.common_mask)
+
+    def _match_depth(self, terms, common):
+        """Levels from the address to the match of a device. The shared
+        bits end up in the comparator of each term"""
+        k = self.lut_size
+        return _levels(max(terms or [0]) + common, k) + _levels(len(terms), k)
+
+    def _select_depth(self, terms, common, fan_in):
+        """Levels from the host address through the decoder and the
+        response mux to the host ack"""
+        k = self.lut_size
+        match = max([self._match_depth(t, common) for t in terms] or [0])
+        return match + _levels(fan_in + 1, k) + _levels(fan_in, 4)
+
+    def _bus_bits(self, aw=32, dw=32):
+        """Bits of the request and response signals of one connection"""
+        request = aw + dw + max(dw // 8, 1) + 3 + 3 + 2
+        response = dw + 3 + self.pipelined
+        return request + response
+
+    @staticmethod
+    def _axi_bits(dw=32):
+        """Bits of the signals of one AXI4 port, with one bit IDs
+
+        AW and AR have 56 bits each with their ready signals, W has the
+        data, strobes and three more bits, R the data and six more bits
+        and B five bits"""
+        return 2 * 56 + (dw + dw // 8 + 3) + (dw + 6) + 5
+
+    def _count_signals(self, nodes, shared, devices):
+        """Module ports and internal wires of the generated interconnect"""
+        bus_signals = 12 + self.pipelined
+        axi_signals = 35
+        self.ports = 2 + 2 * len(self.intercon.clocks)
+        self.port_bits = self.ports
+        self.axi_ports = 0
+        self.axi_port_bits = 0
+        for x in list(self.intercon.hosts.values()) + devices:
+            if getattr(x, 'internal', False):
+                continue
+            if x.bus == 'axi4':
+                self.axi_ports += axi_signals
+                self.axi_port_bits += self._axi_bits(int(x.datawidth))
+            elif x in devices:
+                self.ports += bus_signals
+                self.port_bits += self._bus_bits(x.adr_width, int(x.datawidth))
+            else:
+                self.ports += bus_signals
+                self.port_bits += self._bus_bits()
+        self.ports += self.axi_ports
+        self.port_bits += self.axi_port_bits
+
+        #Links from muxes to arbiters, bridges, error devices, and a
+        #32-bit bus in front of each width converter, register slice and
+        #clock domain crossing
+        buses = [d.adr_width for n in nodes for d in n.devices if len(d.hosts) > 1]
+        #Wishbone side of the AXI4 bridges
+        buses += [32] * (len(self.intercon.bridges) + self.error_devices +
+                         self.axi_slaves + self.axi_masters)
+        for x in list(self.intercon.hosts.values()) + devices:
+            buses += [getattr(x, 'adr_width', 32)] * (
+                bool(x.registered) + bool(x.clock) + (int(x.datawidth) != 32))
+        self.wires = bus_signals * len(buses)
+        self.wire_bits = sum(self._bus_bits(aw) for aw in buses)
+
+    def _paths(self, host):
+        """Stages from host to each device and back
+
+        Returns one list of (stage, levels) tuples per device, where None
+        marks a register that ends the combinational path."""
+        start = []
+        end = []
+        if host.clock:
+            start.append(None)
+            end.insert(0, None)
+        if host.registered in ['request', 'both']:
+            start.append(None)
+        if host.registered in ['response', 'both']:
+            end.insert(0, None)
+        return [start + request + response + end
+                for request, response in self._mux_paths(host)]
+
+    def _mux_paths(self, node):
+        k = self.lut_size
+        terms, common = self._match_widths(node)
+        one_hot = bool(self.intercon._mux_decode(node))
+        fan_in = len(terms) + self.error_device
+        paths = []
+        for i, device in enumerate(node.devices):
+            #In a priority mux, cyc to device i depends on its own match
+            #and those of all devices after it, which are on lower mux
+            #ports and have priority
+            if one_hot:
+                decode = self._match_depth(terms[i], common)
+            else:
+                widths = [w for t in terms[i:] for w in t]
+                decode = _levels(max(widths), k) + _levels(len(widths) + 1, k)
+            request = [(node.name + ' decode', decode)]
+            response = [(node.name + ' response mux', _levels(fan_in, 4))]
+            if len(device.hosts) > 1:
+                n = len(device.hosts)
+                request.append((device.name + ' arbiter', _levels(n, 4)))
+                response.insert(0, (device.name + ' arbiter', 1))
+            if hasattr(device, 'devices'):
+                for req, resp in self._mux_paths(device):
+                    paths.append((request + req, resp + response))
+            else:
+                req, resp = self._device_stages(device)
+                paths.append((request + req, resp + response))
+        return paths
+
+    def _device_stages(self, device):
+        """Request and response stages between the arbiter and the device"""
+        request = []
+        response = []
+        if device.clock:
+            request.append(None)
+            response.append(None)
+        if device.registered in ['request', 'both']:
+            request.append(None)
+        if device.registered in ['response', 'both']:
+            response.append(None)
+        if int(device.datawidth) != 32:
+            request.append((device.name + ' width converter', 1))
+            response.insert(0, (device.name + ' width converter', 1))
+        request.append((device.name, 0))
+        return request, response
+
+    @staticmethod
+    def _segments(stages):
+        segment = []
+        for stage in stages:
+            if stage is None:
+                yield segment
+                segment = []
+            else:
+                segment.append(stage)
+        yield segment
+
+    def report(self):
+        print("{:<16} {:>6} {:>11} {:>12} {:>9} {:>7}".format(
+            'mux', 'fan-in', 'comparators', 'compare bits', 'max width', 'levels'))
+        for name, m in self.muxes.items():
+            print("{:<16} {:>6} {:>11} {:>12} {:>9} {:>7}".format(
+                name, m['fan_in'], m['comparators'], m['compare_bits'],
+                m['max_width'], m['depth']))
+        if self.arbiters:
+            print()
+            print("{:<16} {:>6} {:<14}".format('arbiter', 'hosts', ' policy'))
+            for name, a in self.arbiters.items():
+                print("{:<16} {:>6}  {:<14}".format(name, a['hosts'], a['policy']))
+        print()
+        print("Width converters: {} wb_data_resize, {} wb_upsizer".format(
+            self.resizers, self.upsizers))
+        print("Register slices: {}, clock domain crossings: {}, bridges: {}, error devices: {}".format(
+            self.reg_slices, self.cdcs, self.bridges, self.error_devices))
+        print("AXI4 bridges: {} wb_axi_slave, {} wb_axi_master".format(
+            self.axi_slaves, self.axi_masters))
+        print("Ports: {} signals, {} bits, of which AXI4: {} signals, {} bits".format(
+            self.ports, self.port_bits, self.axi_ports, self.axi_port_bits))
+        print("Wires: {} signals, {} bits".format(self.wires, self.wire_bits))
+        print("Longest path: {} levels of {}-input LUTs".format(self.depth, self.lut_size))
+        if self.path:
+            print("  " + ", ".join("{} ({})".format(s, l) for s, l in self.path))
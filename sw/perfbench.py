@@ -0,0 +1,355 @@
+# Copyright 2014-2022 Olof Kindgren <olof.kindgren@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+"""Performance testbench for a generated interconnect
+
+The testbench instantiates the interconnect through its generated .vh
+template. Every host gets a traffic generator that issues random reads
+and writes to its devices, and every device a responder with a fixed
+latency. The traffic generators count transactions, cycles per
+transaction and cycles spent waiting for an arbiter, and the testbench
+writes a summary to <name>_perf.csv and <name>_perf.json when all hosts
+are done.
+
+Only plain Verilog is used, so the testbench runs under Icarus Verilog
+(iverilog -g2012) and Verilator (--binary --timing -Wno-fatal).
+"""
+import os
+
+PERF_HOST = """
+module {name}_perf_host
+  #(parameter num_devices = 1,
+    parameter [num_devices*32-1:0] BASES = 0,
+    parameter [num_devices*32-1:0] MASKS = 0,
+    parameter transactions = 1000,
+    parameter read_pct = 50,
+    parameter idle_pct = 0,
+    parameter [31:0] seed = 1,
+    parameter pipelined = 0)
+   (input wire		      clk,
+    input wire		      rst,
+    output reg [31:0]	      adr_o,
+    output reg [31:0]	      dat_o,
+    output wire [3:0]	      sel_o,
+    output reg		      we_o,
+    output reg		      cyc_o,
+    output reg		      stb_o,
+    output wire [2:0]	      cti_o,
+    output wire [1:0]	      bte_o,
+    input wire [31:0]	      dat_i,
+    input wire		      ack_i,
+    input wire		      err_i,
+    input wire		      rty_i,
+    input wire		      stall_i,
+    //Per device. Set when the arbiter in front of it serves another host
+    input wire [num_devices-1:0] wait_i,
+    output reg		      done);
+
+   reg [31:0] rnd;
+   reg [31:0] latency;
+   integer    target;
+   integer    count;
+   integer    cycles;
+   integer    max_latency;
+   integer    waits;
+   integer    errors;
+
+   assign sel_o = 4'hf;
+   assign cti_o = 3'b000;
+   assign bte_o = 2'b00;
+
+   function [31:0] xorshift;
+      input [31:0] x;
+      begin
+	 x = x ^ (x << 13);
+	 x = x ^ (x >> 17);
+	 xorshift = x ^ (x << 5);
+      end
+   endfunction
+
+   always @(posedge clk) begin
+      if (rst) begin
+	 rnd	     <= seed;
+	 cyc_o	     <= 1'b0;
+	 stb_o	     <= 1'b0;
+	 done	     <= (transactions == 0);
+	 count	     <= 0;
+	 cycles	     <= 0;
+	 max_latency <= 0;
+	 waits	     <= 0;
+	 errors	     <= 0;
+      end else if (cyc_o) begin
+	 latency <= latency + 1;
+	 if (stb_o & wait_i[target])
+	   waits <= waits + 1;
+	 if (pipelined & stb_o & !stall_i)
+	   stb_o <= 1'b0;
+	 if (ack_i | err_i | rty_i) begin
+	    cyc_o  <= 1'b0;
+	    stb_o  <= 1'b0;
+	    count  <= count + 1;
+	    cycles <= cycles + latency + 1;
+	    if (latency + 1 > max_latency)
+	      max_latency <= latency + 1;
+	    if (err_i | rty_i)
+	      errors <= errors + 1;
+	    if (count + 1 == transactions)
+	      done <= 1'b1;
+	 end
+      end else if (!done) begin
+	 rnd <= xorshift(xorshift(rnd));
+	 if (rnd % 100 >= idle_pct) begin
+	    target = (rnd >> 8) % num_devices;
+	    adr_o <= BASES[target*32+:32] |
+		     (xorshift(rnd) & ~MASKS[target*32+:32] & ~32'd3);
+	    dat_o <= rnd;
+	    we_o  <= ((rnd >> 16) % 100) >= read_pct;
+	    cyc_o <= 1'b1;
+	    stb_o <= 1'b1;
+	    latency <= 0;
+	 end
+      end
+   end
+
+endmodule
+
+module {name}_perf_device
+  #(parameter dw = 32,
+    parameter latency = 1,
+    parameter pipelined = 0)
+   (input wire		 clk,
+    input wire		 rst,
+    input wire		 cyc_i,
+    input wire		 stb_i,
+    input wire [31:0]	 adr_i,
+    output reg [dw-1:0]	 dat_o,
+    output reg		 ack_o,
+    output wire		 err_o,
+    output wire		 rty_o,
+    output wire		 stall_o);
+
+   reg	   busy;
+   integer cnt;
+
+   assign err_o	  = 1'b0;
+   assign rty_o	  = 1'b0;
+   assign stall_o = busy | ack_o;
+
+   always @(posedge clk) begin
+      ack_o <= 1'b0;
+      if (rst)
+	busy <= 1'b0;
+      else if (busy) begin
+	 cnt <= cnt + 1;
+	 if (cnt + 1 >= latency) begin
+	    ack_o <= 1'b1;
+	    busy  <= 1'b0;
+	 end
+      end else if (cyc_i & stb_i & !ack_o) begin
+/* verilator lint_off WIDTH */
+	 dat_o <= {(dw+31)/32{adr_i}};
+/* verilator lint_on WIDTH */
+	 if (latency <= 1)
+	   ack_o <= 1'b1;
+	 else begin
+	    busy <= 1'b1;
+	    cnt	 <= 1;
+	 end
+      end
+      //Classic masters drop the request when cyc goes low
+      if (!cyc_i & !pipelined) begin
+	 busy  <= 1'b0;
+	 ack_o <= 1'b0;
+      end
+   end
+
+endmodule
+"""
+
+def _number(value, path):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid number '{}' for parameters.perf_bench.{}".format(value, path))
+
+def _mapping(value, path):
+    if not isinstance(value, dict):
+        raise ValueError("parameters.perf_bench.{} must be a mapping, not {}".format(
+            path, type(value).__name__))
+    return value
+
+class PerfBenchSettings:
+    def __init__(self, d):
+        """Read the perf_bench section of a config
+
+        Raises ValueError with the key path of the first invalid value"""
+        self.transactions = 1000
+        self.read_pct = 50
+        self.idle_pct = 0
+        self.seed = 1
+        self.latency = {}
+        self.hosts = {}
+        for key, value in d.items():
+            if key in ['transactions', 'read_pct', 'idle_pct', 'seed']:
+                setattr(self, key, _number(value, key))
+            elif key == 'latency':
+                self.latency = {str(k) : _number(v, 'latency.{}'.format(k))
+                                for k, v in _mapping(value, key).items()}
+            elif key == 'hosts':
+                for host, mix in _mapping(value, key).items():
+                    path = 'hosts.{}'.format(host)
+                    for k, v in _mapping(mix, path).items():
+                        if k not in ['read_pct', 'idle_pct', 'transactions']:
+                            raise ValueError(
+                                "Unknown property '{}' for host '{}' in perf_bench section".format(k, host))
+                        _number(v, '{}.{}'.format(path, k))
+                    self.hosts[str(host)] = {k : int(v) for k, v in mix.items()}
+            else:
+                raise ValueError(
+                    "Unknown property '{}' in perf_bench section".format(key))
+
+    def mix(self, host):
+        """Traffic settings of host"""
+        mix = {'transactions' : self.transactions,
+               'read_pct'     : self.read_pct,
+               'idle_pct'     : self.idle_pct}
+        mix.update(self.hosts.get(host, {}))
+        return mix
+
+def gen_perf_bench(intercon, settings):
+    """Return the performance testbench for intercon as a string"""
+    name = intercon.name
+    inst = name + '0'
+    pipelined = int(intercon.mode == 'pipelined')
+    lines = []
+    out = lines.append
+
+    out("// THIS FILE IS AUTOGENERATED BY wb_intercon_gen")
+    out("// ANY MANUAL CHANGES WILL BE LOST")
+    out("module {}_perf_tb;".format(name))
+    out("")
+    out("   reg wb_clk = 1'b1;")
+    out("   reg wb_rst = 1'b1;")
+    out("   always #5 wb_clk <= ~wb_clk;")
+    for i, clock in enumerate(intercon.clocks):
+        out("   reg wb_{}_clk = 1'b1;".format(clock))
+        out("   reg wb_{}_rst = 1'b1;".format(clock))
+        out("   always #{} wb_{}_clk <= ~wb_{}_clk;".format(7 + 2*i, clock, clock))
+    out("")
+    out("   initial begin")
+    out("      #100;")
+    out("      wb_rst <= 1'b0;")
+    for clock in intercon.clocks:
+        out("      wb_{}_rst <= 1'b0;".format(clock))
+    out("   end")
+    out("")
+    out("`include \"{}h\"".format(os.path.basename(intercon.output_file)))
+    out("")
+
+    #Node in front of each device, with an arbiter if it has several hosts
+    node = {d.name : d for d in intercon.devices.values()}
+    for bridge in intercon.bridges.values():
+        for d in bridge.devices:
+            node[d.name] = bridge
+
+    hosts = list(intercon.hosts.values())
+    out("   wire [{}:0] done;".format(len(hosts)-1))
+    out("")
+    for i, host in enumerate(hosts):
+        h = host.name
+        mix = settings.mix(h)
+        clk = 'wb_{}_'.format(host.clock) if host.clock else 'wb_'
+        #The devices inside the interconnect are left alone
+        regions = sorted((r for r in host.address_map.regions
+                          if not intercon.devices[r.name].internal),
+                         key=lambda r: r.index)
+        #Highest index in the MSBs
+        bases = ', '.join("32'h{:08x}".format(r.base) for r in reversed(regions))
+        masks = ', '.join("32'h{:08x}".format(~(r.size-1) & 0xffffffff) for r in reversed(regions))
+        waits = []
+        for r in reversed(regions):
+            n = node[r.name]
+            if len(n.hosts) > 1:
+                arbiter_hosts = n.arbiter_hosts()
+                idx = len(arbiter_hosts) - 1 - arbiter_hosts.index(host)
+                waits.append("!({0}.wb_arbiter_{1}.wbs_cyc_o & ({0}.wb_arbiter_{1}.master_sel == {2}))".format(
+                    inst, n.name, idx))
+            else:
+                waits.append("1'b0")
+        stall = 'wb_{}_stall'.format(h) if pipelined else "1'b0"
+
+        out("   {}_perf_host".format(name))
+        out("     #(.num_devices  ({}),".format(len(regions)))
+        out("       .BASES        ({{{}}}),".format(bases))
+        out("       .MASKS        ({{{}}}),".format(masks))
+        out("       .transactions ({}),".format(mix['transactions']))
+        out("       .read_pct     ({}),".format(mix['read_pct']))
+        out("       .idle_pct     ({}),".format(mix['idle_pct']))
+        out("       .seed         ({}),".format(settings.seed + i))
+        out("       .pipelined    ({}))".format(pipelined))
+        out("   host_{}".format(h))
+        out("     (.clk     ({}clk),".format(clk))
+        out("      .rst     ({}rst),".format(clk))
+        for p in ['adr', 'dat', 'sel', 'we', 'cyc', 'stb', 'cti', 'bte']:
+            out("      .{:<7} (wb_{}_{}),".format(p + '_o', h, p))
+        out("      .dat_i   (wb_{}_rdt),".format(h))
+        for p in ['ack', 'err', 'rty']:
+            out("      .{:<7} (wb_{}_{}),".format(p + '_i', h, p))
+        out("      .stall_i ({}),".format(stall))
+        out("      .wait_i  ({{{}}}),".format(', '.join(waits)))
+        out("      .done    (done[{}]));".format(i))
+        out("")
+
+    for device in intercon.devices.values():
+        if device.internal:
+            continue
+        d = device.name
+        clk = 'wb_{}_'.format(device.clock) if device.clock else 'wb_'
+        out("   {}_perf_device".format(name))
+        out("     #(.dw        ({}),".format(device.datawidth))
+        out("       .latency   ({}),".format(settings.latency.get(d, 1)))
+        out("       .pipelined ({}))".format(pipelined))
+        out("   device_{}".format(d))
+        out("     (.clk     ({}clk),".format(clk))
+        out("      .rst     ({}rst),".format(clk))
+        out("      .cyc_i   (wb_{}_cyc),".format(d))
+        out("      .stb_i   (wb_{}_stb),".format(d))
+        out("      .adr_i   (32'd0 | wb_{}_adr),".format(d))
+        for p in ['rdt', 'ack', 'err', 'rty']:
+            port = 'dat_o' if p == 'rdt' else p + '_o'
+            out("      .{:<7} (wb_{}_{}),".format(port, d, p))
+        if pipelined:
+            out("      .stall_o (wb_{}_stall));".format(d))
+        else:
+            out("      .stall_o ());")
+        out("")
+
+    out("   integer csv;")
+    out("   integer json;")
+    out("   initial begin")
+    out("      @(negedge wb_rst);")
+    out("      wait (&done);")
+    out("      csv = $fopen(\"{}_perf.csv\");".format(name))
+    out("      $fdisplay(csv, \"host,transactions,cycles,mean_latency,max_latency,arbitration_waits,errors\");")
+    for host in hosts:
+        s = "host_" + host.name
+        out("      $fdisplay(csv, \"{0},%0d,%0d,%0f,%0d,%0d,%0d\", {1}.count, $time/10, {1}.count ? 1.0*{1}.cycles/{1}.count : 0.0, {1}.max_latency, {1}.waits, {1}.errors);".format(
+            host.name, s))
+    out("      $fclose(csv);")
+    out("      json = $fopen(\"{}_perf.json\");".format(name))
+    out("      $fdisplay(json, \"{\");")
+    out("      $fdisplay(json, \"  \\\"cycles\\\": %0d,\", $time/10);")
+    out("      $fdisplay(json, \"  \\\"hosts\\\": {\");")
+    for i, host in enumerate(hosts):
+        s = "host_" + host.name
+        sep = ',' if i < len(hosts) - 1 else ''
+        out("      $fdisplay(json, \"    \\\"{0}\\\": {{\\\"transactions\\\": %0d, \\\"total_latency\\\": %0d, \\\"max_latency\\\": %0d, \\\"arbitration_waits\\\": %0d, \\\"errors\\\": %0d}}{2}\", {1}.count, {1}.cycles, {1}.max_latency, {1}.waits, {1}.errors);".format(
+            host.name, s, sep))
+    out("      $fdisplay(json, \"  }\");")
+    out("      $fdisplay(json, \"}\");")
+    out("      $fclose(json);")
+    out("      $display(\"Performance summary written to {0}_perf.csv and {0}_perf.json\");".format(name))
+    out("      $finish;")
+    out("   end")
+    out("")
+    out("endmodule")
+    return '\n'.join(lines) + '\n' + PERF_HOST.replace('{name}', name)
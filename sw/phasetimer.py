@@ -0,0 +1,73 @@
+# Copyright 2014-2022 Olof Kindgren <olof.kindgren@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+"""Wall time and peak memory per phase of a generator run
+
+Phases are entered with the phase() context manager and can nest. The
+time of a phase does not include the phases nested in it, so the times
+of all phases add up to the time spent in any of them. The peak memory
+of a phase is the highest amount of memory traced by tracemalloc while
+it, or any phase nested in it, was running.
+
+Phases that are entered several times, e.g. once per host, are summed
+up. NullTimer has the same interface and does nothing, so the generator
+can be instrumented without slowing down normal runs.
+"""
+import contextlib
+import time
+import tracemalloc
+
+class NullTimer:
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+class PhaseTimer:
+    def __init__(self, memory=True):
+        """Measure peak memory with tracemalloc if memory is set. This
+        makes the generator noticeably slower"""
+        self.memory = memory
+        #name -> [calls, seconds, peak bytes]
+        self.phases = {}
+        self._stack = []
+        self._t0 = None
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _flush(self):
+        """Account memory and time since the last phase change"""
+        now = time.perf_counter()
+        if self._stack:
+            self.phases[self._stack[-1]][1] += now - self._t0
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                for name in self._stack:
+                    p = self.phases[name]
+                    p[2] = max(p[2], peak)
+        if self.memory:
+            tracemalloc.reset_peak()
+        self._t0 = now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self._flush()
+        self.phases.setdefault(name, [0, 0.0, 0])[0] += 1
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._flush()
+            self._stack.pop()
+
+    def stop(self):
+        if self.memory:
+            tracemalloc.stop()
+
+    def report(self):
+        total = sum(p[1] for p in self.phases.values())
+        print("{:<40} {:>6} {:>10} {:>6} {:>10}".format(
+            'phase', 'calls', 'time [ms]', '%', 'peak [MB]'))
+        for name, (calls, seconds, peak) in self.phases.items():
+            print("{:<40} {:>6} {:>10.2f} {:>6.1f} {:>10}".format(
+                name, calls, seconds * 1e3,
+                100 * seconds / total if total else 0.0,
+                "{:.2f}".format(peak / 2**20) if self.memory else '-'))
+        print("{:<40} {:>6} {:>10.2f}".format('total', '', total * 1e3))
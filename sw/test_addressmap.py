@@ -0,0 +1,156 @@
+# Copyright 2014-2022 Olof Kindgren <olof.kindgren@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+"""Check AddressMap against the priority rule of wb_mux
+
+Run with pytest. The lookup, overlap and hole queries are compared with
+a linear scan over the regions of random maps. Random maps with
+overlapping regions are also decoded, and every address of a small
+address space, or the addresses around all region boundaries of a
+32-bit one, must select the same device through the match terms as
+through AddressMap.find(), with at most one term matching.
+"""
+import random
+
+import pytest
+
+from addressmap import AddressMap
+
+def random_map(rng, aw, num_devices, max_size_bits):
+    regions = []
+    full = (1 << aw) - 1
+    for i in range(num_devices):
+        size = 1 << rng.randint(2, max_size_bits)
+        #Cluster the devices at the bottom of the address space now and
+        #then, so that more of them overlap
+        top = (1 << rng.randint(max_size_bits, aw)) - 1
+        offset = rng.randint(0, top) & ~(size - 1)
+        regions.append(('d{}'.format(i), offset, ~(size - 1) & full))
+    return AddressMap(regions, aw)
+
+def scan(address_map, addr):
+    """Regions containing addr, the one listed last first"""
+    return sorted([r for r in address_map.regions if addr in r],
+                  key=lambda r: -r.index)
+
+@pytest.mark.parametrize('seed', range(40))
+def test_queries(seed):
+    rng = random.Random(seed)
+    aw = 12
+    address_map = random_map(rng, aw, rng.randint(1, 8), 9)
+    for addr in range(1 << aw):
+        found = scan(address_map, addr)
+        assert address_map.find_all(addr) == found, hex(addr)
+        assert address_map.find(addr) == (found[0] if found else None), hex(addr)
+
+    for _ in range(100):
+        base = rng.randrange(1 << aw)
+        end = rng.randint(base + 1, 1 << aw)
+        assert set(address_map.overlapping(base, end)) == set(
+            r for r in address_map.regions if r.base < end and r.end > base)
+
+    pairs = set((a.name, b.name) for a, b in address_map.overlaps())
+    expected = set()
+    for a in address_map.regions:
+        for b in address_map.regions:
+            if a.index > b.index and a.base < b.end and b.base < a.end:
+                expected.add((a.name, b.name))
+    assert pairs == expected
+
+    decoded = [any(scan(address_map, a)) for a in range(1 << aw)]
+    for base, end in address_map.holes():
+        assert not any(decoded[base:end])
+        assert base == 0 or decoded[base-1]
+        assert end == 1 << aw or decoded[end]
+    assert sum(end - base for base, end in address_map.holes()) == decoded.count(False)
+
+def test_overlapping_and_adjacent():
+    address_map = AddressMap([('mem',  0x0000, 0xf000),
+                              ('boot', 0x0000, 0xff00),
+                              ('uart', 0x1000, 0xff00),
+                              ('gpio', 0x1100, 0xff00),
+                              ('spi',  0x4000, 0xc000)], aw=16)
+    names = lambda regions: [r.name for r in regions]
+    assert [(a.name, b.name) for a, b in address_map.overlaps()] == [('boot', 'mem')]
+    #Adjacent regions do not overlap
+    assert names(address_map.overlapping(0x1000, 0x1100)) == ['uart']
+    assert names(address_map.overlapping(0x0fff, 0x1001)) == ['mem', 'uart']
+    assert names(address_map.overlapping(0x0000, 0x0001)) == ['mem', 'boot']
+    assert names(address_map.find_all(0x00ff)) == ['boot', 'mem']
+    assert names(address_map.find_all(0x0100)) == ['mem']
+    assert address_map.find(0x10ff).name == 'uart'
+    assert address_map.find(0x1100).name == 'gpio'
+    assert address_map.find(0x1200) is None
+    assert address_map.find(0x3fff) is None
+    assert address_map.find(0x7fff).name == 'spi'
+    assert address_map.find(0x8000) is None
+    assert address_map.holes() == [(0x1200, 0x4000), (0x8000, 0x10000)]
+    assert address_map.holes(0x1000, 0x5000) == [(0x1200, 0x4000)]
+    assert address_map.holes(0x4000, 0x8000) == []
+
+def test_invalid_regions():
+    #Misaligned regions and sizes that are not a power of two are reported
+    #and left out of the index, keeping their index for the others
+    address_map = AddressMap([('misaligned', 0x0080, 0xff00),
+                              ('odd_size',   0x1000, ~(0x300 - 1) & 0xffff),
+                              ('uart',       0x2000, 0xff00)], aw=16)
+    assert len(address_map.errors) == 2
+    assert 'misaligned' in address_map.errors[0]
+    assert 'odd_size' in address_map.errors[1]
+    assert address_map.names == ['misaligned', 'odd_size', 'uart']
+    assert [(r.name, r.index) for r in address_map.regions] == [('uart', 2)]
+    assert address_map.find(0x0080) is None
+    assert address_map.find(0x2000).index == 2
+    assert address_map.holes() == [(0x0000, 0x2000), (0x2100, 0x10000)]
+
+def check(address_map, decode, addresses):
+    for addr in addresses:
+        region = address_map.find(addr)
+        expected = region.index if region else None
+        assert decode.find(addr) == expected, hex(addr)
+        if addr & decode.common_mask == decode.common_addr:
+            matches = [t for t in decode.terms if addr & t[2] == t[1]]
+        else:
+            matches = []
+        assert len(matches) == (expected is not None), hex(addr)
+
+@pytest.mark.parametrize('seed', range(40))
+def test_decode_exhaustive(seed):
+    rng = random.Random(seed)
+    aw = 12
+    address_map = random_map(rng, aw, rng.randint(1, 8), 9)
+    decode = address_map.decode()
+    check(address_map, decode, range(1 << aw))
+
+@pytest.mark.parametrize('seed', range(40))
+def test_decode_boundaries(seed):
+    rng = random.Random(seed)
+    aw = 32
+    address_map = random_map(rng, aw, rng.randint(1, 32), 20)
+    decode = address_map.decode()
+    full = (1 << aw) - 1
+    addresses = {0, full}
+    for r in address_map.regions:
+        for a in (r.base, r.end - 1, r.end):
+            addresses.update([(a - 1) & full, a & full, (a + 1) & full])
+    addresses.update(rng.getrandbits(aw) for _ in range(1000))
+    check(address_map, decode, sorted(addresses))
+
+def test_decode_priority():
+    #The device listed last wins where regions overlap
+    address_map = AddressMap([('mem', 0x0000, 0xff00),
+                              ('boot', 0x0000, 0xfff0),
+                              ('uart', 0x0080, 0xfff0)], aw=16)
+    decode = address_map.decode()
+    assert [decode.find(a) for a in (0x00, 0x10, 0x80, 0x90, 0x100)] == [1, 0, 2, 0, None]
+    check(address_map, decode, range(1 << 16))
+
+def test_decode_max_terms():
+    rng = random.Random(0)
+    for _ in range(20):
+        address_map = random_map(rng, 16, 8, 12)
+        n = len(address_map.decode().terms)
+        assert address_map.decode(max_terms=n) is not None
+        assert address_map.decode(max_terms=n - 1) is None
+
+def test_decode_empty():
+    assert AddressMap([]).decode() is None
@@ -0,0 +1,109 @@
+# Copyright 2014-2022 Olof Kindgren <olof.kindgren@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+"""Check the regeneration cache of WbIntercon.write()
+
+Run with pytest. A second run with the same config must not build or
+write anything. Changing the config, editing or removing an output or
+removing the .cache file must build the interconnect again.
+"""
+import os
+
+import pytest
+import yaml
+
+from wb_intercon_gen2 import WbIntercon
+
+CONFIG = {'vlnv' : 'vendor:lib:intercon:0',
+          'parameters' : {
+              'hosts' : {'cpu' : {'devices' : ['rom', 'uart']}},
+              'devices' : {
+                  'rom'  : {'offset' : 0x0000, 'size' : 0x1000},
+                  'uart' : {'offset' : 0x2000, 'size' : 0x1000}}}}
+
+@pytest.fixture
+def builds(tmp_path, monkeypatch):
+    """Run in tmp_path and count the calls to WbIntercon._build"""
+    monkeypatch.chdir(tmp_path)
+    count = []
+    build = WbIntercon._build
+    def counted(self):
+        count.append(self)
+        return build(self)
+    monkeypatch.setattr(WbIntercon, '_build', counted)
+    return count
+
+def write_config(config):
+    with open('config.yml', 'w') as f:
+        yaml.safe_dump(config, f)
+
+def generate():
+    return WbIntercon('intercon', 'config.yml').write()
+
+def mtimes(files):
+    return [os.stat(f).st_mtime_ns for f in files]
+
+def test_unchanged(builds):
+    write_config(CONFIG)
+    assert generate() == 'written'
+    files = WbIntercon('intercon', 'config.yml').output_files()
+    assert all(os.path.exists(f) for f in files + ['.wb_intercon.v.cache'])
+    before = mtimes(files)
+    assert generate() == 'unchanged'
+    assert len(builds) == 1
+    assert mtimes(files) == before
+
+def test_config_changed(builds):
+    write_config(CONFIG)
+    generate()
+    config = yaml.safe_load(yaml.safe_dump(CONFIG))
+    config['parameters']['devices']['uart']['offset'] = 0x3000
+    write_config(config)
+    assert generate() == 'written'
+    assert len(builds) == 2
+    assert generate() == 'unchanged'
+
+def test_module_name_changed(builds):
+    write_config(CONFIG)
+    generate()
+    assert WbIntercon('other', 'config.yml').write() == 'written'
+
+@pytest.mark.parametrize('output', ['wb_intercon.v', 'wb_intercon.vh', 'intercon.core'])
+def test_output_edited(builds, output):
+    write_config(CONFIG)
+    generate()
+    with open(output) as f:
+        contents = f.read()
+    with open(output, 'a') as f:
+        f.write('//edited\n')
+    assert generate() == 'written'
+    with open(output) as f:
+        assert f.read() == contents
+    assert generate() == 'unchanged'
+
+def test_output_removed(builds):
+    write_config(CONFIG)
+    generate()
+    os.remove('wb_intercon.vh')
+    assert generate() == 'written'
+    assert os.path.exists('wb_intercon.vh')
+
+def test_cache_removed(builds):
+    write_config(CONFIG)
+    generate()
+    before = mtimes(['wb_intercon.v'])
+    os.remove('.wb_intercon.v.cache')
+    #Built again, but identical outputs are left alone
+    assert generate() == 'unchanged'
+    assert len(builds) == 2
+    assert os.path.exists('.wb_intercon.v.cache')
+    assert mtimes(['wb_intercon.v']) == before
+    assert generate() == 'unchanged'
+    assert len(builds) == 2
+
+def test_cache_corrupt(builds):
+    write_config(CONFIG)
+    generate()
+    with open('.wb_intercon.v.cache', 'w') as f:
+        f.write('{')
+    generate()
+    assert len(builds) == 2
@@ -0,0 +1,137 @@
+# Copyright 2014-2022 Olof Kindgren <olof.kindgren@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+"""Check WbIntercon(name, config) as a library API
+
+Run with pytest. Building an interconnect from a dict or a file must
+not create files or print anything, and must leave a dict config
+unmodified. Each value of the wrong type must raise ConfigError with
+the key path of the value in the message.
+"""
+import copy
+import os
+
+import pytest
+import yaml
+
+from wb_intercon_gen2 import WbIntercon, ConfigError
+
+def make_config(**arbitration):
+    return {'vlnv' : 'vendor:lib:intercon:0',
+            'parameters' : {
+                'hosts' : {'cpu' : {'devices' : ['ram']},
+                           'dma' : {'devices' : ['ram']}},
+                'devices' : {
+                    'ram' : {'offset' : 0, 'size' : 0x1000,
+                             'arbitration' : dict(policy='fixed_priority',
+                                                  **arbitration)}}}}
+
+def test_arbitration():
+    g = WbIntercon('intercon', make_config(priority=['dma'], lock_burst=False))
+    assert g.devices['ram'].priority == ['dma']
+    assert g.devices['ram'].lock_burst is False
+
+@pytest.mark.parametrize('priority', [3, 'dma', {'dma' : 1}])
+def test_priority_not_a_list(priority):
+    with pytest.raises(ConfigError, match='parameters.devices.ram.arbitration.priority'):
+        WbIntercon('intercon', make_config(priority=priority))
+
+@pytest.mark.parametrize('lock_burst', ['false', 'true', 0, 1, None])
+def test_lock_burst_not_a_bool(lock_burst):
+    with pytest.raises(ConfigError, match='parameters.devices.ram.arbitration.lock_burst'):
+        WbIntercon('intercon', make_config(lock_burst=lock_burst))
+
+def make_perf_config(**settings):
+    config = make_config()
+    config['parameters']['perf_counters'] = dict(offset=0x10000, **settings)
+    return config
+
+def test_perf_counters_hosts():
+    g = WbIntercon('intercon', make_perf_config(hosts=['cpu']))
+    assert [h.name for h in g.devices[g.perf_counters].hosts] == ['cpu']
+
+@pytest.mark.parametrize('hosts', ['cpu', 3])
+def test_perf_counters_hosts_not_a_list(hosts):
+    with pytest.raises(ConfigError, match='parameters.perf_counters.hosts'):
+        WbIntercon('intercon', make_perf_config(hosts=hosts))
+
+def test_no_side_effects(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    config = make_perf_config()
+    expected = copy.deepcopy(config)
+    g = WbIntercon('intercon', config)
+    assert config == expected
+    assert g.output_files()
+    assert os.listdir(tmp_path) == []
+    assert capsys.readouterr() == ('', '')
+
+def test_dict_and_file(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    config = make_config(priority=['dma'])
+    with open('config.yml', 'w') as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+    from_dict = WbIntercon('intercon', config)
+    from_file = WbIntercon('intercon', 'config.yml')
+    assert from_dict.config_digest == from_file.config_digest
+    assert list(from_dict.devices) == list(from_file.devices) == ['ram']
+    assert os.listdir(tmp_path) == ['config.yml']
+    assert capsys.readouterr() == ('', '')
+
+def test_warnings_not_printed(capsys):
+    config = make_config()
+    config['parameters']['devices']['rom'] = {'offset' : 0, 'size' : 0x100}
+    config['parameters']['hosts']['cpu']['devices'].append('rom')
+    g = WbIntercon('intercon', config)
+    assert any("'rom' and 'ram' overlap" in w for w in g.warnings)
+    assert capsys.readouterr() == ('', '')
+
+@pytest.mark.parametrize('path, value', [
+    ('parameters', 'cpu'),
+    ('parameters.hosts', ['cpu']),
+    ('parameters.hosts.cpu', 'ram'),
+    ('parameters.hosts.cpu.devices', 'ram'),
+    ('parameters.devices', ['ram']),
+    ('parameters.devices.ram', 0x1000),
+    ('parameters.devices.ram.offset', 'zero'),
+    ('parameters.devices.ram.size', '0x1000 bytes'),
+    ('parameters.devices.ram.datawidth', None),
+    ('parameters.devices.ram.arbitration.weights', ['cpu']),
+    ('parameters.devices.ram.arbitration.weights.cpu', 'high'),
+    ('parameters.perf_counters', 0x10000),
+])
+def test_malformed(path, value):
+    config = make_config()
+    parent = config
+    keys = path.split('.')
+    for key in keys[:-1]:
+        parent = parent.setdefault(key, {})
+    parent[keys[-1]] = value
+    with pytest.raises(ConfigError, match=path.replace('.', r'\.') + r'\b'):
+        WbIntercon('intercon', config)
+
+@pytest.mark.parametrize('config', [{}, {'parameters' : {}}, {'vlnv' : 'intercon'}])
+def test_missing_sections(config):
+    with pytest.raises(ConfigError):
+        WbIntercon('intercon', config)
+
+def test_not_a_mapping(tmp_path):
+    config_file = str(tmp_path / 'config.yml')
+    with open(config_file, 'w') as f:
+        f.write('- vlnv\n- parameters\n')
+    with pytest.raises(ConfigError):
+        WbIntercon('intercon', config_file)
+
+def test_hole_report(capsys):
+    config = make_config()
+    config['parameters']['devices'].update(
+        uart = {'offset' : 0x2000, 'size' : 0x100},
+        gpio = {'offset' : 0x4000, 'size' : 0x100})
+    config['parameters']['hosts']['cpu']['devices'] += ['uart', 'gpio']
+    WbIntercon('intercon', config, verbose=True)
+    out = capsys.readouterr().out
+    assert "Host 'cpu' has 2 unmapped range(s) of 0x2f00 bytes in total" in out
+    assert "no device at" not in out
+    WbIntercon('intercon', config, verbose=2)
+    out = capsys.readouterr().out
+    assert "Host 'cpu' has no device at 0x00001000-0x00001fff" in out
+    assert "Host 'cpu' has no device at 0x00002100-0x00003fff" in out
+    assert "Host 'dma'" not in out
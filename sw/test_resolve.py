@@ -0,0 +1,82 @@
+# Copyright 2014-2022 Olof Kindgren <olof.kindgren@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+"""Check WbIntercon.resolve() against AddressMap.find()
+
+Run with pytest. Needs numpy. The addresses at and around every region
+boundary of each host, and the ends of the address space, must resolve
+to the index of the device that AddressMap.find() selects, or -1 where
+no device is selected.
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from wb_intercon_gen2 import WbIntercon, Error
+
+CONFIG = {'vlnv' : 'vendor:lib:intercon:0',
+          'parameters' : {
+              'hosts' : {
+                  'cpu' : {'devices' : ['mem', 'boot', 'uart', 'gpio', 'spi', 'timer', 'ram']},
+                  'dma' : {'devices' : ['ram', 'uart', 'gpio', 'spi', 'timer']}},
+              'devices' : {
+                  'mem'  : {'offset' : 0x00000000, 'size' : 0x10000},
+                  'boot' : {'offset' : 0x00000000, 'size' : 0x4000},
+                  'uart' : {'offset' : 0x00008000, 'size' : 0x100},
+                  'gpio' : {'offset' : 0x00008100, 'size' : 0x100},
+                  'spi'  : {'offset' : 0x90000000, 'size' : 0x1000},
+                  'timer': {'offset' : 0x90001000, 'size' : 0x1000},
+                  'ram'  : {'offset' : 0xfffff000, 'size' : 0x1000}}}}
+
+def edge_addresses(address_map):
+    full = (1 << address_map.aw) - 1
+    addresses = {0, 1, full - 1, full}
+    for r in address_map.regions:
+        for a in (r.base, r.end):
+            addresses.update([(a - 1) & full, a & full, (a + 1) & full])
+    return sorted(addresses)
+
+@pytest.mark.parametrize('topology', ['crossbar', 'clustered'])
+@pytest.mark.parametrize('host', ['cpu', 'dma'])
+def test_resolve(host, topology):
+    config = {'vlnv' : CONFIG['vlnv'],
+              'parameters' : dict(CONFIG['parameters'], topology=topology)}
+    g = WbIntercon('intercon', config)
+    #spi and timer are put behind a bridge, which does not change the map
+    assert bool(g.bridges) == (topology == 'clustered')
+    address_map = g.hosts[host].address_map
+    addresses = edge_addresses(address_map)
+    expected = []
+    for addr in addresses:
+        region = address_map.find(addr)
+        expected.append(region.index if region else -1)
+    #Small batches to check the positions across batches
+    result = g.resolve(host, np.array(addresses, dtype=np.uint64), batch_size=5)
+    assert result.tolist() == expected
+
+    for addr, index in zip(addresses, result):
+        region = address_map.find(addr)
+        if region:
+            assert address_map.names[index] == region.name
+
+def test_resolve_names():
+    g = WbIntercon('intercon', CONFIG)
+    names = g.hosts['cpu'].address_map.names
+    result = g.resolve('cpu', [0x0, 0x4000, 0x8000, 0x80ff, 0x8100, 0x90000fff, 0xffffffff])
+    assert [names[i] for i in result] == ['boot', 'mem', 'uart', 'uart', 'gpio', 'spi', 'ram']
+
+def test_resolve_unmatched():
+    g = WbIntercon('intercon', CONFIG)
+    addresses = [0x8000, 0x8200, 0x10000, 0x9000, 0x90002000, 0xfffff000, 0xffffefff]
+    calls = []
+    result = g.resolve('dma', addresses, batch_size=3,
+                       on_unmatched=lambda pos, adr: calls.append((pos.tolist(), adr.tolist())))
+    assert result.tolist() == [1, -1, -1, -1, -1, 0, -1]
+    #Called per batch of three, with positions in the whole trace
+    assert calls == [([1, 2], [0x8200, 0x10000]),
+                     ([3, 4], [0x9000, 0x90002000]),
+                     ([6], [0xffffefff])]
+
+def test_resolve_unknown_host():
+    g = WbIntercon('intercon', CONFIG)
+    with pytest.raises(Error, match="Could not find host 'gpu'"):
+        g.resolve('gpu', [0])
@@ -1,6 +1,21 @@
 # Copyright 2014-2022 Olof Kindgren <olof.kindgren@gmail.com>
 # SPDX-License-Identifier: Apache-2.0
+import io
+
+_ranges = {}
+
+def _range(width):
+    """Range string of a [width-1:0] signal. Only built once per width"""
+    try:
+        return _ranges[width]
+    except KeyError:
+        r = '[' + str(width-1) + ':0]' if width > 0 else ''
+        _ranges[width] = r
+        return r
+
 class Signal(object):
+    __slots__ = ['name', 'width', 'low', 'asc', '_type']
+
     def __init__(self, name, width=0, low=0, asc=False, _type=None):
         self.name = name
         self.width=width
@@ -9,6 +24,8 @@ class Signal(object):
         self._type = _type
 
     def range(self):
+        if not self.low and not self.asc:
+            return _range(self.width)
         if self.width > 0:
             l = self.width+self.low-1
             r = self.low
@@ -19,23 +36,31 @@ class Signal(object):
         return ''
 
 class Wire(Signal):
+    __slots__ = []
+
     def write(self, width):
         return '{_type}{range} {name};\n'.format(_type=self._type or "wire",
                                               range=self.range().rjust(width),
                                               name=self.name)
 
 class Parameter:
+    __slots__ = ['name', 'value']
+
     def __init__(self, name, value):
         self.name  = name
         self.value = value
 
 class Port:
+    __slots__ = ['name', 'value', '_type']
+
     def __init__(self, name="", value="", _type=None):
         self.name = name
         self.value = value
         self._type = _type
 
 class ModulePort(Signal):
+    __slots__ = ['dir']
+
     def __init__(self, name, dir, width=0, low=0, asc=False, _type=None):
         super(ModulePort, self).__init__(name, width, low, asc, _type)
         self.dir = dir
@@ -48,6 +73,8 @@ class ModulePort(Signal):
                         name=self.name)
 
 class Instance:
+    __slots__ = ['module', 'name', 'parameters', 'ports']
+
     def __init__(self, module, name, parameters, ports):
         self.module = module
         self.name = name
@@ -55,13 +82,21 @@ class Instance:
         self.ports = ports
 
     def write(self):
-        s = self.module
+        f = io.StringIO()
+        self.emit(f.write)
+        return f.getvalue()
+
+    def emit(self, out):
+        out(self.module)
         if self.parameters:
             max_len = max([len(p.name) for p in self.parameters])
-            s += '\n  #('
-            s += ',\n    '.join(['.' + p.name.ljust(max_len) +' (' + str(p.value) + ')' for p in self.parameters])
-            s += ')\n'
-        s += ' ' + self.name
+            sep = '\n  #('
+            for p in self.parameters:
+                out(sep)
+                out('.' + p.name.ljust(max_len) + ' (' + str(p.value) + ')')
+                sep = ',\n    '
+            out(')\n')
+        out(' ' + self.name)
 
         def _val(p):
             if p.value:
@@ -71,57 +106,189 @@ class Instance:
             else:
                 return ""
         if self.ports:
-            s += '\n   ('
             max_len = max([len(p.name) for p in self.ports])
-            s += ',\n    '.join(['.' + p.name.ljust(max_len) +' (' + _val(p) + ')' for p in self.ports])
-            s += ')'
-        s += ';\n'
-        return s
+            sep = '\n   ('
+            for p in self.ports:
+                out(sep)
+                out('.' + p.name.ljust(max_len) + ' (')
+                if isinstance(p.value, list):
+                    #Stream concatenations element by element
+                    vsep = '{'
+                    for v in p.value:
+                        out(vsep)
+                        out(v)
+                        vsep = ', '
+                    out('}')
+                else:
+                    out(_val(p))
+                out(')')
+                sep = ',\n    '
+            out(')')
+        out(';\n')
+
+class WireTable:
+    """Wire declarations of a module, stored column-wise
+
+    Holds one entry per wire in parallel lists instead of one Wire object
+    each. Range strings are interned, so wires of the same width share
+    them."""
+    __slots__ = ['names', 'ranges', 'types']
+
+    def __init__(self):
+        self.names  = []
+        self.ranges = []
+        self.types  = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, width=0, _type=None):
+        self.names.append(name)
+        self.ranges.append(_range(width))
+        self.types.append(_type)
+
+    def add_signal(self, w):
+        self.names.append(w.name)
+        self.ranges.append(w.range())
+        self.types.append(w._type)
+
+    def emit(self, out):
+        width = max(len(r) for r in set(self.ranges)) + 1
+        for name, r, _type in zip(self.names, self.ranges, self.types):
+            out((_type or 'wire') + r.rjust(width) + ' ' + name + ';\n')
+
+class PortTable:
+    """Module ports and how the instantiation template connects to them
+
+    Each entry is a port of the module and the net it is connected to in
+    the template. If wire_width is not None, the template also declares
+    the net as a wire of that width. Both the module header and the
+    template are rendered from this table."""
+    __slots__ = ['names', 'dirs', 'ranges', 'types', 'nets', 'wire_ranges']
+
+    def __init__(self):
+        self.names  = []
+        self.dirs   = []
+        self.ranges = []
+        self.types  = []
+        self.nets   = []
+        self.wire_ranges = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, direction, width=0, net=None, wire_width=None, _type=None):
+        self.names.append(name)
+        self.dirs.append(direction)
+        self.ranges.append(_range(width))
+        self.types.append(_type)
+        self.nets.append(net)
+        self.wire_ranges.append(None if wire_width is None else _range(wire_width))
+
+    def add_signal(self, p):
+        self.names.append(p.name)
+        self.dirs.append(p.dir)
+        self.ranges.append(p.range())
+        self.types.append(p._type)
+        self.nets.append(None)
+        self.wire_ranges.append(None)
+
+    def emit(self, out):
+        type_len = max(len(t or 'wire') for t in set(self.types))
+        max_len = max(len(r) for r in set(self.ranges))
+        sep = '   ('
+        for name, d, r, _type in zip(self.names, self.dirs, self.ranges, self.types):
+            out(sep)
+            out(d.ljust(6) + ' ' + (_type or 'wire').ljust(type_len) + ' ' +
+                r.rjust(max_len) + ' ' + name)
+            sep = ',\n    '
+        out(')')
 
 class VerilogWriter:
     header = ""
-    raw = ""
+    #Buffer size used when write() opens the output file itself
+    buffer_size = 1 << 16
+
     def __init__(self, name):
         self.name = name
         self.instances = []
-        self.ports = []
-        self.wires = []
+        self.raw = []
+        self.ports = PortTable()
+        self.wires = WireTable()
 
     def add(self, obj):
         if isinstance(obj, Instance):
-            self.instances += [obj]
+            self.instances.append(obj)
         elif isinstance(obj, ModulePort):
-            self.ports += [obj]
+            self.ports.add_signal(obj)
         elif isinstance(obj, Wire):
-            self.wires += [obj]
+            self.wires.add_signal(obj)
         else:
             raise Exception("Invalid type!" + str(obj))
 
-    def write(self, file=None):
-        s = self.header
+    def add_raw(self, text):
+        """Add verilog text, such as assign statements, before the instances"""
+        self.raw.append(text)
+
+    def add_wire(self, name, width=0):
+        self.wires.add(name, width)
+
+    def add_port(self, name, direction, width=0, net=None, wire_width=None):
+        """Add a module port and its connection in the template"""
+        self.ports.add(name, direction, width, net, wire_width)
+
+    def template(self, instance_name, parameters=[]):
+        """Instantiation template of this module
+
+        Returns a new VerilogWriter with the template wires and an
+        instance of the module connected to them, as given by the port
+        table."""
+        t = VerilogWriter(self.name)
+        p = self.ports
+        for net, r in zip(p.nets, p.wire_ranges):
+            if r is not None:
+                t.wires.names.append(net)
+                t.wires.ranges.append(r)
+                t.wires.types.append(None)
+        t.add(Instance(self.name, instance_name, parameters,
+                       [Port(name, net) for name, net in zip(p.names, p.nets)]))
+        return t
+
+    def emit(self, out):
+        """Stream the module to out, a callable taking a string.
+
+        Every piece of text is handed to out as soon as it is produced,
+        so the total cost is linear in the size of the generated module
+        and nothing but the current line is kept in memory."""
+        out(self.header)
 
         if self.ports:
-            s += "`default_nettype none\n"
-            s += "module {name}\n".format(name=self.name)
-            type_len = max([len(p._type or "wire") for p in self.ports])
-            max_len = max([len(p.range()) for p in self.ports])
-            s += '   ('
-            s += ',\n    '.join([p.write(type_len, max_len) for p in self.ports])
-            s += ')'
-            s += ';\n\n'
+            out("`default_nettype none\n")
+            out("module {name}\n".format(name=self.name))
+            self.ports.emit(out)
+            out(';\n\n')
         if self.wires:
-            max_len = max([len(w.range()) for w in self.wires])
-            for w in self.wires:
-                s += w.write(max_len + 1)
-            s +='\n'
-        s += self.raw
+            self.wires.emit(out)
+            out('\n')
+        for r in self.raw:
+            out(r)
         for i in self.instances:
-            s += i.write()
-            s += '\n'
+            i.emit(out)
+            out('\n')
         if self.ports:
-            s += 'endmodule\n'
+            out('endmodule\n')
+
+    def write(self, file=None):
+        """Write the module to file
+
+        file can be a path, any object with a write() method or None, in
+        which case the generated text is returned as a string."""
         if file is None:
-            return s
+            f = io.StringIO()
+            self.emit(f.write)
+            return f.getvalue()
+        elif hasattr(file, 'write'):
+            self.emit(file.write)
         else:
-            f = open(file,'w')
-            f.write(s)
+            with open(file, 'w', buffering=self.buffer_size) as f:
+                self.emit(f.write)
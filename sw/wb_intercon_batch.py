@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# Copyright 2014-2022 Olof Kindgren <olof.kindgren@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+"""Generate many interconnects in one go
+
+Runs wb_intercon_gen2 for a list of configs in a pool of worker
+processes, so that the whole batch takes about as long as the slowest
+config instead of the sum of all of them. The generator is imported once
+and shared by all workers. The output files of all configs are looked
+up before anything is generated, and a config that would overwrite the
+files of an earlier one fails. Each config gets one summary line with
+its status, written, unchanged or failed, and the exit status is 1 if
+any of them failed.
+
+Usage: wb_intercon_batch.py [-j jobs] [-o outdir] [-m manifest] [-v] [config ...]
+
+Configs given on the command line are generated in the current
+directory, or in <outdir>/<config name> with -o. A manifest is a YAML
+file with a list of configs, where each entry is either a path or a dict
+with the keys
+
+  config      : Path to the config file (required)
+  workdir     : Directory to generate in (default: the manifest directory)
+  output_file : Overrides output_file of the config
+  name        : Module name (default wb_intercon)
+
+Relative paths in a manifest are relative to the manifest itself.
+
+configs:
+  - soc/config.yml
+  - config  : periph/config.yml
+    workdir : build/periph
+    name    : periph_intercon
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import os
+import sys
+import time
+
+import yaml
+
+from wb_intercon_gen2 import Error, WbIntercon
+
+class Job:
+    def __init__(self, config, workdir, output_file=None, name='wb_intercon'):
+        self.config = os.path.abspath(config)
+        self.workdir = os.path.abspath(workdir)
+        self.output_file = output_file
+        self.name = name
+
+def load_manifest(manifest):
+    """Read a manifest file and return a list of Jobs"""
+    base = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest) as f:
+        data = yaml.safe_load(f) or {}
+    jobs = []
+    for entry in data.get('configs', []):
+        if not isinstance(entry, dict):
+            entry = {'config' : entry}
+        entry = dict(entry)
+        try:
+            config = entry.pop('config')
+        except KeyError:
+            raise ValueError("Manifest entry without config in {}".format(manifest))
+        workdir = entry.pop('workdir', '.')
+        output_file = entry.pop('output_file', None)
+        name = entry.pop('name', 'wb_intercon')
+        if entry:
+            raise ValueError("Unknown properties {} in manifest entry for {}".format(
+                ', '.join(entry), config))
+        jobs.append(Job(os.path.join(base, str(config)),
+                        os.path.join(base, str(workdir)),
+                        output_file, str(name)))
+    return jobs
+
+def load(job, verbose=False):
+    """Load the config of job with the settings of the job applied"""
+    g = WbIntercon(job.name, job.config, verbose=verbose)
+    if job.output_file:
+        g.output_file = job.output_file
+    return g
+
+def plan(job):
+    """Find the files that job will write. Runs in a worker process
+
+    Returns a dict with the absolute paths of the files, or with the
+    error if the config could not be loaded."""
+    result = {'files' : []}
+    try:
+        g = load(job)
+        result['files'] = [os.path.join(job.workdir, f) for f in g.output_files()]
+    except Error as e:
+        result['error'] = str(e)
+    except Exception as e:
+        result['error'] = "{}: {}".format(type(e).__name__, e)
+    return result
+
+def generate(job):
+    """Generate one interconnect. Runs in a worker process
+
+    Returns a dict with the status, the run time and the generator
+    output."""
+    log = io.StringIO()
+    result = {'config' : job.config, 'status' : 'failed',
+              'time' : 0.0, 'log' : ''}
+    cwd = os.getcwd()
+    t0 = time.perf_counter()
+    try:
+        os.makedirs(job.workdir, exist_ok=True)
+        os.chdir(job.workdir)
+        with contextlib.redirect_stdout(log):
+            result['status'] = load(job, verbose=True).write()
+    except Error as e:
+        result['error'] = str(e)
+    except Exception as e:
+        result['error'] = "{}: {}".format(type(e).__name__, e)
+    finally:
+        os.chdir(cwd)
+    result['time'] = time.perf_counter() - t0
+    result['log'] = log.getvalue()
+    return result
+
+def check_conflicts(jobs, plans):
+    """Errors for the jobs that would write the same files as an earlier
+    job, or whose config could not be loaded, by job index"""
+    errors = {}
+    owner = {}
+    for i, (job, p) in enumerate(zip(jobs, plans)):
+        if 'error' in p:
+            errors[i] = p['error']
+            continue
+        for f in p['files']:
+            if f in owner:
+                errors[i] = "{} is also generated from {}".format(f, owner[f])
+                break
+        else:
+            for f in p['files']:
+                owner[f] = job.config
+    return errors
+
+def run(jobs, num_workers):
+    """Run all jobs and return their results in job order
+
+    The files of all jobs are looked up first. Jobs that would overwrite
+    the files of an earlier job fail without writing anything."""
+    with contextlib.ExitStack() as stack:
+        if num_workers == 1 or len(jobs) < 2:
+            map_jobs = lambda f, jobs: list(map(f, jobs))
+        else:
+            pool = stack.enter_context(concurrent.futures.ProcessPoolExecutor(num_workers))
+            map_jobs = lambda f, jobs: list(pool.map(f, jobs))
+        errors = check_conflicts(jobs, map_jobs(plan, jobs))
+        todo = [job for i, job in enumerate(jobs) if i not in errors]
+        done = iter(map_jobs(generate, todo))
+    results = []
+    for i, job in enumerate(jobs):
+        if i in errors:
+            results.append({'config' : job.config, 'status' : 'failed',
+                            'time' : 0.0, 'log' : '', 'error' : errors[i]})
+        else:
+            results.append(next(done))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate Wishbone interconnects from many configs in parallel")
+    parser.add_argument('configs', nargs='*', help="Config files")
+    parser.add_argument('-m', '--manifest', action='append', default=[],
+                        help="YAML file with a list of configs")
+    parser.add_argument('-o', '--outdir',
+                        help="Generate each config in <outdir>/<config name>")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: all CPUs)")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="Show the generator output of each config")
+    args = parser.parse_args()
+
+    jobs = []
+    for config in args.configs:
+        workdir = '.'
+        if args.outdir:
+            stem = os.path.splitext(os.path.basename(config))[0]
+            workdir = os.path.join(args.outdir, stem)
+        jobs.append(Job(config, workdir))
+    try:
+        for manifest in args.manifest:
+            jobs += load_manifest(manifest)
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print("Error: %s" % e)
+        return 1
+    if not jobs:
+        parser.error("No configs given")
+
+    t0 = time.perf_counter()
+    results = run(jobs, max(args.jobs or 1, 1))
+    elapsed = time.perf_counter() - t0
+
+    failed = 0
+    for r in results:
+        if args.verbose and r['log']:
+            print(r['log'], end='')
+        print("{:<10} {:>7.2f}s  {}".format(r['status'], r['time'],
+                                            os.path.relpath(r['config'])))
+        if r['status'] == 'failed':
+            failed += 1
+            print("           Error: {}".format(r['error']))
+    print("{} configs, {} failed, {:.2f}s".format(len(results), failed, elapsed))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
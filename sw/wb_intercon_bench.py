@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Copyright 2014-2022 Olof Kindgren <olof.kindgren@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+"""Scaling benchmark for wb_intercon_gen2
+
+Generates interconnects for a series of synthetic configs with a growing
+number of host x device connections and reports run time and peak memory
+for each of them. Both should grow linearly with the number of
+connections, i.e. the per-connection columns should stay flat.
+
+A fraction of the devices, given by the sharing ratio, is connected to
+all hosts. The others are spread over the hosts, with one host each.
+With -o, a single config with hosts x max_devices is written to a file
+instead, e.g. to be run through wb_intercon_gen2.py --timings.
+
+Usage: wb_intercon_bench.py [-s sharing] [-o config_file] [hosts] [max_devices]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import yaml
+
+from wb_intercon_gen2 import WbIntercon
+
+def synthetic_config(num_hosts, num_devices, sharing=1.0):
+    """Create a config dict with num_hosts hosts and num_devices devices
+
+    The first sharing * num_devices devices are connected to every host
+    and the remaining ones to a single host each, round-robin."""
+    devices = {}
+    for i in range(num_devices):
+        devices['dev{}'.format(i)] = {'offset' : i * 0x1000,
+                                      'size'   : 0x1000}
+    num_shared = round(sharing * num_devices)
+    hosts = {}
+    for i in range(num_hosts):
+        hosts['host{}'.format(i)] = {'devices' : list(devices)[:num_shared]}
+    for i, device in enumerate(list(devices)[num_shared:]):
+        hosts['host{}'.format(i % num_hosts)]['devices'].append(device)
+    return {'vlnv' : '::bench_intercon:0',
+            'parameters' : {'hosts' : hosts, 'devices' : devices}}
+
+def run(num_hosts, num_devices, workdir, sharing=1.0):
+    config_file = os.path.join(workdir, 'config.yml')
+    with open(config_file, 'w') as f:
+        yaml.dump(synthetic_config(num_hosts, num_devices, sharing), f)
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    tracemalloc.start()
+    try:
+        t0 = time.perf_counter()
+        g = WbIntercon('wb_intercon', config_file, verbose=False)
+        g.write()
+        elapsed = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        os.chdir(cwd)
+    size = os.path.getsize(os.path.join(workdir, 'wb_intercon.v'))
+    return elapsed, peak, size
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark for wb_intercon_gen2")
+    parser.add_argument('hosts', nargs='?', type=int, default=8)
+    parser.add_argument('max_devices', nargs='?', type=int, default=512)
+    parser.add_argument('-s', '--sharing', type=float, default=1.0,
+                        help="Fraction of the devices connected to all hosts (default 1.0)")
+    parser.add_argument('-o', '--output',
+                        help="Only write a config with hosts x max_devices to this file")
+    args = parser.parse_args()
+    num_hosts   = args.hosts
+    max_devices = args.max_devices
+    if args.output:
+        with open(args.output, 'w') as f:
+            yaml.dump(synthetic_config(num_hosts, max_devices, args.sharing), f)
+        sys.exit(0)
+
+    print("{:>6} {:>8} {:>11} {:>10} {:>10} {:>12} {:>10}".format(
+        'hosts', 'devices', 'connections', 'time [s]', 'peak [MB]',
+        'us/conn', 'kB/conn'))
+    num_devices = 8
+    with tempfile.TemporaryDirectory() as workdir:
+        while num_devices <= max_devices:
+            num_shared = round(args.sharing * num_devices)
+            connections = num_hosts * num_shared + num_devices - num_shared
+            elapsed, peak, size = run(num_hosts, num_devices, workdir, args.sharing)
+            print("{:>6} {:>8} {:>11} {:>10.3f} {:>10.2f} {:>12.1f} {:>10.2f}".format(
+                num_hosts, num_devices, connections, elapsed, peak / 2**20,
+                elapsed * 1e6 / connections, peak / 1024 / connections))
+            num_devices *= 2
@@ -1,9 +1,17 @@
 #!/usr/bin/env python3
+import copy
+import functools
+import hashlib
+import io
+import os
 import sys
 from collections import OrderedDict, defaultdict
-import yaml
 
-from verilogwriter import Signal, Wire, Instance, ModulePort, VerilogWriter
+from addressmap import AddressMap
+from estimate import Estimate
+from perfbench import PerfBenchSettings, gen_perf_bench
+from phasetimer import NullTimer, PhaseTimer
+from verilogwriter import Signal, Instance, VerilogWriter
 
 WB_HOST_PORTS = [Signal('adr', 32),
                    Signal('dat', 32),
@@ -19,27 +27,231 @@ WB_DEVICE_PORTS  = [Signal('rdt', 32),
                    Signal('err'),
                    Signal('rty')]
 
+#B4 pipelined mode adds stall to the device to host signals
+WB_PIPELINED_DEVICE_PORTS = WB_DEVICE_PORTS + [Signal('stall')]
+
 WB_DATA_WIDTH = defaultdict(float, { 'dat': 1.0, 'rdt': 1.0 })
 
+AXI4_HOST_PORTS = [Signal('awid',    1),
+                   Signal('awaddr', 32),
+                   Signal('awlen',   8),
+                   Signal('awsize',  3),
+                   Signal('awburst', 2),
+                   Signal('awlock'),
+                   Signal('awcache', 4),
+                   Signal('awprot',  3),
+                   Signal('awvalid'),
+                   Signal('wdata',  32),
+                   Signal('wstrb',   4),
+                   Signal('wlast'),
+                   Signal('wvalid'),
+                   Signal('bready'),
+                   Signal('arid',    1),
+                   Signal('araddr', 32),
+                   Signal('arlen',   8),
+                   Signal('arsize',  3),
+                   Signal('arburst', 2),
+                   Signal('arlock'),
+                   Signal('arcache', 4),
+                   Signal('arprot',  3),
+                   Signal('arvalid'),
+                   Signal('rready')]
+
+AXI4_DEVICE_PORTS = [Signal('awready'),
+                     Signal('wready'),
+                     Signal('bid',   1),
+                     Signal('bresp', 2),
+                     Signal('bvalid'),
+                     Signal('arready'),
+                     Signal('rid',   1),
+                     Signal('rdata', 32),
+                     Signal('rresp', 2),
+                     Signal('rlast'),
+                     Signal('rvalid')]
+
+AXI4_DATA_WIDTH = defaultdict(float, { 'wdata': 1.0, 'wstrb': 0.125, 'rdata': 1.0 })
+
+GENERATOR_VERSION = '1.4.2'
+
+def _generator_digest():
+    """Hash of the generator version and its own source files.
+
+    Part of the regeneration cache key, so that a changed generator never
+    reuses outputs from an older one."""
+    h = hashlib.sha256(GENERATOR_VERSION.encode())
+    here = os.path.dirname(os.path.abspath(__file__))
+    for f in ['wb_intercon_gen2.py', 'verilogwriter.py', 'addressmap.py',
+              'perfbench.py']:
+        with open(os.path.join(here, f), 'rb') as fh:
+            h.update(fh.read())
+    return h.hexdigest()
+
+def file_digest(file):
+    """SHA-256 of the contents of file, or None if it can not be read"""
+    h = hashlib.sha256()
+    try:
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+def write_if_changed(file, emit):
+    """Write the output of emit to file unless file already holds exactly
+    that output.
+
+    emit is called with a function that takes strings, e.g. the emit
+    method of a VerilogWriter. The output is streamed to a temporary file
+    next to file, which only replaces file if their digests differ.
+    Leaving identical files alone keeps their mtimes, so downstream tools
+    do not rebuild needlessly. Returns (written, digest)."""
+    import tempfile
+
+    head, tail = os.path.split(file)
+    fd, tmp = tempfile.mkstemp(prefix='.' + tail + '.', dir=head or '.')
+    try:
+        with os.fdopen(fd, 'w', buffering=VerilogWriter.buffer_size) as f:
+            emit(f.write)
+        digest = file_digest(tmp)
+        if file_digest(file) == digest:
+            os.remove(tmp)
+            return False, digest
+        #mkstemp only gives the owner access
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0o666 & ~umask)
+        os.replace(tmp, file)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return True, digest
+
 class Error(Exception):
   """Base error for wb_intercon_gen"""
 
 class UnknownPropertyError(Error):
   """An unknown property was encounterned while parsing the config file."""
 
-def parse_number(s):
+class ConfigError(Error):
+    """The config file can not be read, lacks required sections or has a
+    value of the wrong type"""
+    pass
+
+class AddressMapError(Error):
+  """A device can not be decoded as described by its offset and size."""
+
+REGISTERED_MODES = {True       : 'both',
+                    False      : None,
+                    'request'  : 'request',
+                    'response' : 'response',
+                    'both'     : 'both'}
+
+def parse_registered(value, section):
+    try:
+        return REGISTERED_MODES[value]
+    except (KeyError, TypeError):
+        raise UnknownPropertyError(
+            "Unknown registered mode '{}' in section '{}'. Valid modes: true, false, request, response, both".format(
+            value, section))
+
+ARBITRATION_POLICIES = ['round_robin', 'fixed_priority', 'weighted']
+
+TOPOLOGIES = ['crossbar', 'shared_bus', 'clustered']
+
+BUSES = ['wishbone', 'axi4']
+
+def parse_bus(value, section):
+    if value not in BUSES:
+        raise UnknownPropertyError(
+            "Unknown bus '{}' in section '{}'. Valid buses: {}".format(
+            value, section, ', '.join(BUSES)))
+    return value
+
+def _timed(phase):
+    """Account the time spent in a WbIntercon method to phase"""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(self, *args, **kwargs):
+            with self.timer.phase(phase):
+                return f(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def parse_number(s, path):
+    """Parse an integer or a decimal or 0x prefixed string
+
+    path is the key path of the value in the config, used in errors"""
     if type(s) == int:
         return s
-    if s.startswith('0x'):
-        return int(s, 16)
-    else:
-        return int(s)
+    try:
+        if s.startswith('0x'):
+            return int(s, 16)
+        else:
+            return int(s)
+    except (AttributeError, ValueError):
+        raise ConfigError("Invalid number '{}' for {}".format(s, path))
+
+def check_mapping(value, path):
+    """Raise ConfigError unless the config value at path is a mapping"""
+    if not isinstance(value, dict):
+        raise ConfigError("{} must be a mapping, not {}".format(
+            path, type(value).__name__))
+    return value
+
+def check_list(value, path):
+    """Raise ConfigError unless the config value at path is a list"""
+    if not isinstance(value, list):
+        raise ConfigError("{} must be a list, not {}".format(
+            path, type(value).__name__))
+    return value
+
+def check_bool(value, path):
+    """Raise ConfigError unless the config value at path is true or false"""
+    if not isinstance(value, bool):
+        raise ConfigError("{} must be true or false, not '{}'".format(
+            path, value))
+    return value
+
+_ordered_loader = None
+
+def load_config(config_file):
+    """Read a config file, keeping the key order of all mappings
+
+    Uses the LibYAML based loader when PyYAML is built with it. The loader
+    class is only created once, and yaml is only imported when a file is
+    actually read."""
+    global _ordered_loader
+    import yaml
+
+    if _ordered_loader is None:
+        class OrderedLoader(getattr(yaml, 'CSafeLoader', yaml.SafeLoader)):
+            pass
+        def construct_mapping(loader, node):
+            loader.flatten_mapping(node)
+            return OrderedDict(loader.construct_pairs(node))
+        OrderedLoader.add_constructor(
+            yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+            construct_mapping)
+        _ordered_loader = OrderedLoader
+    try:
+        with open(config_file) as f:
+            return yaml.load(f, _ordered_loader)
+    except OSError as e:
+        raise ConfigError("Could not read config file '{}': {}".format(config_file, e.strerror))
+    except yaml.YAMLError as e:
+        raise ConfigError("Could not parse config file '{}': {}".format(config_file, e))
 
 class Host:
     def __init__(self, name, d=None):
         self.name = name
         self.datawidth = 32
         self.devices = []
+        self.address_map = None
+        self.registered = None
+        self.clock = None
+        self.bus = 'wishbone'
         if d:
             self.load_dict(d)
 
@@ -48,6 +260,12 @@ class Host:
             if key in ['slaves', 'devices']:
                 # Handled in file loading, ignore here
                 continue
+            elif key == 'registered':
+                self.registered = parse_registered(value, self.name)
+            elif key == 'clock':
+                self.clock = str(value)
+            elif key == 'bus':
+                self.bus = parse_bus(value, self.name)
             else:
                 raise UnknownPropertyError(
                     "Unknown property '%s' in host section '%s'" % (
@@ -61,23 +279,108 @@ class Device:
         self.offset = 0
         self.size = 0
         self.mask = 0
+        self.registered = None
+        self.clock = None
+        self.adr_width = 32
+        self.bus = 'wishbone'
+        self.arbitration = 'round_robin'
+        #Implemented inside the interconnect instead of on a device port
+        self.internal = False
+        self.priority = []
+        self.weights = {}
+        self.lock_burst = True
         if d:
             self.load_dict(d)
 
     def load_dict(self, d):
         for key, value in d.items():
+            path = 'parameters.devices.{}.{}'.format(self.name, key)
             if key == 'datawidth':
-                self.datawidth = parse_number(value)
+                self.datawidth = parse_number(value, path)
+                #wb_upsizer needs a power of two ratio
+                if self.datawidth > 32 and self.datawidth & (self.datawidth - 1):
+                    raise UnknownPropertyError(
+                        "Unsupported datawidth {} in device section '{}'. Devices wider than 32 bits must be a power of two bits wide".format(
+                        self.datawidth, self.name))
             elif key == 'offset':
-                self.offset = parse_number(value)
+                self.offset = parse_number(value, path)
             elif key == 'size':
-                self.size = parse_number(value)
+                self.size = parse_number(value, path)
                 self.mask = ~(self.size-1) & 0xffffffff
+            elif key == 'registered':
+                self.registered = parse_registered(value, self.name)
+            elif key == 'clock':
+                self.clock = str(value)
+            elif key == 'arbitration':
+                self.load_arbitration(value)
+            elif key == 'bus':
+                self.bus = parse_bus(value, self.name)
             else:
                 raise UnknownPropertyError(
                     "Unknown property '%s' in device section '%s'" % (
                     key, self.name))
 
+    def load_arbitration(self, value):
+        if not isinstance(value, dict):
+            value = {'policy' : value}
+        for key, v in value.items():
+            if key == 'policy':
+                if v not in ARBITRATION_POLICIES:
+                    raise UnknownPropertyError(
+                        "Unknown arbitration policy '{}' in device section '{}'. Valid policies: {}".format(
+                        v, self.name, ', '.join(ARBITRATION_POLICIES)))
+                self.arbitration = v
+            elif key == 'priority':
+                path = 'parameters.devices.{}.arbitration.priority'.format(self.name)
+                self.priority = [str(h) for h in check_list(v, path)]
+            elif key == 'weights':
+                path = 'parameters.devices.{}.arbitration.weights'.format(self.name)
+                self.weights = OrderedDict(
+                    (str(h), parse_number(w, '{}.{}'.format(path, h)))
+                    for h, w in check_mapping(v, path).items())
+                for h, w in self.weights.items():
+                    if not 1 <= w <= 255:
+                        raise UnknownPropertyError(
+                            "Weight {} for host '{}' in device section '{}' must be between 1 and 255".format(
+                            w, h, self.name))
+            elif key == 'lock_burst':
+                self.lock_burst = check_bool(
+                    v, 'parameters.devices.{}.arbitration.lock_burst'.format(self.name))
+            else:
+                raise UnknownPropertyError(
+                    "Unknown property '%s' in arbitration section of device '%s'" % (
+                    key, self.name))
+
+    def arbiter_hosts(self):
+        """Hosts in arbiter port order
+
+        The first host ends up in the MSBs of the arbiter ports. For fixed
+        priority arbitration, where master 0 wins, the hosts listed in
+        priority are therefore put last, preceded by the remaining hosts
+        in reverse config order"""
+        if self.arbitration != 'fixed_priority':
+            return self.hosts
+        first = [h for name in self.priority for h in self.hosts if h.name == name]
+        return list(reversed(first + [h for h in self.hosts if h not in first]))
+
+class Bridge(Device):
+    """Internal node that is a device to its hosts and a host to its devices
+
+    Puts several devices behind a single port of the upstream muxes. The
+    bridge decodes the smallest aligned region that covers all of them"""
+    def __init__(self, name, hosts, devices):
+        Device.__init__(self, name)
+        self.hosts = list(hosts)
+        self.devices = list(devices)
+        base = min(d.offset for d in devices)
+        end = max(d.offset + (~d.mask & 0xffffffff) + 1 for d in devices)
+        size = 1
+        while (base & ~(size-1)) + size < end:
+            size <<= 1
+        self.offset = base & ~(size-1)
+        self.size = size
+        self.mask = ~(size-1) & 0xffffffff
+
 class Parameter:
     def __init__(self, name, value):
         self.name  = name
@@ -90,29 +393,44 @@ class Port:
 
 
 class WbIntercon:
-    def __init__(self, name, config_file):
-        self.verilog_writer = VerilogWriter(name)
-        self.template_writer = VerilogWriter(name);
+    def __init__(self, name, config, verbose=False, timer=None):
+        """Build the interconnect from a config
+
+        config is either the path of a config file or a dict with the
+        same contents, which is left unmodified. Errors in the config are
+        raised as Error subclasses. Progress messages and warnings are
+        only printed if verbose is set, and details such as each unmapped
+        address range only if verbose is 2. Warnings are also collected in
+        self.warnings. timer is a PhaseTimer that gets the time spent in
+        each phase of loading and generating."""
+        import json
+
         self.name = name
+        self.verbose = verbose
+        self.timer = timer or NullTimer()
+        self.warnings = []
         d = OrderedDict()
         self.devices = OrderedDict()
         self.hosts = OrderedDict()
-        import yaml
 
-        def ordered_load(stream, Loader=yaml.Loader, object_pairs_hook=OrderedDict):
-            class OrderedLoader(Loader):
-                pass
-            def construct_mapping(loader, node):
-                loader.flatten_mapping(node)
-                return object_pairs_hook(loader.construct_pairs(node))
-            OrderedLoader.add_constructor(
-                yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
-                construct_mapping)
-            return yaml.load(stream, OrderedLoader)
-        data = ordered_load(open(config_file))
-
-        config     = data['parameters']
+        with self.timer.phase('load config'):
+            if isinstance(config, dict):
+                data = copy.deepcopy(config)
+            else:
+                data = load_config(config)
+
+        #Normalized config used for the regeneration cache. Key order is
+        #kept since it decides the order of the generated ports
+        self.config_digest = hashlib.sha256(
+            json.dumps(data, default=str).encode()).hexdigest()
+
+        if not isinstance(data, dict) or 'parameters' not in data or 'vlnv' not in data:
+            raise ConfigError("Config must have vlnv and parameters sections")
+        config     = check_mapping(data['parameters'], 'parameters')
         self.vlnv       = data['vlnv']
+        if not isinstance(self.vlnv, str) or self.vlnv.count(':') != 3:
+            raise ConfigError(
+                "vlnv must be on the form vendor:library:name:version, not '{}'".format(self.vlnv))
 
         valid_endians = ['big', 'little']
         if 'endian' in config:
@@ -122,42 +440,223 @@ class WbIntercon:
         else:
             self.endian = "big"
 
-        print("Wishbone Data Resizer Endian: {}".format(self.endian))
+        self._info("Wishbone Data Resizer Endian: {}".format(self.endian))
 
-        hosts = config.get('masters', {})
-        hosts.update(config.get('hosts', {}))
+        valid_modes = ['classic', 'pipelined']
+        self.mode = config.get('mode', 'classic')
+        if self.mode not in valid_modes:
+            raise UnknownPropertyError("Unknown Wishbone mode '{}' specified. Valid modes: {}".format(self.mode, valid_modes))
+        if self.mode == 'pipelined':
+            self.device_ports = WB_PIPELINED_DEVICE_PORTS
+        else:
+            self.device_ports = WB_DEVICE_PORTS
+
+        valid_decoders = ['one_hot', 'priority']
+        self.decode = config.get('decode', 'one_hot')
+        if self.decode not in valid_decoders:
+            raise UnknownPropertyError("Unknown decoder '{}' specified. Valid decoders: {}".format(self.decode, valid_decoders))
+
+        hosts = check_mapping(config.get('masters', {}), 'parameters.masters')
+        hosts.update(check_mapping(config.get('hosts', {}), 'parameters.hosts'))
         for k, v in hosts.items():
+          #A list is short for a host with only devices
+          if isinstance(v, list):
+            v = hosts[k] = {'devices' : v}
+          check_mapping(v, 'parameters.hosts.' + str(k))
           if not v.get('devices'):
             v['devices'] = []
+          for key in ['devices', 'slaves']:
+            if not isinstance(v.get(key, []), list):
+              raise ConfigError("parameters.hosts.{}.{} must be a list of device names".format(k, key))
           v['devices'] += v.get('slaves', [])
-        devices = config.get('slaves', {})
-        devices.update(config.get('devices', {}))
+        devices = check_mapping(config.get('slaves', {}), 'parameters.slaves')
+        devices.update(check_mapping(config.get('devices', {}), 'parameters.devices'))
+        for k, v in devices.items():
+          check_mapping(v, 'parameters.devices.' + str(k))
         if not hosts:
-          print("Error: No host ports found in config")
-          exit(1)
+          raise ConfigError("No host ports found in config")
         if not devices:
-          print("Error: No device ports found in config")
-          exit(1)
-        for k,v in hosts.items():
-            print("Found host port " + k)
-            self.hosts[k] = Host(k,v)
-            d[k] = v['devices']
-        for k,v in devices.items():
-            print("Found device port " + k)
-            self.devices[k] = Device(k,v)
+          raise ConfigError("No device ports found in config")
+
+        #Optional performance counters, reachable as an extra device
+        perf_counters = config.get('perf_counters')
+        self.perf_counters = None
+        if perf_counters:
+            self.perf_counters = self._add_perf_counters(perf_counters, hosts, devices)
+
+        with self.timer.phase('hosts and devices'):
+            for k,v in hosts.items():
+                self._info("Found host port " + k)
+                self.hosts[k] = Host(k,v)
+                d[k] = v['devices']
+            for k,v in devices.items():
+                self._info("Found device port " + k)
+                self.devices[k] = Device(k,v)
+        if self.perf_counters:
+            self.devices[self.perf_counters].internal = True
 
         #Create host/device connections
-        for host, devices in d.items():
-            for device in devices:
-              try:
-                self.hosts[host].devices += [self.devices[device]]
-              except KeyError:
-                print(f"Error: Could not find device instance {device}")
-                exit(1)
-              self.devices[device].hosts += [self.hosts[host]]
+        with self.timer.phase('connections'):
+            for host, devices in d.items():
+                for device in devices:
+                  try:
+                    self.hosts[host].devices += [self.devices[device]]
+                  except KeyError:
+                    raise Error(f"Could not find device instance {device}")
+                  self.devices[device].hosts += [self.hosts[host]]
+
+        #Index and validate the address map seen by each host
+        with self.timer.phase('address maps'):
+            for host in self.hosts.values():
+                host.address_map = AddressMap.from_devices(host.devices)
+                if host.address_map.errors:
+                    raise AddressMapError(
+                        "Invalid address map for host '{}'\n  {}".format(
+                            host.name, '\n  '.join(host.address_map.errors)))
+                for a, b in host.address_map.overlaps():
+                    self._warn("Devices '{}' and '{}' overlap in the address map of host '{}'. '{}' has priority".format(
+                        a.name, b.name, host.name, a.name))
+                #Unmapped ranges between the devices of the host
+                regions = host.address_map.regions
+                if regions:
+                    holes = host.address_map.holes(
+                        regions[0].base, max(r.end for r in regions))
+                    if holes:
+                        self._info("Host '{}' has {} unmapped range(s) of 0x{:x} bytes in total between its devices".format(
+                            host.name, len(holes), sum(end - base for base, end in holes)))
+                    for base, end in holes:
+                        self._detail("Host '{}' has no device at 0x{:08x}-0x{:08x}".format(
+                            host.name, base, end - 1))
+
+        #Arbitration settings can only refer to hosts using the device
+        for device in self.devices.values():
+            names = [h.name for h in device.hosts]
+            for h in device.priority + list(device.weights):
+                if h not in names:
+                    raise Error("Arbitration settings of device '{}' refer to host '{}', which is not connected to it".format(device.name, h))
+
+        #The AXI4 bridges have a 32-bit classic Wishbone side
+        for x in list(self.hosts.values()) + list(self.devices.values()):
+            if x.bus != 'axi4':
+                continue
+            if self.mode == 'pipelined':
+                raise Error("'{}' is an AXI4 port. AXI4 bridges are not supported in pipelined mode".format(x.name))
+            if x.datawidth != 32:
+                raise Error("'{}' is an AXI4 port. AXI4 ports must be 32 bits wide".format(x.name))
+
+        if self.mode == 'pipelined':
+            for x in self.devices.values():
+                if x.arbitration != 'round_robin':
+                    raise Error("'{}' uses {} arbitration. Only round_robin is supported in pipelined mode".format(x.name, x.arbitration))
+            for x in list(self.hosts.values()) + list(self.devices.values()):
+                if x.registered:
+                    raise Error("'{}' is registered. Register slices are not supported in pipelined mode".format(x.name))
+                if x.datawidth > 32:
+                    raise Error("'{}' is wider than 32 bits. wb_upsizer is not supported in pipelined mode".format(x.name))
+                if x.clock:
+                    raise Error("'{}' has its own clock. wb_cdc is not supported in pipelined mode".format(x.name))
+
+        #Optional fallback device that terminates unmapped accesses
+        error_device = config.get('error_device', False)
+        if error_device is True:
+            error_device = {}
+        if error_device is False:
+            self.error_device = None
+        elif isinstance(error_device, dict):
+            self.error_device = {'latency' : 1, 'capture' : False}
+            for key, value in error_device.items():
+                if key == 'latency':
+                    self.error_device['latency'] = max(
+                        parse_number(value, 'parameters.error_device.latency'), 1)
+                elif key == 'capture':
+                    self.error_device['capture'] = bool(value)
+                else:
+                    raise UnknownPropertyError(
+                        "Unknown property '%s' in error_device section" % key)
+        else:
+            raise ConfigError(
+                "parameters.error_device must be true, false or a mapping with latency and capture, not '{}'".format(error_device))
+
+        #Replace parts of the crossbar with bridges
+        self.bridges = OrderedDict()
+        topology = config.get('topology', 'crossbar')
+        if not isinstance(topology, dict):
+            topology = {'type' : topology}
+        self.topology = 'crossbar'
+        max_device_size = 0x10000
+        min_devices = 2
+        bus_arbitration = None
+        for key, value in topology.items():
+            if key == 'type':
+                if value not in TOPOLOGIES:
+                    raise UnknownPropertyError(
+                        "Unknown topology '{}'. Valid topologies: {}".format(
+                        value, ', '.join(TOPOLOGIES)))
+                self.topology = value
+            elif key == 'max_device_size':
+                max_device_size = parse_number(value, 'parameters.topology.max_device_size')
+            elif key == 'min_devices':
+                min_devices = max(parse_number(value, 'parameters.topology.min_devices'), 1)
+            elif key == 'arbitration':
+                bus_arbitration = value
+            else:
+                raise UnknownPropertyError(
+                    "Unknown property '%s' in topology section" % key)
+        with self.timer.phase('topology'):
+            self._crossbar_size = self._interconnect_size()
+            if self.topology == 'shared_bus':
+                self._build_shared_bus(bus_arbitration)
+            elif self.topology == 'clustered':
+                self._build_clusters(max_device_size, min_devices)
+
+        #Only route the address bits each device decodes internally
+        self.trim_address = bool(config.get('trim_address', False))
+        if self.trim_address:
+            for device in self.devices.values():
+                #AXI4 devices always get the full address
+                if device.mask and device.bus == 'wishbone':
+                    n = (~device.mask & 0xffffffff).bit_length()
+                    device.adr_width = max(n, 3)
+
+        #Extra clock domains, in order of appearance
+        self.clocks = []
+        for x in list(self.hosts.values()) + list(self.devices.values()):
+            if x.clock and x.clock not in self.clocks:
+                self.clocks.append(x.clock)
 
         self.output_file = config.get('output_file', 'wb_intercon.v')
 
+        #Optional performance testbench next to the template
+        perf_bench = config.get('perf_bench', False)
+        if perf_bench is True:
+            perf_bench = {}
+        if perf_bench is False:
+            self.perf_bench = None
+        elif isinstance(perf_bench, dict):
+            try:
+                self.perf_bench = PerfBenchSettings(perf_bench)
+            except ValueError as e:
+                raise ConfigError(str(e))
+        else:
+            raise ConfigError(
+                "parameters.perf_bench must be true, false or a mapping with testbench settings, not '{}'".format(perf_bench))
+        if self.perf_bench:
+            for x in list(self.hosts.values()) + list(self.devices.values()):
+                if x.bus != 'wishbone':
+                    raise Error("'{}' is an AXI4 port. perf_bench only drives Wishbone ports".format(x.name))
+
+    def _info(self, msg):
+        if self.verbose:
+            print(msg)
+
+    def _detail(self, msg):
+        if self.verbose == 2:
+            print(msg)
+
+    def _warn(self, msg):
+        self.warnings.append(msg)
+        self._info("Warning: " + msg)
+
     def _dump(self):
         print("*Hosts*")
         for host in self.hosts.values():
@@ -172,89 +671,639 @@ class WbIntercon:
                 print(' ' + host.name)
 
 
+    def _add_perf_counters(self, settings, hosts, devices):
+        """Add the counter CSR device to the host and device sections
+
+        The device gets a 0x20 byte block for the control registers and
+        one for each host to device connection, rounded up to a power of
+        two. Returns the device name."""
+        name = 'perf_counters'
+        offset = None
+        csr_hosts = list(hosts)
+        for key, value in check_mapping(settings, 'parameters.perf_counters').items():
+            if key == 'name':
+                name = str(value)
+            elif key == 'offset':
+                offset = parse_number(value, 'parameters.perf_counters.offset')
+            elif key == 'hosts':
+                csr_hosts = [str(h) for h in check_list(
+                    value, 'parameters.perf_counters.hosts')]
+            else:
+                raise UnknownPropertyError(
+                    "Unknown property '%s' in perf_counters section" % key)
+        if offset is None:
+            raise Error("perf_counters needs an offset")
+        if name in devices:
+            raise Error("perf_counters device name '{}' is already in use".format(name))
+        for h in csr_hosts:
+            if h not in hosts:
+                raise Error("perf_counters refers to unknown host '{}'".format(h))
+
+        #Topologies only ever merge connections, so this is an upper bound
+        edges = sum(len(v['devices']) for v in hosts.values())
+        size = 0x40
+        while size < 0x20 * (edges + 1):
+            size <<= 1
+        devices[name] = {'offset' : offset, 'size' : size}
+        for h in csr_hosts:
+            hosts[h]['devices'].append(name)
+        return name
+
+    def _perf_edges(self):
+        """Host to device connections monitored by the performance counters
+
+        Returns (host, device, signal template, wait signal) tuples, where
+        device is the node connected to the host mux. The template names
+        the signals on that connection like _device_input."""
+        edges = []
+        for host in self.hosts.values():
+            for device in host.devices:
+                if device.name == self.perf_counters:
+                    continue
+                if len(device.hosts) > 1:
+                    template = 'wb_' + host.name + '_' + device.name + '_{0}'
+                    idx = device.arbiter_hosts()[::-1].index(host)
+                    wait = '!wb_{}_grant[{}]'.format(device.name, idx)
+                else:
+                    template = self._device_input(device)
+                    wait = "1'b0"
+                edges.append((host, device, template, wait))
+        return edges
+
+    @_timed('gen_perf_counters')
+    def _gen_perf_counters(self):
+        device = self.devices[self.perf_counters]
+        edges = self._perf_edges()
+        #The counters only decode the offset within their own region
+        aw = (device.size - 1).bit_length()
+        parameters = [Parameter('num_edges', len(edges)),
+                      Parameter('aw', aw)]
+        ports = [Port('wb_clk_i', 'wb_clk_i'),
+                 Port('wb_rst_i', 'wb_rst_i')]
+        #Edge 0 in the LSB
+        for sig, direction in [('cyc', 'o'), ('stb', 'o'), ('ack', 'i'),
+                               ('err', 'i'), ('rty', 'i')]:
+            ports.append(Port('edge_' + sig + '_i',
+                              [e[2].format(sig, direction) for e in reversed(edges)]))
+        ports.append(Port('edge_wait_i', [e[3] for e in reversed(edges)]))
+
+        device_format = 'wb_' + device.name + '_{0}'
+        for p in WB_HOST_PORTS:
+            signal = device_format.format(p.name)
+            if p.name == 'adr':
+                signal += '[{}:0]'.format(aw - 1)
+            ports.append(Port('wbs_' + p.name + '_i', signal))
+        for p in self.device_ports:
+            _name = 'dat' if p.name == 'rdt' else p.name
+            ports.append(Port('wbs_' + _name + '_o', device_format.format(p.name)))
+        self.verilog_writer.add(Instance('wb_perf_counters', 'wb_perf_counters0', parameters, ports))
+        for p in WB_HOST_PORTS + self.device_ports:
+            self.verilog_writer.add_wire(device_format.format(p.name), self._device_width(p, device))
+        return edges
+
+    def _perf_counter_maps(self, edges):
+        """C header and Python register map of the performance counters"""
+        device = self.devices[self.perf_counters]
+        counters = [('transactions', 0x0), ('busy', 0x4), ('wait', 0x8),
+                    ('err', 0xc), ('rty', 0x10)]
+        prefix = (self.name + '_perf').upper()
+        guard = prefix + '_H'
+        h = ["/* THIS FILE IS AUTOGENERATED BY wb_intercon_gen */",
+             "/* ANY MANUAL CHANGES WILL BE LOST */",
+             "#ifndef " + guard,
+             "#define " + guard,
+             "",
+             "#define {}_BASE 0x{:08x}".format(prefix, device.offset),
+             "#define {}_CTRL 0x00".format(prefix),
+             "#define {}_CTRL_CLEAR 0x1".format(prefix),
+             "#define {}_CTRL_ENABLE 0x2".format(prefix),
+             "#define {}_NUM_EDGES 0x04".format(prefix),
+             "#define {}_EDGE_STRIDE 0x20".format(prefix)]
+        for counter, offset in counters:
+            h.append("#define {}_{} 0x{:02x}".format(prefix, counter.upper(), offset))
+        h.append("")
+        py = ["# THIS FILE IS AUTOGENERATED BY wb_intercon_gen",
+              "# ANY MANUAL CHANGES WILL BE LOST",
+              "BASE = 0x{:08x}".format(device.offset),
+              "CTRL = 0x00",
+              "CTRL_CLEAR = 0x1",
+              "CTRL_ENABLE = 0x2",
+              "NUM_EDGES = 0x04",
+              "EDGE_STRIDE = 0x20",
+              "COUNTERS = {" + ", ".join("'{}' : 0x{:02x}".format(c, o) for c, o in counters) + "}",
+              "",
+              "#(host, device, offset of the edge block)",
+              "EDGES = ["]
+        for i, (host, dev, _, _) in enumerate(edges):
+            offset = 0x20 * (i + 1)
+            h.append("/* {} -> {} */".format(host.name, dev.name))
+            h.append("#define {}_{}_{} 0x{:04x}".format(
+                prefix, host.name.upper(), dev.name.upper(), offset))
+            py.append("    ('{}', '{}', 0x{:04x}),".format(host.name, dev.name, offset))
+        h += ["", "#endif"]
+        py += ["]",
+               "",
+               "def address(host, device, counter):",
+               "    \"\"\"Bus address of a counter of the host to device edge\"\"\"",
+               "    for h, d, offset in EDGES:",
+               "        if (h, d) == (host, device):",
+               "            return BASE + offset + COUNTERS[counter]",
+               "    raise KeyError((host, device))"]
+        return '\n'.join(h) + '\n', '\n'.join(py) + '\n'
+
+    def _bridge_name(self, base):
+        i = 0
+        while base + str(i) in self.hosts or base + str(i) in self.devices or base + str(i) in self.bridges:
+            i += 1
+        return base + str(i)
+
+    def _add_bridge(self, name, hosts, devices):
+        """Move devices behind a new bridge, at the mux port of the first one"""
+        bridge = Bridge(name, hosts, devices)
+        for host in hosts:
+            pos = min([host.devices.index(d) for d in devices if d in host.devices] or [0])
+            host.devices = [d for d in host.devices if d not in devices]
+            host.devices.insert(pos, bridge)
+        for device in devices:
+            device.hosts = [bridge]
+        self.bridges[name] = bridge
+        return bridge
+
+    def _build_shared_bus(self, arbitration):
+        """Connect all hosts to all devices through a single arbiter and mux"""
+        devices = [d for d in self.devices.values() if d.hosts]
+        for device in devices:
+            if len(device.hosts) > 1 and (device.arbitration != 'round_robin' or device.weights or device.priority):
+                self._warn("Arbitration settings of device '{}' are ignored on a shared bus".format(device.name))
+        address_map = AddressMap.from_devices(devices)
+        for a, b in address_map.overlaps():
+            raise AddressMapError(
+                "Devices '{}' and '{}' overlap and can not be connected to a shared bus".format(a.name, b.name))
+        bridge = self._add_bridge(self._bridge_name('bus'), list(self.hosts.values()), devices)
+        if arbitration:
+            bridge.load_arbitration(arbitration)
+            for h in bridge.priority + list(bridge.weights):
+                if h not in self.hosts:
+                    raise Error("Arbitration settings of the shared bus refer to unknown host '{}'".format(h))
+
+    def _build_clusters(self, max_device_size, min_devices):
+        """Put groups of small devices shared by the same hosts behind bridges
+
+        Devices of at most max_device_size bytes, that are used by more
+        than one host, are grouped by the set of hosts using them. Each
+        group is split into clusters whose bridge region does not cover
+        any other device of those hosts, and clusters of at least
+        min_devices devices get a bridge. Devices that overlap other devices or have
+        their own arbitration settings keep their direct connections, so
+        that the result decodes exactly like the crossbar."""
+        overlapping = set()
+        for host in self.hosts.values():
+            for a, b in host.address_map.overlaps():
+                overlapping.update([a.name, b.name])
+
+        groups = OrderedDict()
+        for device in self.devices.values():
+            if (len(device.hosts) < 2 or device.name in overlapping or
+                (~device.mask & 0xffffffff) + 1 > max_device_size or
+                device.arbitration != 'round_robin'):
+                continue
+            groups.setdefault(tuple(h.name for h in device.hosts), []).append(device)
+
+        for group in groups.values():
+            hosts = group[0].hosts
+            for cluster in self._split_cluster(hosts, group):
+                if len(cluster) >= min_devices:
+                    self._add_bridge(self._bridge_name('cluster'), hosts, cluster)
+
+    def _split_cluster(self, hosts, devices):
+        """Split devices into lists that a bridge can decode on its own
+
+        If the bridge region covers other devices of the hosts, the region
+        is halved until it doesn't. Devices are aligned and never cross
+        the middle of a larger aligned region."""
+        bridge = Bridge('', hosts, devices)
+        names = [d.name for d in devices]
+        for host in hosts:
+            for r in host.address_map.overlapping(bridge.offset, bridge.offset + bridge.size):
+                if r.name not in names:
+                    mid = bridge.offset + bridge.size // 2
+                    return (self._split_cluster(hosts, [d for d in devices if d.offset < mid]) +
+                            self._split_cluster(hosts, [d for d in devices if d.offset >= mid]))
+        return [devices]
+
+    def _interconnect_size(self):
+        """Number of muxes, mux device ports and arbiters in the current graph"""
+        nodes = list(self.hosts.values()) + list(self.bridges.values())
+        muxes = len(nodes)
+        ports = sum(len(n.devices) for n in nodes)
+        arbiters = sum(len(d.hosts) > 1 for d in list(self.devices.values()) + list(self.bridges.values()))
+        return muxes, ports, arbiters
+
+    def _topology_report(self):
+        """Print the size of the generated interconnect
+
+        Nothing is printed for the default crossbar, which is what was
+        asked for."""
+        if self.topology == 'crossbar':
+            return
+        muxes, ports, arbiters = self._interconnect_size()
+        self._info("Topology {}: {} muxes with {} device ports and {} arbiters".format(
+            self.topology, muxes, ports, arbiters))
+        self._info("A full crossbar would use {} muxes with {} device ports and {} arbiters".format(
+            *self._crossbar_size))
+        for bridge in self.bridges.values():
+            self._info("Bridge '{}' at 0x{:08x}-0x{:08x}: {}".format(
+                bridge.name, bridge.offset, bridge.offset + bridge.size - 1,
+                ', '.join(d.name for d in bridge.devices)))
+
+    def resolve(self, host, addresses, on_unmatched=None, batch_size=1<<22):
+        """Find the device selected by each address in a trace
+
+        host is a host name and addresses any array-like of bus addresses,
+        e.g. a numpy.memmap of a trace file. Returns a numpy array with the
+        index of the selected device in the host's address map, using the
+        same priority rule as wb_mux. Addresses that match no device,
+        and would stall the bus, get index -1.
+
+        The address map covers the devices as listed in the config and is
+        not changed when a clustered or shared_bus topology puts bridges
+        in the host's device list. Index i is the device named
+        self.hosts[host].address_map.names[i].
+
+        The trace is processed in batches of batch_size addresses. If
+        on_unmatched is given, it is called once for each batch with
+        unmatched addresses, with the trace positions and the addresses
+        themselves as numpy arrays."""
+        import numpy as np
+
+        try:
+            address_map = self.hosts[host].address_map
+        except KeyError:
+            raise Error("Could not find host '{}'".format(host))
+        starts, indexes = address_map.segments()
+        starts  = np.array(starts, dtype=np.uint64)
+        indexes = np.array(indexes, dtype=np.int32)
+        full = np.uint64((1 << address_map.aw) - 1)
+
+        addresses = np.asarray(addresses)
+        result = np.empty(len(addresses), dtype=np.int32)
+        for pos in range(0, len(addresses), batch_size):
+            batch = addresses[pos:pos+batch_size].astype(np.uint64) & full
+            sel = indexes[np.searchsorted(starts, batch, side='right') - 1]
+            result[pos:pos+batch_size] = sel
+            if on_unmatched:
+                unmatched = np.flatnonzero(sel < 0)
+                if len(unmatched):
+                    on_unmatched(unmatched + pos, batch[unmatched])
+        return result
+
+    def _mux_decode(self, host):
+        """Disjoint match terms for a one-hot wb_mux, or None to keep the
+        priority decoder
+
+        Maps with overlapping regions are only decoded one-hot if they
+        need at most twice as many terms as there are devices. With
+        decode set to priority, all muxes keep the priority decoder."""
+        if self.mode == 'pipelined' or self.decode == 'priority':
+            return None
+        address_map = AddressMap.from_devices(host.devices)
+        return address_map.decode(max_terms=2 * len(host.devices))
+
+    @_timed('gen_mux')
     def _gen_mux(self, host):
-        parameters = [Parameter('num_devices', len(host.devices))]
-        match_addr = '{' + ', '.join(["32'h{addr:08x}".format(addr=s.offset) for s in host.devices]) + '}'
+        offsets = [s.offset for s in host.devices]
+        masks   = [s.mask for s in host.devices]
+        #The error device matches everything. It goes on the highest mux
+        #port, which has the lowest priority
+        if self.error_device:
+            offsets.insert(0, 0)
+            masks.insert(0, 0)
+        parameters = [Parameter('num_devices', len(offsets))]
+        decode = self._mux_decode(host)
+        if decode:
+            #Device i is on mux port n-1-i. The terms of the first device
+            #go in the MSBs, as with one term per device
+            n = len(host.devices)
+            terms = decode.terms
+            offsets = [a for _, a, _ in terms]
+            masks = [m for _, _, m in terms]
+            parameters += [Parameter('one_hot', 1),
+                           Parameter('num_terms', len(terms))]
+        match_addr = '{' + ', '.join(["32'h{addr:08x}".format(addr=a) for a in offsets]) + '}'
         parameters += [Parameter('MATCH_ADDR', match_addr)]
 
-        match_mask = '{' + ', '.join(["32'h{mask:08x}".format(mask=s.mask) for s in host.devices]) + '}'
+        match_mask = '{' + ', '.join(["32'h{mask:08x}".format(mask=a) for a in masks]) + '}'
         parameters += [Parameter('MATCH_MASK', match_mask)]
+        if decode:
+            match_device = '{' + ', '.join(["32'd{}".format(n-1-i) for i, _, _ in terms]) + '}'
+            parameters += [Parameter('MATCH_DEVICE', match_device),
+                           Parameter('COMMON_ADDR', "32'h{:08x}".format(decode.common_addr)),
+                           Parameter('COMMON_MASK', "32'h{:08x}".format(decode.common_mask))]
+            if self.error_device:
+                parameters += [Parameter('default_device', n)]
         ports = [Port('wb_clk_i', 'wb_clk_i'),
                  Port('wb_rst_i', 'wb_rst_i')]
         m = host.name
 
-        input_format = 'wb_%s_%s_i'
-        output_format = 'wb_%s_%s_o'
+        #With a register slice or clock domain crossing in front of the mux,
+        #connect to that instead
+        if isinstance(host, Bridge):
+            input_format = 'wb_%s_%s'
+            output_format = 'wb_%s_%s'
+        elif host.registered:
+            input_format = 'wb_hreg_%s_%s'
+            output_format = 'wb_hreg_%s_%s'
+        elif host.clock:
+            input_format = 'wb_hcdc_%s_%s'
+            output_format = 'wb_hcdc_%s_%s'
+        #AXI4 hosts are connected through a wb_axi_slave
+        elif host.bus == 'axi4':
+            input_format = 'wb_%s_%s'
+            output_format = 'wb_%s_%s'
+        else:
+            input_format = 'wb_%s_%s_i'
+            output_format = 'wb_%s_%s_o'
 
         #Create mux host side connections
         for p in WB_HOST_PORTS:
             ports += [Port('wbm_' + p.name + '_i', input_format % (m, p.name))]
-        for p in WB_DEVICE_PORTS:
+        for p in self.device_ports:
             _name = 'dat' if p.name == 'rdt' else p.name
             ports += [Port('wbm_' + _name + '_o', output_format % (m, p.name))]
 
         #Create mux device side connections
         name_list = []
+        adr_list = []
         for s in host.devices:
 
             #If we have only one host the wb_mux is the last piece before
-            #the device. If the device's datawidth is 32, we go straight from
-            #the wb_mux to the device.
-            if len(s.hosts) == 1 and int(s.datawidth) == 32:
-                name_list += ['wb_' + s.name + '_{0}_{1}']
-            #If not, we'll need a wb_data_resize and then new wires.
-            elif len(s.hosts) == 1 and int(s.datawidth) < 32:
-                 name_list += ['wb_' + 'resize_' + s.name + '_{0}']
+            #the device, or before the register slice and wb_data_resize
+            #that are in front of it.
+            if len(s.hosts) == 1:
+                name_list += [self._device_input(s)]
             #If there is more than on host for that device, there will
             #be an arbiter and the wb_data_resize will be after that.
             else:
                 name_list += ['wb_'+ m + '_' + s.name + '_{0}']
 
+            #The mux drives a full address to every device. Leave the bits
+            #above a trimmed address unconnected
+            adr = name_list[-1].format('adr', 'o')
+            if s.adr_width < 32:
+                trim = 'wb_trim_{0}_{1}'.format(m, s.name)
+                self.verilog_writer.add_wire(trim, 32 - s.adr_width)
+                adr = '{' + trim + ', ' + adr + '}'
+            adr_list.append(adr)
+
+        if self.error_device:
+            name_list.insert(0, 'wb_err_' + m + '_{0}')
+            adr_list.insert(0, 'wb_err_' + m + '_adr')
+
         for p in WB_HOST_PORTS:
-            ports += [Port('wbs_'+p.name+'_o', '{' + ', '.join(name_list).format(p.name, 'o')+'}')]
-        for p in WB_DEVICE_PORTS:
+            if p.name == 'adr':
+                ports += [Port('wbs_adr_o', adr_list)]
+                continue
+            ports += [Port('wbs_'+p.name+'_o', [n.format(p.name, 'o') for n in name_list])]
+        for p in self.device_ports:
             _name = 'dat' if p.name == 'rdt' else p.name
-            ports += [Port('wbs_'+_name+'_i', '{' + ', '.join(name_list).format(p.name, 'i')+'}')]
+            ports += [Port('wbs_'+_name+'_i', [n.format(p.name, 'i') for n in name_list])]
 
-        self.verilog_writer.add(Instance('wb_mux', 'wb_mux_'+m,parameters, ports))
+        module = 'wb_mux_pipelined' if self.mode == 'pipelined' else 'wb_mux'
+        self.verilog_writer.add(Instance(module, 'wb_mux_'+m,parameters, ports))
 
+    @_timed('gen_error_device')
+    def _gen_error_device(self, host):
+        m = host.name
+        parameters = [Parameter('latency', self.error_device['latency'])]
+        ports = [Port('wb_clk_i', 'wb_clk_i'),
+                 Port('wb_rst_i', 'wb_rst_i')]
+        for p in WB_HOST_PORTS:
+            ports.append(Port('wbs_' + p.name + '_i', 'wb_err_' + m + '_' + p.name))
+        for p in self.device_ports:
+            _name = 'dat' if p.name == 'rdt' else p.name
+            ports.append(Port('wbs_' + _name + '_o', 'wb_err_' + m + '_' + p.name))
+
+        #Make the faulting address available for diagnostics
+        if self.error_device['capture']:
+            for name, width in [('fault_adr', 32), ('fault', 0)]:
+                portname = 'wb_{}_{}_o'.format(m, name)
+                wirename = 'wb_{}_{}'.format(m, name)
+                ports.append(Port(name + '_o', portname))
+                self.verilog_writer.add_port(portname, 'output', width, wirename, width)
+
+        self.verilog_writer.add(Instance('wb_error_device', 'wb_error_device_' + m, parameters, ports))
+
+        for p in WB_HOST_PORTS + self.device_ports:
+            self.verilog_writer.add_wire('wb_err_{0}_{1}'.format(m, p.name), p.width)
+
+    @_timed('gen_arbiter')
     def _gen_arbiter(self, device):
-        parameters = [Parameter('num_masters', len(device.hosts))]
+        hosts = device.arbiter_hosts()
+        parameters = [Parameter('num_masters', len(hosts))]
+        if device.adr_width < 32:
+            parameters += [Parameter('aw', device.adr_width)]
+        if device.arbitration != 'round_robin':
+            parameters += [
+                Parameter('fixed_priority', int(device.arbitration == 'fixed_priority')),
+                Parameter('lock_burst', int(device.lock_burst))]
+        if device.arbitration == 'weighted':
+            #Same order as the port concatenations, i.e. master 0 in the LSBs
+            weights = [device.weights.get(h.name, 1) for h in hosts]
+            parameters += [Parameter('WEIGHTS', '{' + ', '.join(["8'd{}".format(w) for w in weights]) + '}')]
         ports = [Port('wb_clk_i', 'wb_clk_i'),
                  Port('wb_rst_i', 'wb_rst_i')]
         s = device.name
 
         name_list = []
-        for m in device.hosts:
+        for m in hosts:
             name_list += ['wb_'+ m.name + '_' + s + '_{0}']
         for p in WB_HOST_PORTS:
-            ports += [Port('wbm_'+p.name+'_i', '{' + ', '.join(name_list).format(p.name, 'i')+'}')]
+            ports += [Port('wbm_'+p.name+'_i', [n.format(p.name, 'i') for n in name_list])]
+        for p in self.device_ports:
+            _name = 'dat' if p.name == 'rdt' else p.name
+            ports += [Port('wbm_'+_name+'_o', [n.format(p.name, 'o') for n in name_list])]
+
+        #Let the performance counters see which host has the device. The
+        #counters do not monitor the connections to themselves
+        if self.perf_counters and s != self.perf_counters:
+            ports += [Port('wbm_grant_o', 'wb_' + s + '_grant')]
+            self.verilog_writer.add_wire('wb_' + s + '_grant', len(hosts))
+
+        #Create device connections
+        device_format = self._device_input(device)
+        for p in WB_HOST_PORTS:
+            ports += [Port('wbs_' + p.name + '_o', device_format.format(p.name, 'o'))]
+        for p in self.device_ports:
+            _name = 'dat' if p.name == 'rdt' else p.name
+            ports += [Port('wbs_' + _name + '_i', device_format.format(p.name, 'i'))]
+
+        if self.mode == 'pipelined':
+            module = 'wb_arbiter_pipelined'
+        elif device.arbitration != 'round_robin':
+            module = 'wb_arbiter_qos'
+        else:
+            module = 'wb_arbiter'
+        self.verilog_writer.add(Instance(module, 'wb_arbiter_'+s,parameters, ports))
+
+    def _host_port(self, host):
+        """Name template for the Wishbone signals of a host
+
+        These are the host port itself, or the Wishbone side of the bus
+        converter of an AXI4 host"""
+        if host.bus == 'axi4':
+            return 'wb_' + host.name + '_{0}'
+        return 'wb_' + host.name + '_{0}_{1}'
+
+    def _device_input(self, device):
+        """Name template for the connection from the mux or arbiter to device
+
+        Depending on the device, this is either a clock domain crossing, a
+        register slice, a width converter or the device port itself. {0} is
+        replaced by the signal name and {1} by the port direction."""
+        #Bridges connect to the mux of the devices behind them
+        if isinstance(device, Bridge):
+            return 'wb_' + device.name + '_{0}'
+        #Devices in another clock domain have a wb_cdc first
+        elif device.clock:
+            return 'wb_dcdc_' + device.name + '_{0}'
+        else:
+            return self._device_domain_input(device)
+
+    def _device_domain_input(self, device):
+        """Name template for the first stage in the device's clock domain"""
+        #If the device is registered, there is a wb_reg_slice first
+        if device.registered:
+            return 'wb_dreg_' + device.name + '_{0}'
+        else:
+            return self._device_adapter(device)
+
+    def _device_adapter(self, device):
+        """Name template for the 32-bit side of the device's width converter"""
+        #Internal devices and the bus converters of AXI4 devices are
+        #connected to wires
+        if device.internal or device.bus == 'axi4':
+            return 'wb_' + device.name + '_{0}'
+        #Narrow devices are connected through a wb_data_resize
+        elif int(device.datawidth) < 32:
+            return 'wb_resize_' + device.name + '_{0}'
+        #Wide devices are connected through a wb_upsizer
+        elif int(device.datawidth) > 32:
+            return 'wb_upsize_' + device.name + '_{0}'
+        else:
+            return 'wb_' + device.name + '_{0}_{1}'
+
+    def _device_width(self, p, device):
+        """Width of signal p on the connections to device"""
+        return device.adr_width if p.name == 'adr' else p.width
+
+    def _clock_ports(self, clock):
+        """Clock and reset signals of a clock domain. None is the main domain"""
+        if clock:
+            return ('wb_{}_clk_i'.format(clock), 'wb_{}_rst_i'.format(clock))
+        return ('wb_clk_i', 'wb_rst_i')
+
+    @_timed('gen_reg_slice')
+    def _gen_reg_slice(self, name, registered, host_format, device_format, clock=None, aw=32):
+        parameters = [Parameter('register_request',
+                                int(registered in ['request', 'both'])),
+                      Parameter('register_response',
+                                int(registered in ['response', 'both']))]
+        if aw < 32:
+            parameters += [Parameter('aw', aw)]
+        clk, rst = self._clock_ports(clock)
+        ports = [Port('wb_clk_i', clk),
+                 Port('wb_rst_i', rst)]
+
+        #Create host connections
+        for p in WB_HOST_PORTS:
+            ports.append(Port('wbm_' + p.name + '_i', host_format.format(p.name, 'i')))
         for p in WB_DEVICE_PORTS:
             _name = 'dat' if p.name == 'rdt' else p.name
-            ports += [Port('wbm_'+_name+'_o', '{' + ', '.join(name_list).format(p.name, 'o')+'}')]
+            ports.append(Port('wbm_' + _name + '_o', host_format.format(p.name, 'o')))
 
         #Create device connections
-        #If the device's data width is 32, we don't need a wb_data_resize
-        if int(device.datawidth) == 32:
-            input_format = 'wb_%s_%s_i'
-            output_format = 'wb_%s_%s_o'
-            for p in WB_HOST_PORTS:
-                ports += [Port('wbs_' + p.name + '_o', output_format % (s, p.name))]
-            for p in WB_DEVICE_PORTS:
-                _name = 'dat' if p.name == 'rdt' else p.name
-                ports += [Port('wbs_' + _name + '_i', input_format % (s, p.name))]
-        #Else, connect to the resizer
+        for p in WB_HOST_PORTS:
+            ports.append(Port('wbs_' + p.name + '_o', device_format.format(p.name, 'o')))
+        for p in WB_DEVICE_PORTS:
+            _name = 'dat' if p.name == 'rdt' else p.name
+            ports.append(Port('wbs_' + _name + '_i', device_format.format(p.name, 'i')))
+
+        self.verilog_writer.add(Instance('wb_reg_slice', name, parameters, ports))
+
+    def _gen_host_reg_slice(self, host):
+        m = host.name
+        if host.clock:
+            host_format = 'wb_hcdc_' + m + '_{0}'
         else:
-            for p in WB_HOST_PORTS:
-                ports += [Port('wbs_' + p.name + '_o', 'wb_resize_'+s+'_'+p.name)]
-            for p in WB_DEVICE_PORTS:
-                _name = 'dat' if p.name == 'rdt' else p.name
-                ports += [Port('wbs_' + _name + '_i', 'wb_resize_'+s+'_'+p.name)]
+            host_format = self._host_port(host)
+        self._gen_reg_slice('wb_reg_slice_host_' + m, host.registered,
+                            host_format, 'wb_hreg_' + m + '_{0}')
+        for p in WB_HOST_PORTS + WB_DEVICE_PORTS:
+            self.verilog_writer.add_wire('wb_hreg_{0}_{1}'.format(m, p.name), p.width)
+
+    def _gen_device_reg_slice(self, device):
+        s = device.name
+        self._gen_reg_slice('wb_reg_slice_device_' + s, device.registered,
+                            'wb_dreg_' + s + '_{0}', self._device_adapter(device),
+                            device.clock, device.adr_width)
+        for p in WB_HOST_PORTS + WB_DEVICE_PORTS:
+            self.verilog_writer.add_wire('wb_dreg_{0}_{1}'.format(s, p.name),
+                                         self._device_width(p, device))
 
-        self.verilog_writer.add(Instance('wb_arbiter', 'wb_arbiter_'+s,parameters, ports))
+    @_timed('gen_cdc')
+    def _gen_cdc(self, name, host_clock, device_clock, host_format, device_format, aw=32):
+        """Connect host_format to device_format through a wb_cdc
 
+        wb_cdc only transfers single classic accesses, so cti and bte are
+        tied to classic cycles on the device side."""
+        parameters = [Parameter('AW', aw)]
+        wbm_clk, wbm_rst = self._clock_ports(host_clock)
+        wbs_clk, wbs_rst = self._clock_ports(device_clock)
+        cdc_host_ports   = ['adr', 'dat', 'sel', 'we', 'cyc', 'stb']
+        cdc_device_ports = ['rdt', 'ack', 'err', 'rty']
+
+        ports = [Port('wbm_clk', wbm_clk),
+                 Port('wbm_rst', wbm_rst)]
+        #Create host connections
+        for p in cdc_host_ports:
+            ports.append(Port('wbm_' + p + '_i', host_format.format(p, 'i')))
+        for p in cdc_device_ports:
+            _name = 'dat' if p == 'rdt' else p
+            ports.append(Port('wbm_' + _name + '_o', host_format.format(p, 'o')))
+
+        #Create device connections
+        ports += [Port('wbs_clk', wbs_clk),
+                  Port('wbs_rst', wbs_rst)]
+        for p in cdc_host_ports:
+            ports.append(Port('wbs_' + p + '_o', device_format.format(p, 'o')))
+        for p in cdc_device_ports:
+            _name = 'dat' if p == 'rdt' else p
+            ports.append(Port('wbs_' + _name + '_i', device_format.format(p, 'i')))
+
+        self.verilog_writer.add(Instance('wb_cdc', name, parameters, ports))
+
+        self.verilog_writer.add_raw('assign {} = 3\'b000;\n'.format(device_format.format('cti', 'o')))
+        self.verilog_writer.add_raw('assign {} = 2\'b00;\n'.format(device_format.format('bte', 'o')))
+
+    def _gen_host_cdc(self, host):
+        m = host.name
+        self._gen_cdc('wb_cdc_host_' + m, host.clock, None,
+                      self._host_port(host), 'wb_hcdc_' + m + '_{0}')
+        for p in WB_HOST_PORTS + WB_DEVICE_PORTS:
+            self.verilog_writer.add_wire('wb_hcdc_{0}_{1}'.format(m, p.name), p.width)
+
+    def _gen_device_cdc(self, device):
+        s = device.name
+        self._gen_cdc('wb_cdc_device_' + s, None, device.clock,
+                      'wb_dcdc_' + s + '_{0}', self._device_domain_input(device),
+                      device.adr_width)
+        for p in WB_HOST_PORTS + WB_DEVICE_PORTS:
+            self.verilog_writer.add_wire('wb_dcdc_{0}_{1}'.format(s, p.name),
+                                         self._device_width(p, device))
+
+    @_timed('gen_resize')
     def _gen_resize(self, device):
-        parameters = [Parameter('aw', 32)]
+        parameters = [Parameter('aw', device.adr_width)]
         parameters += [Parameter('mdw', 32)]
         parameters += [Parameter('sdw', device.datawidth)]
         parameters += [Parameter('endian', '"{}"'.format(self.endian))]
@@ -283,49 +1332,94 @@ class WbIntercon:
 
         for p in WB_HOST_PORTS:
             wirename = 'wb_resize_{device}_{port}'.format(device=s, port=p.name)
-            self.verilog_writer.add(Wire(wirename, p.width))
-        for p in WB_DEVICE_PORTS:
+            self.verilog_writer.add_wire(wirename, self._device_width(p, device))
+        for p in self.device_ports:
             wirename = 'wb_resize_{device}_{port}'.format(device=s, port=p.name)
-            self.verilog_writer.add(Wire(wirename, p.width))
+            self.verilog_writer.add_wire(wirename, p.width)
 
-    def _gen_wishbone_host_port(self, host):
-        template_ports = []
+        #wb_data_resize is combinational, so stall goes straight through
+        if self.mode == 'pipelined':
+            self.verilog_writer.add_raw('assign wb_resize_{0}_stall = wb_{0}_stall_i;\n'.format(s))
+
+    @_timed('gen_upsizer')
+    def _gen_upsizer(self, device):
+        parameters = [Parameter('DW_IN', 32)]
+        parameters += [Parameter('SCALE', int(device.datawidth) // 32)]
+        parameters += [Parameter('AW', device.adr_width)]
+        s = device.name
+
+        clk, rst = self._clock_ports(device.clock)
+        ports = [Port('wb_clk_i', clk),
+                 Port('wb_rst_i', rst)]
+        #Create host connections. wb_upsizer is the device on this side
         for p in WB_HOST_PORTS:
-            portname = 'wb_{host}_{port}_i'.format(host=host.name, port=p.name)
-            wirename = 'wb_{host}_{port}'.format(host=host.name, port=p.name)
-            self.verilog_writer.add(ModulePort(portname, 'input', p.width))
-            self.template_writer.add(Wire(wirename, p.width))
-            template_ports += [Port(portname, wirename)]
+            ports += [Port('wbs_'+p.name+'_i', 'wb_upsize_'+s+'_'+p.name)]
         for p in WB_DEVICE_PORTS:
-            portname = 'wb_{host}_{port}_o'.format(host=host.name, port=p.name)
-            wirename = 'wb_{host}_{port}'.format(host=host.name, port=p.name)
-            self.verilog_writer.add(ModulePort(portname, 'output', p.width))
-            self.template_writer.add(Wire(wirename, p.width))
-            template_ports += [Port(portname, wirename)]
-        return template_ports
+            _name = 'dat' if p.name == 'rdt' else p.name
+            ports += [Port('wbs_'+_name+'_o', 'wb_upsize_'+s+'_'+p.name)]
 
-    def _gen_wishbone_port(self, device):
-        template_ports = []
+        input_format = 'wb_%s_%s_i'
+        output_format = 'wb_%s_%s_o'
+
+        #Create device connections
         for p in WB_HOST_PORTS:
-            portname = 'wb_{device}_{port}_o'.format(device=device.name, port=p.name)
-            wirename = 'wb_{device}_{port}'.format(device=device.name, port=p.name)
-            dw = int(WB_DATA_WIDTH[p.name] * device.datawidth) or p.width
-            self.verilog_writer.add(ModulePort(portname, 'output', dw))
-            self.template_writer.add(Wire(wirename, dw))
-            template_ports += [Port(portname, wirename)]
+            ports.append(Port('wbm_' + p.name + '_o', output_format % (s, p.name)))
         for p in WB_DEVICE_PORTS:
-            portname = 'wb_{device}_{port}_i'.format(device=device.name, port=p.name)
-            wirename = 'wb_{device}_{port}'.format(device=device.name, port=p.name)
+            _name = 'dat' if p.name == 'rdt' else p.name
+            ports.append(Port('wbm_' + _name + '_i', input_format % (s, p.name)))
+
+        self.verilog_writer.add(Instance('wb_upsizer', 'wb_upsizer_'+s,parameters, ports))
+
+        for p in WB_HOST_PORTS + WB_DEVICE_PORTS:
+            wirename = 'wb_upsize_{device}_{port}'.format(device=s, port=p.name)
+            self.verilog_writer.add_wire(wirename, self._device_width(p, device))
+
+    @_timed('gen_ports')
+    def _gen_wishbone_host_port(self, host):
+        prefix = 'wb_' + host.name + '_'
+        for p in WB_HOST_PORTS:
+            wirename = prefix + p.name
+            self.verilog_writer.add_port(wirename + '_i', 'input', p.width, wirename, p.width)
+        for p in self.device_ports:
+            wirename = prefix + p.name
+            self.verilog_writer.add_port(wirename + '_o', 'output', p.width, wirename, p.width)
+
+    @_timed('gen_ports')
+    def _gen_wishbone_port(self, device):
+        prefix = 'wb_' + device.name + '_'
+        for p in WB_HOST_PORTS:
+            wirename = prefix + p.name
+            dw = int(WB_DATA_WIDTH[p.name] * device.datawidth) or self._device_width(p, device)
+            #Wide devices have one sel bit per byte
+            if p.name == 'sel' and int(device.datawidth) > 32:
+                dw = int(device.datawidth) // 8
+            self.verilog_writer.add_port(wirename + '_o', 'output', dw, wirename, dw)
+        for p in self.device_ports:
+            wirename = prefix + p.name
             dw = int(WB_DATA_WIDTH[p.name] * device.datawidth) or p.width
-            self.verilog_writer.add(ModulePort(portname, 'input', dw))
-            self.template_writer.add(Wire(wirename, dw))
-            template_ports += [Port(portname, wirename)]
-        return template_ports
+            self.verilog_writer.add_port(wirename + '_i', 'input', dw, wirename, dw)
+
+    def _gen_axi4_port(self, x, is_host):
+        """Connect an AXI4 host through a wb_axi_slave or an AXI4 device
+        through a wb_axi_master"""
+        ports = [(p, 'm2s') for p in AXI4_HOST_PORTS]
+        ports += [(p, 's2m') for p in AXI4_DEVICE_PORTS]
+        converter_ports = self._gen_bus_converter('axi', x.name, is_host, x.datawidth,
+                                                  AXI4_DATA_WIDTH, ports, x.clock)
+        core = 'wb_axi_slave' if is_host else 'wb_axi_master'
+        self.verilog_writer.add(Instance(core, core + '_' + x.name, [], converter_ports))
 
-    def _gen_bus_converter(self, bus, name, is_host, datawidth, datawidth_map, ports):
-        converter_ports = [Port('wb_clk_i', 'wb_clk_i'),
-            Port('wb_rst_i', 'wb_rst_i')]
-        template_ports = []
+    @_timed('gen_bus_converter')
+    def _gen_bus_converter(self, bus, name, is_host, datawidth, datawidth_map, ports, clock=None):
+        """Ports of a converter between Wishbone and another bus
+
+        Adds the ports of the other bus to the module and the wires
+        wb_<name>_<signal> on the Wishbone side, and returns the port
+        connections of the converter instance. ports is a list of
+        (Signal, direction) tuples, where direction is m2s or s2m"""
+        clk, rst = self._clock_ports(clock)
+        converter_ports = [Port('wb_clk_i', clk),
+            Port('wb_rst_i', rst)]
 
         out_direction = 'm2s' if is_host else 's2m'
 
@@ -340,13 +1434,13 @@ class WbIntercon:
         wb_ports.extend([(p, 's2m') for p in WB_DEVICE_PORTS])
         for p, direction in wb_ports:
             pin_direction = 'output' if direction == out_direction else 'input'
-            wirename = 'wb_{direction}_{name}_{port}'.format(
-                direction=direction, name=name, port=p.name)
+            wirename = 'wb_{name}_{port}'.format(name=name, port=p.name)
+            _name = 'dat' if p.name == 'rdt' else p.name
             converter_ports.append(
-                Port('%s_%s_%s' % ('wbm' if ms_type == 'm' else 'wb', p.name,
+                Port('%s_%s_%s' % ('wb' + ms_type, _name,
                   pin_direction[0]), wirename))
             dw = int(WB_DATA_WIDTH[p.name] * datawidth) or p.width
-            self.verilog_writer.add(Wire(wirename, dw))
+            self.verilog_writer.add_wire(wirename, dw)
 
         # Create foreign bus connections
         for p, direction in ports:
@@ -361,82 +1455,291 @@ class WbIntercon:
                     d=f_ms_type, bus=bus, direction=pin_direction[0],
                     port=p.name), portname))
             dw = int(datawidth_map[p.name] * datawidth) or p.width
-            self.verilog_writer.add(
-                ModulePort(portname, pin_direction, p.width))
-            self.template_writer.add(Wire(wirename, dw))
-            template_ports.append(Port(portname, wirename))
+            self.verilog_writer.add_port(portname, pin_direction, dw, wirename, dw)
 
-        return template_ports, converter_ports
+        return converter_ports
+
+    def _cache_file(self):
+        head, tail = os.path.split(self.output_file)
+        return os.path.join(head, '.' + tail + '.cache')
+
+    def _cache_key(self):
+        h = hashlib.sha256()
+        for x in [self.config_digest, self.name, self.output_file,
+                  _generator_digest()]:
+            h.update(x.encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def _cache_hit(self, key):
+        import json
+
+        try:
+            with open(self._cache_file()) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return False
+        files = cache.get('files')
+        if cache.get('key') != key or not isinstance(files, dict):
+            return False
+        #Outputs that were edited or removed since the last run are
+        #generated again
+        return all(file_digest(f) == digest for f, digest in files.items())
+
+    def _trim_report(self):
+        """Print how many address nets were removed by trim_address"""
+        total = 0
+        for device in self.devices.values():
+            if device.adr_width == 32 or not device.hosts:
+                continue
+            #Device port, links from each host to the arbiter and the
+            #register slice, clock domain crossing and width converter
+            links = 1
+            if len(device.hosts) > 1:
+                links += len(device.hosts)
+            links += bool(device.registered) + bool(device.clock)
+            links += int(device.datawidth) != 32
+            saved = links * (32 - device.adr_width)
+            total += saved
+            self._info("Trimmed address of device '{}' to {} bits, removing {} nets".format(
+                device.name, device.adr_width, saved))
+        self._info("Address trimming removed {} nets in total".format(total))
+
+    def generate(self):
+        """Generate the interconnect without writing any files
+
+        Returns an OrderedDict that maps the name of each output file to
+        its contents, starting with the Verilog module and its template
+        and ending with the core file."""
+        outputs = OrderedDict()
+        for f, emit in self._build().items():
+            with self.timer.phase('render ' + f):
+                text = io.StringIO()
+                emit(text.write)
+                outputs[f] = text.getvalue()
+        return outputs
+
+    def _build(self):
+        """Build the interconnect
+
+        Returns an OrderedDict that maps the name of each output file to
+        a function that streams its contents to a function taking strings.
+        Nothing is rendered until these are called."""
+        import yaml
 
-    def write(self):
         file = self.output_file
+        core_file = self.vlnv.split(':')[2]+'.core'
+        self.verilog_writer = VerilogWriter(self.name)
+
         #Declare wires. Only conections between muxes and arbiters need explicit wires
-        for key, value in self.hosts.items():
-            for device in value.devices:
-                if len(device.hosts)>1:
-                    for p in WB_HOST_PORTS:
-                        self.verilog_writer.add(Wire('wb_{0}_{1}_{2}'.format(key, device.name, p.name), p.width))
-                    for p in WB_DEVICE_PORTS:
-                        self.verilog_writer.add(Wire('wb_{0}_{1}_{2}'.format(key, device.name, p.name), p.width))
+        with self.timer.phase('wires'):
+            for key, value in list(self.hosts.items()) + list(self.bridges.items()):
+                for device in value.devices:
+                    if len(device.hosts)>1:
+                        prefix = 'wb_' + key + '_' + device.name + '_'
+                        for p in WB_HOST_PORTS:
+                            self.verilog_writer.add_wire(prefix + p.name, self._device_width(p, device))
+                        for p in self.device_ports:
+                            self.verilog_writer.add_wire(prefix + p.name, p.width)
+            #Bridges connect their arbiter or upstream mux with their own mux
+            for key in self.bridges:
+                for p in WB_HOST_PORTS + self.device_ports:
+                    self.verilog_writer.add_wire('wb_{0}_{1}'.format(key, p.name), p.width)
 
-        self.verilog_writer.add(ModulePort('wb_clk_i', 'input'))
-        self.verilog_writer.add(ModulePort('wb_rst_i', 'input'))
+        self.verilog_writer.add_port('wb_clk_i', 'input', net='wb_clk')
+        self.verilog_writer.add_port('wb_rst_i', 'input', net='wb_rst')
 
-        template_ports = [Port('wb_clk_i', 'wb_clk'),
-                          Port('wb_rst_i', 'wb_rst')]
-        template_parameters = []
+        for clock in self.clocks:
+            for port in self._clock_ports(clock):
+                self.verilog_writer.add_port(port, 'input', net=port[:-2])
 
         for host in self.hosts.values():
             self._gen_mux(host)
-            host_template_ports = self._gen_wishbone_host_port(host)
-            template_ports.extend(host_template_ports)
+            if host.clock:
+                self._gen_host_cdc(host)
+            if host.registered:
+                self._gen_host_reg_slice(host)
+            if host.bus == 'axi4':
+                self._gen_axi4_port(host, is_host=True)
+            else:
+                self._gen_wishbone_host_port(host)
+            if self.error_device:
+                self._gen_error_device(host)
 
         for device in self.devices.values():
             if len(device.hosts) > 1:
                 self._gen_arbiter(device)
+            if device.clock:
+                self._gen_device_cdc(device)
+            if device.registered:
+                self._gen_device_reg_slice(device)
             if int(device.datawidth) < 32:
                 self._gen_resize(device)
-            device_template_ports = self._gen_wishbone_port(device)
-            template_ports.extend(device_template_ports)
+            elif int(device.datawidth) > 32:
+                self._gen_upsizer(device)
+            if device.internal:
+                continue
+            if device.bus == 'axi4':
+                self._gen_axi4_port(device, is_host=False)
+            else:
+                self._gen_wishbone_port(device)
 
-        self.template_writer.add(Instance(self.name, self.name+'0',
-                                          template_parameters, template_ports))
+        for bridge in self.bridges.values():
+            if len(bridge.hosts) > 1:
+                self._gen_arbiter(bridge)
+            self._gen_mux(bridge)
+            if self.error_device:
+                self._gen_error_device(bridge)
 
-        self.verilog_writer.header = "// THIS FILE IS AUTOGENERATED BY wb_intercon_gen\n// ANY MANUAL CHANGES WILL BE LOST\n"
+        if self.perf_counters:
+            perf_edges = self._gen_perf_counters()
 
-        self.verilog_writer.write(file)
-        self.template_writer.write(file+'h')
 
-        core_file = self.vlnv.split(':')[2]+'.core'
+        if self.trim_address:
+            self._trim_report()
+        self._topology_report()
+
+        self.verilog_writer.header = "// THIS FILE IS AUTOGENERATED BY wb_intercon_gen\n// ANY MANUAL CHANGES WILL BE LOST\n"
+
         vlnv = self.vlnv
-        with open(core_file, 'w') as f:
-            f.write('CAPI=2:\n')
-            files = [{file     : {'file_type' : 'verilogSource'}},
-                     {file+'h' : {'is_include_file' : True,
-                                  'file_type' : 'verilogSource'}}
-            ]
-            coredata = {'name' : vlnv,
-                        'targets' : {'default' : {}},
-            }
+        files = [{file     : {'file_type' : 'verilogSource'}},
+                 {file+'h' : {'is_include_file' : True,
+                              'file_type' : 'verilogSource'}}
+        ]
+        coredata = {'name' : vlnv,
+                    'targets' : {'default' : {}},
+        }
 
-            coredata['filesets'] = {'rtl' : {'files' : files}}
-            coredata['targets']['default']['filesets'] = ['rtl']
+        coredata['filesets'] = {'rtl' : {'files' : files}}
+        coredata['targets']['default']['filesets'] = ['rtl']
 
-            f.write(yaml.dump(coredata))
+        def text(s):
+            return lambda out: out(s)
+
+        outputs = []
+        outputs.append((file, self.verilog_writer.emit))
+        outputs.append((file+'h', self.verilog_writer.template(self.name+'0').emit))
+
+        if self.perf_bench:
+            tb_file = os.path.splitext(file)[0] + '_perf_tb.v'
+            coredata['filesets']['perf_tb'] = {
+                'files' : [{tb_file : {'file_type' : 'verilogSource'}}]}
+            coredata['targets']['perf'] = {
+                'default_tool' : 'icarus',
+                'filesets' : ['rtl', 'perf_tb'],
+                'toplevel' : self.name + '_perf_tb'}
+            with self.timer.phase('render ' + tb_file):
+                outputs.append((tb_file, text(gen_perf_bench(self, self.perf_bench))))
+
+        if self.perf_counters:
+            base = os.path.splitext(file)[0]
+            with self.timer.phase('render ' + base + '_perf_counters'):
+                header, regmap = self._perf_counter_maps(perf_edges)
+            outputs.append((base + '_perf_counters.h', text(header)))
+            outputs.append((base + '_perf_counters.py', text(regmap)))
+
+        with self.timer.phase('render ' + core_file):
+            outputs.append((core_file, text('CAPI=2:\n' + yaml.dump(coredata))))
+        return OrderedDict(outputs)
+
+    def output_files(self):
+        """Names of the files that write() creates, in the order they are
+        generated. Nothing is built to find them."""
+        base = os.path.splitext(self.output_file)[0]
+        files = [self.output_file, self.output_file + 'h']
+        if self.perf_bench:
+            files.append(base + '_perf_tb.v')
+        if self.perf_counters:
+            files += [base + '_perf_counters.h', base + '_perf_counters.py']
+        files.append(self.vlnv.split(':')[2] + '.core')
+        return files
+
+    def write(self):
+        """Generate the interconnect and write the output files
+
+        Nothing is written if the config, module name and generator are
+        the same as in the last run and no output has been changed or
+        removed since then. Otherwise each output is streamed to disk and
+        only replaces files with different contents. Returns 'written' if
+        any output file was written and 'unchanged' otherwise."""
+        import json
+
+        with self.timer.phase('cache check'):
+            cache_key = self._cache_key()
+            up_to_date = self._cache_hit(cache_key)
+        if up_to_date:
+            self._info("Config unchanged. {} is up to date".format(self.output_file))
+            return 'unchanged'
+
+        status = 'unchanged'
+        digests = OrderedDict()
+        for f, emit in self._build().items():
+            with self.timer.phase('write ' + f):
+                written, digests[f] = write_if_changed(f, emit)
+            if written:
+                status = 'written'
+            else:
+                self._info("{} unchanged".format(f))
+
+        with open(self._cache_file(), 'w') as f:
+            json.dump({'key' : cache_key,
+                       'files' : digests}, f)
+        return status
 
 if __name__ == "__main__":
     #if len(sys.argv) < 3 or len(sys.argv) > 4:
         #print("wb_intercon_gen <config_file> <out_file> [module_name]")
         #exit(0)
+    #Options
+    #  --estimate        Only report the estimated size and depth of the interconnect
+    #  --verbose         Also print details, such as each unmapped address range
+    #  --timings         Report wall time and peak memory per generator phase
+    #  --profile[=file]  Dump cProfile statistics to file (default <module_name>.prof)
+    options = [a for a in sys.argv[1:] if a.startswith('--')]
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
     name = "wb_intercon"
-    if len(sys.argv) == 4:
-      name = sys.argv[3]
+    if len(args) == 3:
+      name = args[2]
+    estimate = False
+    verbose = True
+    timer = None
+    profile = None
+    for o in options:
+      if o == '--estimate':
+        estimate = True
+      elif o == '--verbose':
+        verbose = 2
+      elif o == '--timings':
+        timer = PhaseTimer()
+      elif o == '--profile' or o.startswith('--profile='):
+        profile = o.partition('=')[2] or name + '.prof'
+      else:
+        print("Error: Unknown option " + o)
+        exit(1)
+    if profile:
+      import cProfile
+      profiler = cProfile.Profile()
+      profiler.enable()
     try:
-      g = WbIntercon(name, sys.argv[1])
-      if len(sys.argv) > 2:
-          g.output_file = sys.argv[2]
+      g = WbIntercon(name, args[0], verbose=verbose, timer=timer)
+      if len(args) > 1:
+          g.output_file = args[1]
       print("="*80)
-      g.write()
+      if estimate:
+          Estimate(g).report()
+      else:
+          g.write()
     except Error as e:
       print("Error: %s" % e)
       exit(1)
+    if timer:
+      timer.stop()
+      print("="*80)
+      timer.report()
+    if profile:
+      import pstats
+      profiler.disable()
+      profiler.dump_stats(profile)
+      print("="*80)
+      print("Profile written to " + profile)
+      pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# Copyright 2014-2022 Olof Kindgren <olof.kindgren@gmail.com>
+# SPDX-License-Identifier: Apache-2.0
+"""Cycle-approximate performance model of a generated interconnect
+
+The model is built from the host/device graph of a WbIntercon object and
+estimates how a given traffic pattern behaves on it, long before a
+Verilog simulation would finish. It models
+
+- the first-match address decoding of the host muxes
+- arbiters on shared devices and bridges, with round-robin or fixed
+  priority arbitration and one cycle to grant the bus
+- wb_data_resize, where each device access moves one device word, so
+  that a transaction of size bytes takes several accesses
+- device latency, i.e. cycles from request to ack, per device
+- register slices and clock domain crossings as fixed extra latency
+
+Hosts are classic Wishbone masters with one transaction in flight. A
+transaction keeps the arbiter of a shared device from the grant until
+the device has finished it. Weighted arbitration is modelled as
+round-robin.
+
+Transactions to devices that only have one host never wait, so their
+timing follows directly from cumulative sums over the trace. Only the
+transactions that go through an arbiter are handled by an event-driven
+simulation, which keeps the run time at a few seconds per million
+transactions.
+
+Usage: wb_intercon_perf.py <config_file> [transactions] [host=trace_file ...]
+
+Trace files hold raw little-endian 32-bit addresses. Hosts without a
+trace get random accesses spread evenly over their devices.
+"""
+import heapq
+import sys
+
+import numpy as np
+
+from wb_intercon_gen2 import Error, WbIntercon
+
+REGISTERED_CYCLES = {None : 0, 'request' : 1, 'response' : 1, 'both' : 2}
+
+def random_traffic(intercon, host, count, gap=0, size=4, seed=0):
+    """Traffic with count accesses spread evenly over the devices of host
+
+    Returns a traffic dict for PerfModel.run with word-aligned addresses
+    in the regions of the host's devices."""
+    rng = np.random.default_rng(seed)
+    regions = sorted(intercon.hosts[host].address_map.regions,
+                     key=lambda r: r.index)
+    bases = np.array([r.base for r in regions], dtype=np.uint64)
+    sizes = np.array([r.size for r in regions], dtype=np.uint64)
+    sel = rng.integers(0, len(regions), count)
+    offsets = rng.integers(0, 1 << 32, count, dtype=np.uint64) % sizes[sel]
+    addresses = bases[sel] + (offsets & ~np.uint64(3))
+    return {'addresses' : addresses, 'gap' : gap, 'size' : size}
+
+class PerfModel:
+    def __init__(self, intercon, latency=None, default_latency=1, cdc_cycles=6):
+        """Build the model from a WbIntercon object
+
+        latency maps device names to the number of cycles from request to
+        ack. Devices not listed use default_latency. cdc_cycles is the
+        extra latency of each wb_cdc."""
+        self.intercon = intercon
+        self.latency = dict(latency or {})
+        self.default_latency = default_latency
+        self.cdc_cycles = cdc_cycles
+
+        #Node in front of each device as seen from the hosts. This is the
+        #device itself, or the bridge it sits behind
+        self.node = {d.name : d for d in intercon.devices.values()}
+        for bridge in intercon.bridges.values():
+            for d in bridge.devices:
+                self.node[d.name] = bridge
+        #Only nodes with several hosts have an arbiter
+        self.resources = [n for n in list(intercon.devices.values()) +
+                          list(intercon.bridges.values()) if len(n.hosts) > 1]
+        self.resource_id = {n.name : i for i, n in enumerate(self.resources)}
+
+    def _overhead(self, x):
+        return REGISTERED_CYCLES[x.registered] + (self.cdc_cycles if x.clock else 0)
+
+    def _device_table(self, host, size):
+        """Per device arrays of arbiter hold time, latency and resource
+
+        Indexed by the device index in the host's address map, with one
+        extra last entry for unmatched accesses."""
+        intercon = self.intercon
+        regions = sorted(intercon.hosts[host].address_map.regions,
+                         key=lambda r: r.index)
+        hold = []
+        lat = []
+        res = []
+        for r in regions:
+            device = intercon.devices[r.name]
+            #wb_data_resize forwards a single device word per access
+            word = min(int(device.datawidth), 32) // 8
+            beats = -(-size // word)
+            cycles = beats * (self.latency.get(r.name, self.default_latency) + 1)
+            cycles += self._overhead(device)
+            rid = self.resource_id.get(self.node[r.name].name, -1)
+            if rid >= 0:
+                cycles += 1 #Arbiter grant
+            hold.append(cycles)
+            lat.append(cycles)
+            res.append(rid)
+        #Unmatched accesses are terminated by wb_mux or the error device
+        error_device = intercon.error_device
+        hold.append(0)
+        lat.append((error_device['latency'] if error_device else 1) + 1)
+        res.append(-1)
+        host_overhead = self._overhead(intercon.hosts[host])
+        return (np.array(hold, dtype=np.int64),
+                np.array(lat, dtype=np.int64) + host_overhead,
+                np.array(res, dtype=np.int64))
+
+    def run(self, traffic):
+        """Simulate traffic and return a PerfResult
+
+        traffic maps host names to dicts with the keys
+          addresses : array-like of bus addresses, one per transaction
+          gap       : idle cycles before each transaction, int or array
+                      (default 0)
+          size      : bytes per transaction (default 4)"""
+        hosts = {}
+        for host, t in traffic.items():
+            if host not in self.intercon.hosts:
+                raise Error("Could not find host '{}'".format(host))
+            sel = self.intercon.resolve(host, t['addresses'])
+            n = len(sel)
+            hold, lat, res = self._device_table(host, int(t.get('size', 4)))
+            gap = np.broadcast_to(np.asarray(t.get('gap', 0), dtype=np.int64), (n,))
+            hosts[host] = {'sel'  : sel,
+                           'hold' : hold[sel],
+                           'lat'  : lat[sel],
+                           'res'  : res[sel],
+                           'gap'  : gap,
+                           'size' : int(t.get('size', 4)),
+                           #End time of each transaction without waiting
+                           'cum'  : np.cumsum(gap + lat[sel])}
+
+        busy, grants = self._arbitrate(hosts)
+        return PerfResult(self, hosts, busy, grants)
+
+    def _arbitrate(self, hosts):
+        """Event-driven simulation of the transactions through arbiters
+
+        Adds a wait array to each host dict and returns the busy cycles
+        and grant counts per resource."""
+        num = len(self.resources)
+        busy = [0] * num
+        grants = [0] * num
+        owner = [None] * num
+        waiting = [dict() for _ in range(num)]
+        last = [-1] * num
+        #Arbiter port order. Lower rank wins for fixed priority and is the
+        #round-robin order otherwise
+        fixed = []
+        rank = []
+        for r in self.resources:
+            fixed.append(r.arbitration == 'fixed_priority')
+            order = reversed(r.arbiter_hosts()) if fixed[-1] else r.hosts
+            rank.append({h.name : i for i, h in enumerate(order)})
+
+        names = list(hosts)
+        state = []
+        events = []
+        for i, host in enumerate(names):
+            h = hosts[host]
+            h['wait'] = np.zeros(len(h['sel']), dtype=np.int64)
+            shared = np.flatnonzero(h['res'] >= 0)
+            #Issue time of each shared transaction, as an offset from the
+            #end of the previous one on the unshared timeline
+            issue = h['cum'][shared] - h['lat'][shared]
+            state.append([shared.tolist(), issue.tolist(), h['cum'].tolist(), 0, 0])
+            if len(shared):
+                heapq.heappush(events, (state[-1][1][0], 0, i))
+
+        def grant(r, i, t):
+            host_state = state[i]
+            k = host_state[0][host_state[3]]
+            h = hosts[names[i]]
+            wait = t - waiting[r].pop(i)
+            h['wait'][k] = wait
+            owner[r] = i
+            last[r] = rank[r][names[i]]
+            grants[r] += 1
+            hold = int(h['hold'][k])
+            busy[r] += hold
+            heapq.heappush(events, (t + hold, 1, r))
+            #Next shared transaction of the host, after this one and the
+            #unshared ones in between
+            host_state[4] += wait
+            p = host_state[3] + 1
+            host_state[3] = p
+            if p < len(host_state[0]):
+                heapq.heappush(events, (host_state[1][p] + host_state[4], 0, i))
+
+        while events:
+            t, kind, x = heapq.heappop(events)
+            if kind == 0:
+                host_state = state[x]
+                k = host_state[0][host_state[3]]
+                r = int(hosts[names[x]]['res'][k])
+                waiting[r][x] = t
+                if owner[r] is None:
+                    grant(r, x, t)
+            else:
+                r = x
+                owner[r] = None
+                if waiting[r]:
+                    n = len(self.resources[r].hosts)
+                    if fixed[r]:
+                        i = min(waiting[r], key=lambda i: rank[r][names[i]])
+                    else:
+                        i = min(waiting[r], key=lambda i: (rank[r][names[i]] - last[r] - 1) % n)
+                    grant(r, i, t)
+        return busy, grants
+
+class PerfResult:
+    def __init__(self, model, hosts, busy, grants):
+        self.model = model
+        self.cycles = 0
+        self.hosts = {}
+        for host, h in hosts.items():
+            latency = h['lat'] + h['wait']
+            end = h['cum'] + np.cumsum(h['wait'])
+            cycles = int(end[-1]) if len(end) else 0
+            self.cycles = max(self.cycles, cycles)
+            n = len(latency)
+            p50, p90, p99 = (np.percentile(latency, [50, 90, 99]) if n else (0, 0, 0))
+            self.hosts[host] = {
+                'transactions' : n,
+                'cycles'       : cycles,
+                'throughput'   : n / cycles if cycles else 0.0,
+                'bytes_per_cycle' : n * h['size'] / cycles if cycles else 0.0,
+                'latency_mean' : float(latency.mean()) if n else 0.0,
+                'latency_p50'  : float(p50),
+                'latency_p90'  : float(p90),
+                'latency_p99'  : float(p99),
+                'latency_max'  : int(latency.max()) if n else 0,
+                'stall_cycles' : int(h['wait'].sum()),
+                'unmatched'    : int((h['sel'] < 0).sum()),
+            }
+        self.resources = {}
+        for r, node in enumerate(model.resources):
+            self.resources[node.name] = {
+                'grants'      : grants[r],
+                'busy_cycles' : busy[r],
+                'utilization' : busy[r] / self.cycles if self.cycles else 0.0,
+            }
+
+    def report(self):
+        print("{:<16} {:>10} {:>10} {:>8} {:>8} {:>8} {:>8} {:>8} {:>10}".format(
+            'host', 'trans', 'cycles', 'trans/c', 'p50', 'p90', 'p99', 'max', 'stalls'))
+        for host, s in self.hosts.items():
+            print("{:<16} {:>10} {:>10} {:>8.3f} {:>8.1f} {:>8.1f} {:>8.1f} {:>8} {:>10}".format(
+                host, s['transactions'], s['cycles'], s['throughput'],
+                s['latency_p50'], s['latency_p90'], s['latency_p99'],
+                s['latency_max'], s['stall_cycles']))
+        if self.resources:
+            print()
+            print("{:<16} {:>10} {:>12} {:>12}".format(
+                'arbiter', 'grants', 'busy cycles', 'utilization'))
+            for name, s in self.resources.items():
+                print("{:<16} {:>10} {:>12} {:>12.3f}".format(
+                    name, s['grants'], s['busy_cycles'], s['utilization']))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("wb_intercon_perf.py <config_file> [transactions] [host=trace_file ...]")
+        exit(1)
+    count = 100000
+    traces = {}
+    for arg in sys.argv[2:]:
+        if '=' in arg:
+            host, trace = arg.split('=', 1)
+            traces[host] = np.memmap(trace, dtype='<u4', mode='r')
+        else:
+            count = int(arg)
+    try:
+        intercon = WbIntercon('wb_intercon', sys.argv[1])
+        model = PerfModel(intercon)
+        traffic = {}
+        for i, host in enumerate(intercon.hosts):
+            if host in traces:
+                traffic[host] = {'addresses' : traces[host]}
+            else:
+                traffic[host] = random_traffic(intercon, host, count, seed=i)
+        model.run(traffic).report()
+    except Error as e:
+        print("Error: %s" % e)
+        exit(1)